@@ -0,0 +1,2 @@
+from benchmarks.stubs import HashingEmbedder, StubEmbedder
+from benchmarks.vault import write_vault
\ No newline at end of file
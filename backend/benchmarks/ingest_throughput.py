@@ -0,0 +1,91 @@
+"""
+Ingestion Throughput Benchmark
+
+Measures ChromaRag ingestion speed (chunks/sec) for different embedding batch
+sizes and worker counts against a local stub embedder, so no Ollama server is
+needed.
+
+Usage (from the backend directory):
+    python -m benchmarks.ingest_throughput --files 200 --batch-sizes 1 16 64 --workers 1 4
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.stubs import StubEmbedder
+from benchmarks.vault import write_vault
+from rag import ChromaRag
+
+
+def run(files, batch_sizes, workers, call_latency, dim):
+    """
+    Run the ingestion benchmark once per batch size and worker count.
+
+    Args:
+        files (int): Number of markdown files in the synthetic vault
+        batch_sizes (List[int]): Batch sizes to compare
+        workers (List[int]): Embedding worker counts to compare
+        call_latency (float): Simulated embedding round trip in seconds
+        dim (int): Dimension of the stub embeddings
+
+    Returns:
+        List[Dict[str, Any]]: One result per batch size and worker count
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = write_vault(os.path.join(tmp, "vault"), files=files)
+
+        for batch_size in batch_sizes:
+            for embed_workers in workers:
+                embedder = StubEmbedder(dim=dim, call_latency=call_latency)
+
+                start = time.perf_counter()
+                rag = ChromaRag(
+                    source_directory=vault,
+                    collection_name="bench",
+                    db_path=os.path.join(tmp, f"db-{batch_size}-{embed_workers}"),
+                    model_name="stub",
+                    incremental=False,
+                    batch_size=batch_size,
+                    embed_fn=embedder,
+                    embed_workers=embed_workers,
+                )
+                elapsed = time.perf_counter() - start
+
+                chunks = rag.collection.count()
+                results.append(
+                    {
+                        "batch_size": batch_size,
+                        "embed_workers": embed_workers,
+                        "chunks": chunks,
+                        "embed_calls": embedder.calls,
+                        "seconds": round(elapsed, 3),
+                        "chunks_per_sec": round(chunks / elapsed, 1),
+                    }
+                )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--call-latency", type=float, default=0.005)
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            run(
+                args.files, args.batch_sizes, args.workers, args.call_latency, args.dim
+            ),
+            indent=2,
+        )
+    )
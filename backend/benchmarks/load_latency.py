@@ -0,0 +1,195 @@
+"""
+Concurrent Load Benchmark
+
+Fires requests at the backend from N concurrent clients and reports latency
+percentiles (p50/p99) and throughput.
+
+By default the server is started in-process in production mode (waitress)
+with a synthetic vault, a stub embedder and a stub LLM, so the numbers reflect
+request handling and locking rather than model speed. Pass --url to measure a
+server that is already running instead.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_latency --clients 1 4 16 --requests 20
+    python -m benchmarks.load_latency --url http://localhost:5000/ask --clients 4
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import StubAssistant, StubEmbedder
+from benchmarks.vault import write_vault
+
+
+def percentile(values, p):
+    """
+    Compute a percentile with linear interpolation.
+
+    Args:
+        values (List[float]): Samples
+        p (float): Percentile between 0 and 100
+
+    Returns:
+        float: The p-th percentile of values
+    """
+
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def start_stub_server(tmp, port, threads, llm_latency, files):
+    """
+    Start the backend in a background thread with stub models.
+
+    Args:
+        tmp (str): Temporary directory for the vault and database
+        port (int): Port to serve on
+        threads (int): Number of waitress worker threads
+        llm_latency (float): Simulated generation time in seconds
+        files (int): Number of markdown files in the synthetic vault
+
+    Returns:
+        str: URL of the /ask endpoint
+    """
+
+    import server
+    from rag import ChromaRag, ContextPacker
+    from service import CollectionRegistry
+    from waitress import serve
+
+    vault = write_vault(os.path.join(tmp, "vault"), files=files)
+    config = {
+        "source_directory": vault,
+        "collection_name": "bench",
+        "db_path": os.path.join(tmp, "db"),
+        "model_name": "stub",
+    }
+
+    server.registry = CollectionRegistry(path=os.path.join(tmp, "collections.json"))
+    server.registry.add(ChromaRag(**config, embed_fn=StubEmbedder()), config)
+    server.instructor_assistant = StubAssistant(latency=llm_latency)
+    server.context_packer = ContextPacker()
+
+    threading.Thread(
+        target=serve,
+        kwargs={"app": server.app, "host": "127.0.0.1", "port": port, "threads": threads},
+        daemon=True,
+    ).start()
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            break
+        except OSError:
+            time.sleep(0.1)
+
+    return f"{url}/ask"
+
+
+def request_once(url, payload):
+    """
+    Send one POST request and time it.
+
+    Args:
+        url (str): Endpoint URL
+        payload (Dict[str, Any]): JSON body
+
+    Returns:
+        Tuple[float, bool]: Latency in seconds and whether it succeeded
+    """
+
+    body = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(
+        url, data=body, headers={"Content-Type": "application/json"}
+    )
+
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=300) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except OSError:
+        ok = False
+
+    return time.perf_counter() - start, ok
+
+
+def run(url, clients, requests, top_k):
+    """
+    Run the load benchmark once per client count.
+
+    Each client sends a distinct query per request so caches do not hide the
+    cost of serving.
+
+    Args:
+        url (str): Endpoint URL
+        clients (List[int]): Numbers of concurrent clients to compare
+        requests (int): Requests sent by each client
+        top_k (int): Number of documents to retrieve per request
+
+    Returns:
+        List[Dict[str, Any]]: One result per client count
+    """
+
+    results = []
+
+    for n in clients:
+        payloads = [
+            {"query": f"Who guards the bridge? ({n}-{i})", "top_k": top_k}
+            for i in range(n * requests)
+        ]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            samples = list(pool.map(lambda p: request_once(url, p), payloads))
+        elapsed = time.perf_counter() - start
+
+        latencies = [latency for latency, ok in samples if ok]
+        results.append(
+            {
+                "clients": n,
+                "requests": len(samples),
+                "errors": sum(1 for _, ok in samples if not ok),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "mean_ms": round(statistics.fmean(latencies) * 1000, 1)
+                if latencies
+                else 0.0,
+                "requests_per_sec": round(len(samples) / elapsed, 2),
+            }
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Endpoint of a running server")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--files", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or start_stub_server(
+            tmp, args.port, args.threads, args.llm_latency, args.files
+        )
+        print(json.dumps(run(url, args.clients, args.requests, args.top_k), indent=2))
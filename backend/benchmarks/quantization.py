@@ -0,0 +1,169 @@
+"""
+Quantized Vector Index Benchmark
+
+Compares the NumpyStore search modes on the same vectors: exact float search,
+and int8 and binary quantized indexes with full-precision re-ranking. Reports
+the memory of the index scanned by every query, recall@k against the exact
+float results, query latency, and the time to open the store, which for
+quantized modes includes building the quantized index the first time.
+
+Vectors are synthetic but clustered like real embeddings (Gaussian noise
+around random topic centers), with the dimension of mxbai-embed-large by
+default, so the benchmark runs offline without an embedding server.
+
+Usage (from the backend directory):
+    python -m benchmarks.quantization --chunks 100000 --k 5 10
+    python -m benchmarks.quantization --rerank 2 4 8 32
+"""
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.load_latency import percentile
+from rag.store import NumpyStore
+
+
+def clustered_vectors(rng, count, centers, noise):
+    """
+    Draw vectors around random cluster centers.
+
+    Args:
+        rng (numpy.random.Generator): Random generator
+        count (int): Number of vectors
+        centers (numpy.ndarray): Cluster centers, one per row
+        noise (float): Standard deviation of the noise around each center
+
+    Returns:
+        numpy.ndarray: float32 vectors, one per row
+    """
+
+    labels = rng.integers(0, len(centers), count)
+    vectors = centers[labels] + noise * rng.standard_normal(
+        (count, centers.shape[1])
+    )
+    return vectors.astype(np.float32)
+
+
+def run(chunks, dim, clusters, noise, queries, ks, reranks, seed):
+    """
+    Run the benchmark for every quantization and re-ranking depth.
+
+    Args:
+        chunks (int): Number of stored vectors
+        dim (int): Vector dimension
+        clusters (int): Number of cluster centers
+        noise (float): Noise around the centers
+        queries (int): Number of queries
+        ks (List[int]): Result counts to measure recall at
+        reranks (Optional[List[int]]): Re-ranking depths to compare, None for
+            each quantization's default
+        seed (int): Random seed
+
+    Returns:
+        List[Dict[str, Any]]: One result per quantization and re-ranking depth
+    """
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = clustered_vectors(rng, chunks, centers, noise)
+    query_vectors = clustered_vectors(rng, queries, centers, noise)
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    max_k = max(ks)
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = NumpyStore(tmp, "bench")
+        for start in range(0, chunks, 4096):
+            end = min(start + 4096, chunks)
+            store.upsert(
+                ids[start:end],
+                vectors[start:end],
+                [""] * (end - start),
+                [{}] * (end - start),
+            )
+        store.flush()
+
+        exact = NumpyStore(tmp, "bench")
+        baseline = exact.query(query_vectors, max_k)["ids"]
+        float_bytes = exact.index_bytes()
+
+        modes = [(None, None)] + [
+            (quantization, rerank)
+            for quantization in ("int8", "binary")
+            for rerank in (reranks or [None])
+        ]
+
+        for quantization, rerank in modes:
+            start = time.perf_counter()
+            store = NumpyStore(tmp, "bench", quantization=quantization, rerank=rerank)
+            open_seconds = time.perf_counter() - start
+
+            latencies, found = [], []
+            for query in query_vectors:
+                start = time.perf_counter()
+                found.append(store.query(query[None, :], max_k)["ids"][0])
+                latencies.append(time.perf_counter() - start)
+
+            recall = {
+                f"recall@{k}": round(
+                    float(
+                        np.mean(
+                            [
+                                len(set(got[:k]) & set(want[:k])) / k
+                                for got, want in zip(found, baseline)
+                            ]
+                        )
+                    ),
+                    4,
+                )
+                for k in ks
+            }
+
+            results.append(
+                {
+                    "quantization": quantization or "float32",
+                    "rerank": store.rerank if quantization else None,
+                    "index_bytes": store.index_bytes(),
+                    "memory_reduction": round(float_bytes / store.index_bytes(), 2),
+                    **recall,
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                    "open_ms": round(open_seconds * 1000, 2),
+                }
+            )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--rerank", type=int, nargs="+")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            run(
+                args.chunks,
+                args.dim,
+                args.clusters,
+                args.noise,
+                args.queries,
+                args.k,
+                args.rerank,
+                args.seed,
+            ),
+            indent=2,
+        )
+    )
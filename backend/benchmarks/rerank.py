@@ -0,0 +1,161 @@
+"""
+Re-ranking Benchmark
+
+Compares single-stage retrieval of a fixed top_k with two-stage retrieval:
+over-fetching candidates, re-ranking them with a relevance scorer and keeping
+only those above the cutoff (at most top_k). For each configuration it
+reports, on the fixture vault and queries of the hybrid retrieval benchmark:
+1. recall@k of the expected source files
+2. Chunks and packed context tokens sent to the LLM per query
+3. Re-ranking latency (p50/p99)
+
+With a GGUF reranking model, the benchmark fails if any batch of pairs had to
+be scored one pair at a time instead of being decoded together.
+
+By default a trigram hashing stub embeds the chunks and a word overlap stub
+scores them, so the benchmark runs offline. Pass --embed-model to embed with
+an Ollama model, and --rerank-model to re-rank with a GGUF reranking model
+(e.g. bge-reranker-v2-m3) through llama.cpp.
+
+Usage (from the backend directory):
+    python -m benchmarks.rerank --k 3 5 10
+    python -m benchmarks.rerank --rerank-model models/bge-reranker-v2-m3-q8_0.gguf
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.load_latency import percentile
+from benchmarks.retrieval_hybrid import FIXTURE_DIR, load_queries
+from benchmarks.stubs import HashingEmbedder, StubRanker
+from rag import ChromaRag, ContextPacker, Reranker
+
+
+def source_names(metadatas):
+    """
+    Get the source file names of retrieved chunks.
+
+    Args:
+        metadatas (List[Dict[str, Any]]): Chunk metadata
+
+    Returns:
+        Set[str]: File names without directory and extension
+    """
+    return {os.path.splitext(os.path.basename(m["source"]))[0] for m in metadatas}
+
+
+def run(ks, min_scores, overfetch, embed_model=None, rerank_model=None):
+    """
+    Index the fixture vault and measure each retrieval configuration.
+
+    Args:
+        ks (List[int]): Values of top_k to evaluate
+        min_scores (List[float]): Relevance cutoffs to evaluate
+        overfetch (int): Candidates retrieved per requested chunk
+        embed_model (Optional[str]): Ollama embedding model, None for the stub
+        rerank_model (Optional[str]): GGUF reranking model, None for the stub
+
+    Returns:
+        List[Dict[str, Any]]: One result per top_k, for single-stage retrieval
+        and for re-ranking with each cutoff
+    """
+
+    if rerank_model:
+        from llm import LlamaRanker
+
+        ranker = LlamaRanker(rerank_model)
+        score_fn = ranker.score
+    else:
+        ranker = None
+        score_fn = StubRanker().score
+
+    queries = load_queries()
+    packer = ContextPacker()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = ChromaRag(
+            source_directory=FIXTURE_DIR,
+            collection_name="bench",
+            db_path=os.path.join(tmp, "db"),
+            model_name=embed_model or "stub",
+            embed_fn=None if embed_model else HashingEmbedder(),
+            retrieval_cache_size=0,
+        )
+
+        configs = [(k, None) for k in ks] + [
+            (k, min_score) for k in ks for min_score in min_scores
+        ]
+
+        for k, min_score in configs:
+            reranker = (
+                None
+                if min_score is None
+                else Reranker(score_fn, min_score=min_score, overfetch=overfetch)
+            )
+            recalls, chunks, tokens, latencies = [], [], [], []
+
+            for item in queries:
+                docs, ids, metadata = rag.retrieve(
+                    item["query"], k=reranker.candidates(k) if reranker else k
+                )
+                if reranker:
+                    start = time.perf_counter()
+                    docs, ids, metadata = reranker.rerank(
+                        item["query"], docs, ids, metadata, k
+                    )
+                    latencies.append(time.perf_counter() - start)
+
+                expected = set(item["expected"])
+                recalls.append(len(source_names(metadata) & expected) / len(expected))
+                chunks.append(len(docs))
+                tokens.append(packer.pack(docs, ids, metadata)["tokens_after"])
+
+            results.append(
+                {
+                    "k": k,
+                    "rerank": reranker is not None,
+                    "min_score": min_score,
+                    "candidates": reranker.candidates(k) if reranker else k,
+                    "recall": round(statistics.mean(recalls), 3),
+                    "chunks_per_query": round(statistics.mean(chunks), 2),
+                    "context_tokens_per_query": round(statistics.mean(tokens), 1),
+                    "rerank_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "rerank_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                }
+            )
+
+    if ranker is not None and ranker.fallbacks:
+        raise RuntimeError(
+            f"{ranker.fallbacks} of {ranker.batches} re-ranking batches could not "
+            "be decoded together and were scored one pair at a time"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--min-score", type=float, nargs="+", default=[0.1, 0.5])
+    parser.add_argument("--overfetch", type=int, default=4)
+    parser.add_argument("--embed-model", default=None)
+    parser.add_argument("--rerank-model", default=None)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            run(
+                args.k,
+                args.min_score,
+                args.overfetch,
+                args.embed_model,
+                args.rerank_model,
+            ),
+            indent=2,
+        )
+    )
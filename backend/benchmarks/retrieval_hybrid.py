@@ -0,0 +1,114 @@
+"""
+Hybrid Retrieval Benchmark
+
+Compares dense ("vector") and fused BM25 + dense ("hybrid") retrieval on a
+small fixture vault of campaign notes full of proper nouns, reporting recall@k
+and query latency for each mode.
+
+Expected source files per query, by file name without extension, are listed
+in fixtures/campaign/queries.json.
+Recall@k is the fraction of a query's expected source files that appear among
+the sources of its top k chunks, averaged over all queries.
+
+By default a trigram hashing stub embeds the chunks, so the benchmark runs
+offline. Pass --model to embed with a real Ollama embedding model instead.
+
+Usage (from the backend directory):
+    python -m benchmarks.retrieval_hybrid --k 1 3 5
+    python -m benchmarks.retrieval_hybrid --model nomic-embed-text
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import HashingEmbedder
+from rag import ChromaRag
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "campaign")
+
+
+def load_queries(path=None):
+    """
+    Load the benchmark queries and their expected source files.
+
+    Args:
+        path (Optional[str]): Path of the queries JSON file (default: the
+            fixture vault's queries.json)
+
+    Returns:
+        List[Dict[str, Any]]: Queries with "query" and "expected" keys
+    """
+
+    with open(path or os.path.join(FIXTURE_DIR, "queries.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run(ks, model=None, repeats=5):
+    """
+    Index the fixture vault and measure recall@k and latency per mode.
+
+    Args:
+        ks (List[int]): Values of k to evaluate
+        model (Optional[str]): Ollama embedding model, None for the stub
+        repeats (int): Timed runs per query, the retrieval cache is disabled
+
+    Returns:
+        List[Dict[str, Any]]: One result per mode and k
+    """
+
+    queries = load_queries()
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rag = ChromaRag(
+            source_directory=FIXTURE_DIR,
+            collection_name="bench",
+            db_path=os.path.join(tmp, "db"),
+            model_name=model or "stub",
+            embed_fn=None if model else HashingEmbedder(),
+            retrieval_cache_size=0,
+        )
+
+        for mode in ("vector", "hybrid"):
+            for k in ks:
+                recalls = []
+                latencies = []
+
+                for item in queries:
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        _, _, metadata = rag.retrieve(item["query"], k=k, mode=mode)
+                        latencies.append(time.perf_counter() - start)
+
+                    found = {
+                        os.path.splitext(os.path.basename(m["source"]))[0]
+                        for m in metadata
+                    }
+                    expected = set(item["expected"])
+                    recalls.append(len(found & expected) / len(expected))
+
+                results.append(
+                    {
+                        "mode": mode,
+                        "k": k,
+                        "recall": round(statistics.mean(recalls), 3),
+                        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+                        "max_ms": round(max(latencies) * 1000, 2),
+                    }
+                )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.k, args.model, args.repeats), indent=2))
@@ -0,0 +1,328 @@
+"""
+Deterministic Local Stubs for Benchmarks
+
+This module provides stand-ins for the Ollama services used by the backend so
+that benchmarks can run offline and produce comparable numbers between runs.
+
+Classes:
+    StubEmbedder: Drop-in replacement for ollama.embed
+    HashingEmbedder: StubEmbedder whose vectors reflect shared character trigrams
+    StubRanker: Drop-in replacement for llm.LlamaRanker
+    StubAssistant: Drop-in replacement for llm.InstructorAssistant
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+import typing
+
+from pydantic import BaseModel
+
+
+class StubEmbedder:
+    """
+    Deterministic embedder with the call signature of ollama.embed.
+
+    Each text is mapped to a pseudo-random unit vector seeded by its hash, and
+    every call sleeps to simulate the round trip and per-item cost of a real
+    embedding server.
+
+    Attributes:
+        dim (int): Dimension of the produced vectors
+        call_latency (float): Seconds of simulated latency per call
+        item_latency (float): Seconds of simulated latency per embedded text
+        calls (int): Number of calls made so far
+        items (int): Number of texts embedded so far
+    """
+
+    def __init__(self, dim=256, call_latency=0.005, item_latency=0.0002):
+        """
+        Initialize the stub embedder.
+
+        Args:
+            dim (int): Dimension of the produced vectors (default: 256)
+            call_latency (float): Simulated latency per call (default: 5ms)
+            item_latency (float): Simulated latency per text (default: 0.2ms)
+        """
+
+        self.dim = dim
+        self.call_latency = call_latency
+        self.item_latency = item_latency
+        self.calls = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def vector(self, text):
+        """
+        Create the deterministic unit vector for a text.
+
+        Args:
+            text (str): Text to embed
+
+        Returns:
+            List[float]: Vector embedding of the text
+        """
+
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.dim)]
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def __call__(self, model, input):
+        """
+        Embed text the way ollama.embed does.
+
+        Args:
+            model (str): Model name (ignored)
+            input (Union[str, List[str]]): Text, or list of texts, to embed
+
+        Returns:
+            Dict[str, List[List[float]]]: Response with an "embeddings" key
+        """
+
+        texts = [input] if isinstance(input, str) else list(input)
+
+        with self._lock:
+            self.calls += 1
+            self.items += len(texts)
+        time.sleep(self.call_latency + self.item_latency * len(texts))
+
+        return {"embeddings": [self.vector(text) for text in texts]}
+
+
+class HashingEmbedder(StubEmbedder):
+    """
+    Deterministic embedder whose vectors are similar for similar texts.
+
+    Each text is embedded as the normalized sum of pseudo-random vectors of its
+    character trigrams, so texts sharing vocabulary get a high cosine
+    similarity. This gives retrieval benchmarks a crude but meaningful dense
+    ranking without an embedding server.
+    """
+
+    def __init__(self, dim=256, call_latency=0.0, item_latency=0.0):
+        """
+        Initialize the hashing embedder.
+
+        Args:
+            dim (int): Dimension of the produced vectors (default: 256)
+            call_latency (float): Simulated latency per call (default: 0)
+            item_latency (float): Simulated latency per text (default: 0)
+        """
+
+        super().__init__(dim, call_latency, item_latency)
+        self._trigrams = {}
+
+    def _trigram_vector(self, trigram):
+        vector = self._trigrams.get(trigram)
+        if vector is None:
+            vector = super().vector(trigram)
+            self._trigrams[trigram] = vector
+        return vector
+
+    def vector(self, text):
+        """
+        Create the trigram-hashing unit vector for a text.
+
+        Args:
+            text (str): Text to embed
+
+        Returns:
+            List[float]: Vector embedding of the text
+        """
+
+        total = [0.0] * self.dim
+        for word in re.findall(r"\w+", text.lower()):
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                for j, v in enumerate(self._trigram_vector(padded[i : i + 3])):
+                    total[j] += v
+
+        norm = sum(v * v for v in total) ** 0.5 or 1.0
+        return [v / norm for v in total]
+
+
+class StubRanker:
+    """
+    Deterministic relevance scorer with the call signature of LlamaRanker.score.
+
+    A document's score is the fraction of the query's distinct words (of four
+    letters or more) it contains, so documents naming the query's proper nouns
+    score high. This gives re-ranking benchmarks a crude but meaningful second
+    stage without a reranking model.
+
+    Attributes:
+        item_latency (float): Seconds of simulated latency per scored document
+        calls (int): Number of calls made so far
+        items (int): Number of documents scored so far
+    """
+
+    def __init__(self, item_latency=0.0):
+        """
+        Initialize the stub ranker.
+
+        Args:
+            item_latency (float): Simulated latency per document (default: 0)
+        """
+
+        self.item_latency = item_latency
+        self.calls = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def words(text):
+        return {word for word in re.findall(r"\w+", text.lower()) if len(word) >= 4}
+
+    def score(self, query, documents):
+        """
+        Score documents against a query.
+
+        Args:
+            query (str): Query text
+            documents (List[str]): Documents to score
+
+        Returns:
+            List[float]: Relevance of each document between 0 and 1
+        """
+
+        with self._lock:
+            self.calls += 1
+            self.items += len(documents)
+
+        if self.item_latency:
+            time.sleep(self.item_latency * len(documents))
+
+        query_words = self.words(query)
+        if not query_words:
+            return [0.0] * len(documents)
+        return [
+            len(query_words & self.words(document)) / len(query_words)
+            for document in documents
+        ]
+
+
+def stub_instance(model):
+    """
+    Build a valid instance of a pydantic response model with placeholder values.
+
+    Args:
+        model (Type[BaseModel]): Response model to instantiate
+
+    Returns:
+        BaseModel: Instance of model with every field filled in
+    """
+
+    def value(annotation):
+        origin = typing.get_origin(annotation)
+        if origin in (list, typing.List):
+            return [value(typing.get_args(annotation)[0])]
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return stub_instance(annotation)
+        if annotation is int:
+            return 1
+        if annotation is float:
+            return 1.0
+        if annotation is bool:
+            return True
+        return "stub"
+
+    return model(
+        **{name: value(field.annotation) for name, field in model.model_fields.items()}
+    )
+
+
+class StubAssistant:
+    """
+    Deterministic stand-in for InstructorAssistant.
+
+    Sleeps to simulate generation and returns placeholder instances of the
+    requested response model.
+
+    Attributes:
+        model (str): Model identifier reported by the stub
+        latency (float): Seconds of simulated generation time per call
+        response_cache: Always None, the stub does not cache
+        pool: Always None, the stub is thread-safe
+        count_tokens: Always None, the stub has no tokenizer
+        calls (int): Number of generations so far
+    """
+
+    def __init__(self, latency=0.5):
+        """
+        Initialize the stub assistant.
+
+        Args:
+            latency (float): Simulated generation time in seconds (default: 0.5)
+        """
+
+        self.model = "stub"
+        self.latency = latency
+        self.response_cache = None
+        self.pool = None
+        self.count_tokens = None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def ask(
+        self,
+        query,
+        context,
+        response_model,
+        context_ids=None,
+        use_cache=True,
+        embed_fn=None,
+        usage=None,
+    ):
+        """
+        Simulate a structured generation.
+
+        Args:
+            query (str): The user's question or request
+            context (str): Additional context or relevant documents
+            response_model (Type[T]): Pydantic model class for response structure
+            context_ids (Optional[List[str]]): Ignored
+            use_cache (bool): Ignored
+            embed_fn (Optional[Callable]): Ignored
+            usage (Optional[Dict[str, Any]]): Filled with one attempt and no
+                token counts
+
+        Returns:
+            T: Placeholder instance of response_model
+        """
+
+        with self._lock:
+            self.calls += 1
+        if usage is not None:
+            usage.update(attempts=1, prompt_tokens=None, prefill_tokens_saved=None)
+        time.sleep(self.latency)
+        return stub_instance(response_model)
+
+    def ask_stream(
+        self,
+        query,
+        context,
+        response_model,
+        context_ids=None,
+        use_cache=True,
+        embed_fn=None,
+    ):
+        """
+        Simulate a streamed structured generation.
+
+        Yields:
+            T: Placeholder instance of response_model, once
+        """
+        yield self.ask(query, context, response_model, context_ids, use_cache)
+
+    def stats(self):
+        """
+        Get generation statistics.
+
+        Returns:
+            Dict containing the model and the number of generations
+        """
+        return {"model": self.model, "generations": self.calls}
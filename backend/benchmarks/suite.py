@@ -0,0 +1,382 @@
+"""
+Reproducible Benchmark Suite
+
+Runs ingestion, retrieval and the full /ask path against one synthetic vault,
+with the deterministic stub embedder and stub LLM, and writes the results as
+JSON so that runs can be compared, e.g. before and after a change:
+1. ingest: Full indexing of the vault, in chunks per second, and the time to
+   reopen the index (cold start)
+2. retrieve: ChromaRag.retrieve latency (p50/p95/p99) per retrieval mode
+3. ask: Latency of /ask through the Flask app, with a per-stage breakdown
+   from the Server-Timing header
+
+Every phase also reports the peak resident memory of the process so far.
+Caches are bypassed (distinct queries, no retrieval cache), and the vault and
+queries are generated from a seed, so repeated runs do the same work. Runs
+offline and on CPU only.
+
+Usage (from the backend directory):
+    python -m benchmarks.suite --files 200 --depth 3 --output before.json
+    python -m benchmarks.suite --files 200 --depth 3 --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.load_latency import percentile
+from benchmarks.stubs import StubAssistant, StubEmbedder
+from benchmarks.vault import WORDS, write_vault
+from rag import ChromaRag, ContextPacker
+
+
+def peak_rss():
+    """
+    Get the peak resident memory of the process so far.
+
+    Returns:
+        int: Peak resident set size in bytes
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux, in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def latency_summary(latencies):
+    """
+    Summarize latency samples.
+
+    Args:
+        latencies (List[float]): Latencies in seconds
+
+    Returns:
+        Dict[str, float]: Count, mean, p50, p95 and p99 in milliseconds and
+        throughput of sequential requests
+    """
+
+    total = sum(latencies)
+    return {
+        "requests": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "requests_per_sec": round(len(latencies) / total, 2) if total else 0.0,
+    }
+
+
+def make_queries(count, seed):
+    """
+    Generate distinct queries from the vault vocabulary.
+
+    Args:
+        count (int): Number of queries
+        seed (int): Random seed
+
+    Returns:
+        List[str]: Queries, each unique so no cache can answer it
+    """
+
+    rng = random.Random(seed)
+    return [f"{' '.join(rng.sample(WORDS, 4))} {i}" for i in range(count)]
+
+
+def bench_ingest(vault, db_path, args):
+    """
+    Index the whole vault from scratch, then time reopening the index.
+
+    Args:
+        vault (str): Vault directory
+        db_path (str): Database directory
+        args (argparse.Namespace): Benchmark options
+
+    Returns:
+        Tuple containing:
+        - ChromaRag: The indexed collection
+        - Dict[str, Any]: Ingestion results
+    """
+
+    embedder = StubEmbedder(dim=args.dim, call_latency=args.embed_latency)
+
+    start = time.perf_counter()
+    rag = ChromaRag(
+        source_directory=vault,
+        collection_name="bench",
+        db_path=db_path,
+        model_name="stub",
+        incremental=False,
+        batch_size=args.batch_size,
+        embed_fn=embedder,
+        embed_workers=args.workers,
+        retrieval_cache_size=0,
+        vector_store=args.vector_store,
+        vector_dtype=args.vector_dtype,
+    )
+    elapsed = time.perf_counter() - start
+
+    # Cold start: reopen the indexed collection without scanning the vault
+    start = time.perf_counter()
+    rag = ChromaRag(
+        source_directory=vault,
+        collection_name="bench",
+        db_path=db_path,
+        model_name="stub",
+        embed_fn=embedder,
+        retrieval_cache_size=0,
+        index=False,
+        vector_store=args.vector_store,
+        vector_dtype=args.vector_dtype,
+    )
+    open_elapsed = time.perf_counter() - start
+
+    chunks = rag.collection.count()
+    return rag, {
+        "chunks": chunks,
+        "embed_calls": embedder.calls,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(chunks / elapsed, 1),
+        "open_ms": round(open_elapsed * 1000, 2),
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def bench_retrieve(rag, queries, top_k):
+    """
+    Time ChromaRag.retrieve in every retrieval mode.
+
+    Args:
+        rag (ChromaRag): Indexed collection
+        queries (List[str]): Queries to retrieve for
+        top_k (int): Number of documents per query
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Latency summary per mode
+    """
+
+    results = {}
+    for mode in ("vector", "hybrid"):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            rag.retrieve(f"{mode} {query}", k=top_k, mode=mode)
+            latencies.append(time.perf_counter() - start)
+
+        results[mode] = {**latency_summary(latencies), "peak_rss_bytes": peak_rss()}
+
+    return results
+
+
+def parse_server_timing(header):
+    """
+    Parse a Server-Timing header.
+
+    Args:
+        header (str): Header value, e.g. "embed;dur=1.2, total;dur=3.4"
+
+    Returns:
+        Dict[str, float]: Milliseconds per stage
+    """
+
+    timings = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        if duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def bench_ask(rag, config, queries, top_k, llm_latency, tmp):
+    """
+    Time the full /ask path through the Flask app with a stub LLM.
+
+    Args:
+        rag (ChromaRag): Indexed collection
+        config (Dict[str, Any]): Collection configuration, see /setup
+        queries (List[str]): Queries to ask
+        top_k (int): Number of documents per query
+        llm_latency (float): Simulated generation time in seconds
+        tmp (str): Temporary directory for the collection registry
+
+    Returns:
+        Dict[str, Any]: Latency summary, errors and median milliseconds per
+        stage
+    """
+
+    import server
+    from service import CollectionRegistry
+
+    server.registry = CollectionRegistry(path=os.path.join(tmp, "collections.json"))
+    server.registry.add(rag, config)
+    server.instructor_assistant = StubAssistant(latency=llm_latency)
+    server.context_packer = ContextPacker()
+
+    client = server.app.test_client()
+    latencies, stages = [], {}
+    errors = 0
+
+    for query in queries:
+        start = time.perf_counter()
+        resp = client.post(
+            "/ask",
+            json={"query": f"ask {query}", "top_k": top_k},
+            headers={"X-Request-Timing": "1"},
+        )
+        latencies.append(time.perf_counter() - start)
+
+        if resp.status_code != 200:
+            errors += 1
+            continue
+        timings = parse_server_timing(resp.headers.get("Server-Timing", ""))
+        for stage, ms in timings.items():
+            stages.setdefault(stage, []).append(ms)
+
+    return {
+        **latency_summary(latencies),
+        "errors": errors,
+        "stages_p50_ms": {
+            stage: round(percentile(values, 50), 2) for stage, values in stages.items()
+        },
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def run(args):
+    """
+    Run every benchmark of the suite on a fresh vault.
+
+    Args:
+        args (argparse.Namespace): Benchmark options
+
+    Returns:
+        Dict[str, Any]: Options, environment and results per benchmark
+    """
+
+    queries = make_queries(args.queries, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = write_vault(
+            os.path.join(tmp, "vault"),
+            files=args.files,
+            sections=args.sections,
+            paragraphs=args.paragraphs,
+            seed=args.seed,
+            depth=args.depth,
+            words=args.words,
+        )
+        config = {
+            "source_directory": vault,
+            "collection_name": "bench",
+            "db_path": os.path.join(tmp, "db"),
+            "model_name": "stub",
+            "vector_store": args.vector_store,
+            "vector_dtype": args.vector_dtype,
+        }
+
+        rag, ingest = bench_ingest(vault, config["db_path"], args)
+        retrieve = bench_retrieve(rag, queries, args.top_k)
+        ask = bench_ask(rag, config, queries, args.top_k, args.llm_latency, tmp)
+
+    return {
+        "options": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": {"ingest": ingest, "retrieve": retrieve, "ask": ask},
+    }
+
+
+def flatten(results, prefix=""):
+    """
+    Flatten nested results into dotted metric names.
+
+    Args:
+        results (Dict[str, Any]): Nested results
+        prefix (str): Name prefix of the current level
+
+    Returns:
+        Dict[str, float]: Numeric results by dotted name
+    """
+
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    """
+    Compare the results of two runs.
+
+    Args:
+        baseline (Dict[str, Any]): Output of an earlier run
+        current (Dict[str, Any]): Output of this run
+
+    Returns:
+        Dict[str, Dict[str, float]]: Baseline value, current value and change
+        in percent, per metric present in both runs
+    """
+
+    before = flatten(baseline["results"])
+    after = flatten(current["results"])
+
+    return {
+        name: {
+            "baseline": before[name],
+            "current": after[name],
+            "change_pct": round((after[name] - before[name]) / before[name] * 100, 1)
+            if before[name]
+            else None,
+        }
+        for name in before
+        if name in after
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--sections", type=int, default=4)
+    parser.add_argument("--paragraphs", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=2, choices=[2, 3, 4])
+    parser.add_argument("--words", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--vector-store", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument(
+        "--vector-dtype", default="float32", choices=["float32", "float16"]
+    )
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the results of a run")
+    args = parser.parse_args()
+
+    output = run(args)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            output["comparison"] = compare(json.load(f), output)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,59 @@
+"""
+Synthetic Markdown Vault Generator
+
+This module writes campaign-like markdown files with nested headers so that
+ingestion and retrieval can be benchmarked without real campaign documents.
+"""
+
+import os
+import random
+
+WORDS = (
+    "dragon tavern keeper ancient ruin forest village elder blacksmith rumour "
+    "sword shield amulet crypt goblin wizard tower river bridge merchant guard "
+    "king queen temple priest shadow storm mountain cave treasure map secret"
+).split()
+
+
+def write_vault(
+    path, files=100, sections=4, paragraphs=3, seed=0, depth=2, words=60
+):
+    """
+    Write a synthetic markdown vault to disk.
+
+    Every section produces one chunk when split by headers, so `paragraphs`
+    and `words` set the chunk length, and `depth` the length of the header
+    path stored with each chunk.
+
+    Args:
+        path (str): Directory to write the markdown files into
+        files (int): Number of markdown files (default: 100)
+        sections (int): Number of "##" sections per file (default: 4)
+        paragraphs (int): Number of paragraphs per section (default: 3)
+        seed (int): Random seed, the same seed produces the same vault
+        depth (int): Header depth of the sections, from 2 ("##" only) to 4
+            (nested "###" and "####" headers) (default: 2)
+        words (int): Number of words per paragraph (default: 60)
+
+    Returns:
+        str: Path of the vault directory
+    """
+
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+
+    for f in range(files):
+        lines = [f"# Chapter {f}", ""]
+
+        for s in range(sections):
+            lines += [f"## Section {f}-{s}", ""]
+            for level in range(3, min(max(depth, 2), 4) + 1):
+                lines += [f"{'#' * level} Part {f}-{s}-{level}", ""]
+
+            for _ in range(paragraphs):
+                lines += [" ".join(rng.choice(WORDS) for _ in range(words)), ""]
+
+        with open(os.path.join(path, f"chapter-{f}.md"), "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines))
+
+    return path
@@ -1 +1,4 @@
-from llm.responses import InstructorAssistant, Answer, NPCList, LocationList, PuzzleList, ItemList, RumourList, GeneratedNameList
\ No newline at end of file
+from llm.responses import InstructorAssistant, Answer, NPCList, LocationList, PuzzleList, ItemList, RumourList, GeneratedNameList
+from llm.cache import ResponseCache
+from llm.models import ModelManager, model_manager
+from llm.rerank import LlamaRanker
\ No newline at end of file
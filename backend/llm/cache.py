@@ -0,0 +1,208 @@
+"""
+Semantic Response Cache for Structured LLM Generation
+
+This module provides a ResponseCache class that stores validated responses of
+InstructorAssistant.ask so that repeated questions return in milliseconds
+instead of paying for another (possibly retried) LLM generation.
+
+A cached response is returned when either:
+1. The exact same prompt was sent to the same model for the same response model
+2. A near-duplicate query (embedding cosine similarity above a threshold) was
+   asked with the same model, response model and retrieved context IDs
+
+Context IDs should change along with the content of their chunks (the server
+appends a hash of each chunk's text), so a note edited in place does not keep
+serving answers cached for its old text.
+"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Exact and embedding-similarity cache of validated pydantic responses.
+
+    Attributes:
+        embed_fn: Function embedding a query string into a vector, None to
+            only serve exact matches
+        threshold (float): Minimum cosine similarity for a near-duplicate hit
+        max_entries (int): Maximum number of cached responses
+        exact_hits (int): Number of lookups served by an exact prompt match
+        semantic_hits (int): Number of lookups served by a similar query
+        misses (int): Number of lookups not found in the cache
+    """
+
+    def __init__(self, embed_fn=None, threshold=0.95, max_entries=512):
+        """
+        Initialize an empty cache.
+
+        Args:
+            embed_fn (Optional[Callable[[str], List[float]]]): Query embedder
+                used for near-duplicate matching (default: None)
+            threshold (float): Minimum cosine similarity for a near-duplicate
+                hit (default: 0.95)
+            max_entries (int): Maximum number of cached responses (default: 512)
+        """
+
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max(1, int(max_entries))
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(model, response_model, prompt, context_ids):
+        """
+        Build the exact-match key of a request.
+
+        Args:
+            model (str): Identifier of the LLM
+            response_model (Type[BaseModel]): Pydantic model of the response
+            prompt (str): Full prompt sent to the LLM
+            context_ids (Sequence[str]): IDs of the retrieved context chunks
+
+        Returns:
+            str: Key identifying the request
+        """
+
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return "\0".join(
+            [model, response_model.__name__, prompt_hash, *sorted(context_ids)]
+        )
+
+    @staticmethod
+    def similarity(a, b):
+        """
+        Compute the cosine similarity of two vectors.
+
+        Args:
+            a (List[float]): First vector
+            b (List[float]): Second vector
+
+        Returns:
+            float: Cosine similarity, 0.0 if either vector is empty
+        """
+
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+
+    def get(self, model, response_model, query, prompt, context_ids, embed_fn=None):
+        """
+        Look up a cached response.
+
+        Args:
+            model (str): Identifier of the LLM
+            response_model (Type[T]): Pydantic model of the response
+            query (str): User's question or request
+            prompt (str): Full prompt sent to the LLM
+            context_ids (Sequence[str]): IDs of the retrieved context chunks
+            embed_fn (Optional[Callable[[str], List[float]]]): Query embedder
+                for this lookup, overriding the cache's own embed_fn, e.g.
+                the embedder of the collection the context came from
+
+        Returns:
+            Tuple containing:
+            - Optional[T]: Cached response, None on a miss
+            - Optional[List[float]]: Query embedding, to pass on to put()
+        """
+
+        key = self.key(model, response_model, prompt, context_ids)
+        group = (model, response_model.__name__, tuple(sorted(context_ids)))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return response_model.model_validate(entry["data"]), None
+
+        embed_fn = embed_fn or self.embed_fn
+        if embed_fn is None:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        embedding = embed_fn(query)
+
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for entry_key, entry in self._entries.items():
+                if entry["group"] != group or entry["embedding"] is None:
+                    continue
+
+                score = self.similarity(embedding, entry["embedding"])
+                if score >= best_score:
+                    best_key, best_score = entry_key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None, embedding
+
+            self._entries.move_to_end(best_key)
+            self.semantic_hits += 1
+            data = self._entries[best_key]["data"]
+
+        return response_model.model_validate(data), embedding
+
+    def put(self, model, response_model, prompt, context_ids, response, embedding=None):
+        """
+        Store a validated response.
+
+        Args:
+            model (str): Identifier of the LLM
+            response_model (Type[T]): Pydantic model of the response
+            prompt (str): Full prompt sent to the LLM
+            context_ids (Sequence[str]): IDs of the retrieved context chunks
+            response (T): Validated response to cache
+            embedding (Optional[List[float]]): Query embedding returned by get()
+        """
+
+        key = self.key(model, response_model, prompt, context_ids)
+        entry = {
+            "group": (model, response_model.__name__, tuple(sorted(context_ids))),
+            "embedding": embedding,
+            "data": response.model_dump(),
+        }
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every cached response.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict containing:
+            - exact_hits: Lookups served by an exact prompt match
+            - semantic_hits: Lookups served by a near-duplicate query
+            - misses: Lookups not found in the cache
+            - entries: Number of cached responses
+            - max_entries: Maximum number of cached responses
+        """
+
+        with self._lock:
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
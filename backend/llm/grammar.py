@@ -0,0 +1,112 @@
+"""
+Compiled Output Grammars for Constrained Decoding
+
+This module provides a GrammarCache class that turns each pydantic response
+model (NPCList, LocationList, ...) into the artifacts needed to constrain
+decoding to valid output, once per model instead of on every request:
+1. Its JSON schema, passed to Ollama as the `format` of a chat request
+2. A GBNF grammar compiled from the schema, passed to llama.cpp sampling
+3. The schema instructions appended to the system prompt
+
+With the output constrained to the schema during sampling, responses parse on
+the first attempt and validation retries become rare.
+"""
+
+import json
+import threading
+
+from llama_cpp import LlamaGrammar
+
+
+class GrammarCache:
+    """
+    Per response model cache of JSON schemas and compiled grammars.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty cache.
+        """
+
+        self._lock = threading.Lock()
+        self._schemas = {}
+        self._grammars = {}
+
+    def schema(self, response_model):
+        """
+        Get the JSON schema of a response model.
+
+        Args:
+            response_model (Type[BaseModel]): Pydantic model of the response
+
+        Returns:
+            Dict[str, Any]: JSON schema of the model
+        """
+
+        with self._lock:
+            schema = self._schemas.get(response_model)
+            if schema is None:
+                schema = response_model.model_json_schema()
+                self._schemas[response_model] = schema
+            return schema
+
+    def instructions(self, response_model):
+        """
+        Get the output instructions for a response model.
+
+        They are the same for every request of the model, so they belong in
+        the static prompt prefix.
+
+        Args:
+            response_model (Type[BaseModel]): Pydantic model of the response
+
+        Returns:
+            str: Instructions describing the expected JSON output
+        """
+
+        return (
+            "Respond only with a JSON object matching this JSON schema:\n"
+            f"{json.dumps(self.schema(response_model), indent=2)}"
+        )
+
+    def grammar(self, response_model):
+        """
+        Get the llama.cpp grammar constraining output to a response model.
+
+        The grammar is compiled on first use and shared by every llama.cpp
+        instance afterwards.
+
+        Args:
+            response_model (Type[BaseModel]): Pydantic model of the response
+
+        Returns:
+            llama_cpp.LlamaGrammar: Grammar of the model's JSON schema
+        """
+
+        schema = self.schema(response_model)
+
+        with self._lock:
+            grammar = self._grammars.get(response_model)
+            if grammar is None:
+                grammar = LlamaGrammar.from_json_schema(
+                    json.dumps(schema), verbose=False
+                )
+                self._grammars[response_model] = grammar
+            return grammar
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict containing:
+            - schemas: Number of cached JSON schemas
+            - grammars: Number of compiled llama.cpp grammars
+        """
+
+        with self._lock:
+            return {"schemas": len(self._schemas), "grammars": len(self._grammars)}
+
+
+# Shared by every InstructorAssistant of the process
+grammar_cache = GrammarCache()
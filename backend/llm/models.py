@@ -0,0 +1,416 @@
+"""
+llama.cpp Model Manager
+
+This module provides a ModelManager class that loads each local GGUF model
+once and shares it between InstructorAssistant instances, so calling /setup
+again does not reload several GB of weights from disk.
+
+Models are cached by (path, parameters) as a LlamaPool: a small pool of
+llama_cpp.Llama instances with their own contexts, so that several generations
+can run in parallel. The weights are memory-mapped, so every instance of a
+pool shares the same pages of the model file and only adds its own context
+(KV cache) to memory use. Instances are loaded lazily, on first use.
+
+Every instance keeps a RAM cache of evaluated prompt states
+(PromptStateCache), so prompts sharing a prefix with an earlier prompt, such
+as the static system preamble and response schema, skip the prefill of that
+prefix. The number of prompt tokens reused this way is counted per instance.
+Prompt lookup decoding needs the logits of every token (logits_all), so with
+it each cached state also keeps n_tokens * n_vocab logits, e.g. 128 KB per
+token of a 32k-vocabulary model. The cache capacity counts them, and it is
+spent once per instance, so a pool can use up to size * cache_bytes for
+its caches.
+
+llama_cpp.Llama creates its context with the library's default number of
+sequences, one, and older versions take no n_seq_max argument. A pool whose
+params include n_seq_max, such as the reranker's, which decodes a batch of
+pairs as one sequence each, creates its contexts through
+context_sequences so the setting applies to every version.
+
+The resident memory added by loading each instance is reported alongside
+the load time. It is read with psutil (in requirements.txt), or from
+/proc/self/statm on Linux installs without it.
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import llama_cpp
+from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def resident_memory():
+    """
+    Get the resident memory of the current process.
+
+    Returns:
+        Optional[int]: Resident set size in bytes, None if neither psutil nor
+        /proc is available
+    """
+
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def state_bytes(state):
+    """
+    Get the memory held by a saved prompt state.
+
+    Args:
+        state (llama_cpp.LlamaState): State saved by Llama.save_state
+
+    Returns:
+        int: Bytes of the context state (KV cache), logits and tokens
+    """
+    return state.llama_state_size + state.scores.nbytes + state.input_ids.nbytes
+
+
+class PromptStateCache(llama_cpp.LlamaRAMCache):
+    """
+    RAM cache of prompt states whose capacity counts all memory of a state.
+
+    LlamaRAMCache only counts the context state of each entry. With
+    logits_all, an entry also holds the logits of its prompt tokens, which for
+    a 7B model take about as much memory as its KV cache.
+    """
+
+    @property
+    def cache_size(self):
+        return sum(state_bytes(state) for state in self.cache_state.values())
+
+
+# Number of sequences of the contexts created by the current thread
+_sequences = threading.local()
+_context_default_params = llama_cpp.llama_cpp.llama_context_default_params
+
+
+def _context_params_with_sequences():
+    params = _context_default_params()
+    params.n_seq_max = getattr(_sequences, "n_seq_max", params.n_seq_max)
+    return params
+
+
+@contextmanager
+def context_sequences(n_seq_max):
+    """
+    Make the llama.cpp contexts created by this thread hold n_seq_max sequences.
+
+    llama_cpp.Llama starts from llama_context_default_params, so it is
+    replaced by a version that applies the current thread's setting. Other
+    threads keep the library's default.
+
+    Args:
+        n_seq_max (int): Sequences per context, at most LLAMA_MAX_SEQ
+    """
+
+    llama_cpp.llama_cpp.llama_context_default_params = _context_params_with_sequences
+    _sequences.n_seq_max = int(n_seq_max)
+    try:
+        yield
+    finally:
+        del _sequences.n_seq_max
+
+
+class LlamaPool:
+    """
+    Pool of llama.cpp instances of one model, loaded on demand.
+
+    Attributes:
+        model_path (str): Path of the GGUF model file
+        params (Dict[str, Any]): Keyword arguments of llama_cpp.Llama
+        draft_tokens (int): Tokens predicted by prompt lookup decoding, 0 to
+            disable speculative decoding
+        size (int): Maximum number of instances
+        cache_bytes (int): Capacity of each instance's prompt state cache,
+            including the logits of the states, 0 to only reuse the prefix of
+            the previous prompt
+        instances (List[llama_cpp.Llama]): Instances loaded so far
+        load_seconds (List[float]): Load time of each instance
+        memory_bytes (List[Optional[int]]): Resident memory added by loading
+            each instance, None if unknown
+    """
+
+    def __init__(self, model_path, params, draft_tokens=0, size=1, cache_bytes=0):
+        """
+        Create an empty pool, no instance is loaded until it is needed.
+
+        Args:
+            model_path (str): Path of the GGUF model file
+            params (Dict[str, Any]): Keyword arguments of llama_cpp.Llama
+            draft_tokens (int): Prompt lookup decoding tokens, 0 to disable
+                (default: 0)
+            size (int): Maximum number of instances (default: 1)
+            cache_bytes (int): Prompt state cache capacity per instance, 0 to
+                disable (default: 0)
+        """
+
+        self.model_path = model_path
+        self.params = params
+        self.draft_tokens = draft_tokens
+        self.size = max(1, int(size))
+        self.cache_bytes = int(cache_bytes)
+        self.instances = []
+        self.load_seconds = []
+        self.memory_bytes = []
+
+        # Guards the lists above and the number of instances being loaded.
+        # Loading itself takes seconds and runs outside of it, so stats()
+        # does not wait for a load
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+        self._loading = 0
+        self._idle = queue.LifoQueue()
+
+    def load(self):
+        """
+        Load a new instance of the model and add it to the pool's instances.
+
+        The pool's lock is only taken to add the instance, not while loading.
+
+        Returns:
+            llama_cpp.Llama: The loaded instance
+        """
+
+        before = resident_memory()
+        start = time.perf_counter()
+
+        with context_sequences(self.params.get("n_seq_max", 1)):
+            llama = llama_cpp.Llama(
+                model_path=self.model_path,
+                use_mmap=True,
+                draft_model=(
+                    LlamaPromptLookupDecoding(num_pred_tokens=self.draft_tokens)
+                    if self.draft_tokens
+                    else None
+                ),
+                # Only prompt lookup decoding reads the logits of every token.
+                # Llama forces logits_all with a draft model, but only sizes
+                # its logits buffer for all tokens when it is passed explicitly
+                **{"logits_all": bool(self.draft_tokens), **self.params},
+            )
+
+        if self.cache_bytes:
+            llama.set_cache(PromptStateCache(capacity_bytes=self.cache_bytes))
+        self.track_prefill(llama)
+
+        elapsed = time.perf_counter() - start
+        after = resident_memory()
+
+        with self._lock:
+            self.instances.append(llama)
+            self.load_seconds.append(elapsed)
+            self.memory_bytes.append(
+                None if before is None or after is None else after - before
+            )
+        return llama
+
+    def _load_reserved(self):
+        # Load an instance in a slot reserved by incrementing _loading
+        try:
+            return self.load()
+        finally:
+            with self._loaded:
+                self._loading -= 1
+                self._loaded.notify_all()
+
+    @staticmethod
+    def track_prefill(llama):
+        """
+        Count the prompt tokens of an instance, and how many skip prefill.
+
+        Llama.generate reuses the KV state of the longest common prefix of
+        the new prompt and the tokens already evaluated (possibly just
+        restored from the prompt state cache), except for the last prompt
+        token. The counts are kept in llama.prefill_counts.
+
+        Args:
+            llama (llama_cpp.Llama): Instance to instrument
+        """
+
+        llama.prefill_counts = {"prompt_tokens": 0, "reused_tokens": 0}
+        generate = llama.generate
+
+        def counted_generate(tokens, *args, **kwargs):
+            reused = llama_cpp.Llama.longest_token_prefix(
+                llama._input_ids, tokens[:-1]
+            )
+            llama.prefill_counts["prompt_tokens"] += len(tokens)
+            llama.prefill_counts["reused_tokens"] += reused
+            return generate(tokens, *args, **kwargs)
+
+        llama.generate = counted_generate
+
+    def first(self):
+        """
+        Get an instance without reserving it, loading one if none exists.
+
+        Only for operations that do not touch the context, such as
+        tokenization.
+
+        Returns:
+            llama_cpp.Llama: The first loaded instance
+        """
+
+        with self._loaded:
+            # Another caller is loading the first instance
+            while not self.instances and self._loading:
+                self._loaded.wait()
+            if self.instances:
+                return self.instances[0]
+            self._loading += 1
+
+        llama = self._load_reserved()
+        self._idle.put(llama)
+        return llama
+
+    def grow(self, size):
+        """
+        Raise the maximum number of instances, never lowering it.
+
+        Args:
+            size (int): New maximum number of instances
+        """
+
+        with self._lock:
+            self.size = max(self.size, int(size))
+
+    @contextmanager
+    def acquire(self):
+        """
+        Reserve an instance for one generation.
+
+        An idle instance is reused if there is one. Otherwise a new instance
+        is loaded while the pool is below its size, or the caller waits for
+        another generation to finish.
+
+        Yields:
+            llama_cpp.Llama: Instance reserved for the caller
+        """
+
+        try:
+            llama = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                reserved = len(self.instances) + self._loading < self.size
+                if reserved:
+                    self._loading += 1
+            llama = self._load_reserved() if reserved else self._idle.get()
+
+        try:
+            yield llama
+        finally:
+            self._idle.put(llama)
+
+    def stats(self):
+        """
+        Get load statistics of the pool.
+
+        Returns:
+            Dict containing:
+            - model_path, size: Model file and maximum number of instances
+            - loaded: Number of instances loaded
+            - loading: Number of instances being loaded
+            - idle: Number of loaded instances not generating
+            - model_bytes: Size of the memory-mapped model file
+            - load_seconds: Load time of each instance
+            - memory_bytes: Resident memory added by each instance, None if
+              it cannot be measured
+            - cache_bytes: Capacity of each instance's prompt state cache
+            - cached_bytes: Memory held by each instance's cached states
+        """
+
+        with self._lock:
+            return {
+                "model_path": self.model_path,
+                "size": self.size,
+                "loaded": len(self.instances),
+                "loading": self._loading,
+                "idle": self._idle.qsize(),
+                "model_bytes": os.path.getsize(self.model_path),
+                "load_seconds": [round(s, 3) for s in self.load_seconds],
+                "memory_bytes": list(self.memory_bytes),
+                "cache_bytes": self.cache_bytes,
+                "cached_bytes": [
+                    llama.cache.cache_size if getattr(llama, "cache", None) else 0
+                    for llama in self.instances
+                ],
+            }
+
+
+class ModelManager:
+    """
+    Process-wide cache of llama.cpp model pools, keyed by path and parameters.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty manager.
+        """
+
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def get(self, model_path, pool_size=1, draft_tokens=0, cache_bytes=0, **params):
+        """
+        Get the pool of a model, creating it on first use.
+
+        Pools with the same path and parameters are shared. Asking for a
+        larger pool_size than an existing pool has grows that pool.
+
+        Args:
+            model_path (str): Path of the GGUF model file
+            pool_size (int): Maximum number of parallel instances (default: 1)
+            draft_tokens (int): Prompt lookup decoding tokens, 0 to disable
+                (default: 0)
+            cache_bytes (int): Prompt state cache capacity per instance, 0 to
+                disable (default: 0)
+            **params: Other keyword arguments of llama_cpp.Llama, which must
+                be hashable, e.g. n_ctx=8192
+
+        Returns:
+            LlamaPool: Pool of the model
+        """
+
+        key = (model_path, draft_tokens, cache_bytes, tuple(sorted(params.items())))
+
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = LlamaPool(
+                    model_path, params, draft_tokens, pool_size, cache_bytes
+                )
+                self._pools[key] = pool
+            else:
+                pool.grow(pool_size)
+            return pool
+
+    def stats(self):
+        """
+        Get load statistics of every model pool.
+
+        Returns:
+            List[Dict[str, Any]]: Statistics per pool, see LlamaPool.stats
+        """
+
+        with self._lock:
+            pools = list(self._pools.values())
+        return [pool.stats() for pool in pools]
+
+
+# Shared by every InstructorAssistant of the process
+model_manager = ModelManager()
@@ -0,0 +1,252 @@
+"""
+llama.cpp Re-ranking Model
+
+This module provides a LlamaRanker class that scores how relevant documents
+are to a query with a small local cross-encoder in GGUF format, such as
+bge-reranker-v2-m3. Unlike the embedding model, which embeds the query and
+each document separately, a cross-encoder reads the query and a document
+together, which ranks the retrieved chunks much more precisely.
+
+The model is loaded with rank pooling through the shared ModelManager, so its
+weights are memory-mapped once per process, and several instances can score
+in parallel. Pairs are scored in batches through the public Llama.embed,
+which packs several sequences into one decode. The context is created with
+room for a whole batch: batch_size sequences of up to max_tokens tokens each.
+If a build still cannot decode a batch, its pairs are scored one at a time,
+which is counted in the ranker's statistics as a fallback.
+"""
+
+import math
+import threading
+
+import llama_cpp
+
+from llm.models import ModelManager, model_manager
+
+# llama.cpp contexts hold at most this many sequences (LLAMA_MAX_SEQ)
+MAX_SEQUENCES = 64
+
+
+def sigmoid(x):
+    """
+    Map a raw relevance score to the range 0 to 1.
+
+    Args:
+        x (float): Raw score (logit)
+
+    Returns:
+        float: Sigmoid of the score, without overflow for large scores
+    """
+
+    if x >= 0:
+        return 1 / (1 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1 + z)
+
+
+def pair_separator(llama):
+    """
+    Get the text placed between the query and the document of a pair.
+
+    llama.cpp's rerank lays a pair out as [BOS] query [EOS] [SEP] document
+    [EOS], with each special token only where the model's vocabulary asks for
+    it. BOS and the final EOS are added when the pair is tokenized, so only
+    the separator in the middle has to be written out.
+
+    Args:
+        llama (llama_cpp.Llama): Instance of the model
+
+    Returns:
+        str: The special tokens between query and document, as text
+    """
+
+    vocab = llama_cpp.llama_model_get_vocab(llama.model)
+    eos = llama.token_eos()
+    if eos == llama_cpp.LLAMA_TOKEN_NULL:
+        eos = llama_cpp.llama_vocab_sep(vocab)
+
+    tokens = []
+    if llama_cpp.llama_vocab_get_add_eos(vocab):
+        tokens.append(eos)
+    if llama_cpp.llama_vocab_get_add_sep(vocab):
+        tokens.append(llama_cpp.llama_vocab_sep(vocab))
+
+    return llama.detokenize(tokens, special=True).decode("utf-8", errors="ignore")
+
+
+class LlamaRanker:
+    """
+    Cross-encoder relevance scores from a llama.cpp reranking model.
+
+    Attributes:
+        model_path (str): Path of the GGUF reranking model
+        max_tokens (int): Maximum tokens of a (query, document) pair, longer
+            documents are truncated
+        batch_size (int): Pairs decoded together
+        pool (LlamaPool): Instances of the model
+        batches (int): Batches scored so far
+        fallbacks (int): Batches that failed to decode together and were
+            scored one pair at a time
+
+    Raises:
+        RuntimeError: If the installed llama-cpp-python has no rank pooling
+    """
+
+    def __init__(
+        self, model_path, max_tokens=1024, batch_size=16, pool_size=1, models=None
+    ):
+        """
+        Initialize the ranker, the model is loaded on first use.
+
+        Each instance's context holds batch_size * max_tokens tokens, so the
+        memory of a batch grows with both.
+
+        Args:
+            model_path (str): Path of the GGUF reranking model
+            max_tokens (int): Maximum tokens of a (query, document) pair
+                (default: 1024)
+            batch_size (int): Pairs decoded together, at most MAX_SEQUENCES
+                (default: 16)
+            pool_size (int): Parallel instances of the model (default: 1)
+            models (Optional[ModelManager]): Where the model is loaded and
+                shared (default: the process-wide model_manager)
+        """
+
+        if not hasattr(llama_cpp, "LLAMA_POOLING_TYPE_RANK"):
+            raise RuntimeError(
+                "Re-ranking needs llama-cpp-python with rank pooling, "
+                f"installed: {getattr(llama_cpp, '__version__', 'unknown')}"
+            )
+
+        self.model_path = model_path
+        self.max_tokens = int(max_tokens)
+        self.batch_size = max(1, min(int(batch_size), MAX_SEQUENCES))
+        self.batches = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+        models: ModelManager = models or model_manager
+        # A batch of pairs is decoded at once, as one sequence per pair, so
+        # the context and a single micro-batch must hold all of its tokens
+        batch_tokens = self.max_tokens * self.batch_size
+        self.pool = models.get(
+            model_path,
+            pool_size=pool_size,
+            embedding=True,
+            pooling_type=llama_cpp.LLAMA_POOLING_TYPE_RANK,
+            n_seq_max=self.batch_size,
+            n_ctx=batch_tokens,
+            n_batch=batch_tokens,
+            n_ubatch=batch_tokens,
+            verbose=False,
+        )
+
+    @staticmethod
+    def prepare(llama):
+        """
+        Make an instance tokenize the special tokens of a pair.
+
+        Llama.embed tokenizes its input as plain text, so the separator would
+        be split into ordinary tokens. The instance's tokenize is replaced
+        once so that special tokens written as text are parsed; the separator
+        is kept in llama.rank_separator.
+
+        Args:
+            llama (llama_cpp.Llama): Instance to prepare
+
+        Returns:
+            str: The separator between query and document
+        """
+
+        if not hasattr(llama, "rank_separator"):
+            tokenize = llama.tokenize
+
+            def special_tokenize(text, add_bos=True, special=False):
+                return tokenize(text, add_bos=add_bos, special=True)
+
+            llama.tokenize = special_tokenize
+            llama.rank_separator = pair_separator(llama)
+
+        return llama.rank_separator
+
+    def pair_text(self, llama, query, document):
+        """
+        Write a (query, document) pair out as text of at most max_tokens.
+
+        Args:
+            llama (llama_cpp.Llama): Instance prepared with prepare
+            query (str): Query text
+            document (str): Document text
+
+        Returns:
+            str: The pair, with the document truncated to fit max_tokens
+        """
+
+        text = f"{query}{llama.rank_separator}{document}"
+        excess = len(llama.tokenize(text.encode("utf-8"))) - self.max_tokens
+        if excess <= 0:
+            return text
+
+        body = llama.tokenize(document.encode("utf-8"), add_bos=False)
+        body = body[: max(0, len(body) - excess)]
+        document = llama.detokenize(body).decode("utf-8", errors="ignore")
+        return f"{query}{llama.rank_separator}{document}"
+
+    def score(self, query, documents):
+        """
+        Score documents against a query.
+
+        Up to batch_size pairs are decoded together. If a batch fails to
+        decode, its pairs are scored one at a time and the batch is counted
+        in fallbacks.
+
+        Args:
+            query (str): Query text
+            documents (List[str]): Documents to score
+
+        Returns:
+            List[float]: Relevance of each document between 0 and 1 (the
+            sigmoid of the model's score), in the same order as documents
+        """
+
+        scores = []
+        batches = fallbacks = 0
+
+        with self.pool.acquire() as llama:
+            self.prepare(llama)
+            pairs = [self.pair_text(llama, query, document) for document in documents]
+
+            for start in range(0, len(pairs), self.batch_size):
+                batch = pairs[start : start + self.batch_size]
+                batches += 1
+                try:
+                    embeddings = llama.embed(batch)
+                except (RuntimeError, ValueError):
+                    fallbacks += 1
+                    embeddings = [llama.embed(pair) for pair in batch]
+
+                # Rank pooling yields the score as the first value of a pair
+                scores += [sigmoid(embedding[0]) for embedding in embeddings]
+
+        with self._lock:
+            self.batches += batches
+            self.fallbacks += fallbacks
+
+        return scores
+
+    def stats(self):
+        """
+        Get load and batching statistics of the model.
+
+        Returns:
+            Dict[str, Any]: See LlamaPool.stats, with batch_size, batches and
+            fallbacks added
+        """
+
+        with self._lock:
+            batching = {
+                "batch_size": self.batch_size,
+                "batches": self.batches,
+                "fallbacks": self.fallbacks,
+            }
+        return {**self.pool.stats(), **batching}
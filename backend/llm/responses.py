@@ -15,16 +15,68 @@ Classes:
     GeneratedName: Model for fantasy name generation
 
     InstructorAssistant: Main class for handling LLM interactions
+
+Responses are generated through instructor, which validates the output and
+retries on errors, or, if enabled, with constrained decoding, where sampling
+itself is restricted to the JSON schema of the response model (a GBNF grammar
+on llama.cpp, the `format` schema on Ollama) so the output is valid on the
+first attempt.
+
+Prompt building, generation and validation are timed as stages of the
+process-wide metrics (see telemetry.metrics), along with LLM calls, retries,
+tokens and response cache hits.
 """
 
-from pydantic import BaseModel, Field
-from typing import List, Type, TypeVar
+from pydantic import BaseModel, Field, ValidationError
+from pydantic_core import from_json
+from typing import Callable, Iterator, List, Type, TypeVar
+from contextlib import contextmanager
+import queue
+import threading
 import instructor
-import llama_cpp
-from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+import ollama
+from llm.cache import ResponseCache
+from llm.grammar import GrammarCache, grammar_cache
+from llm.models import ModelManager, model_manager
+from telemetry import metrics
 
 T = TypeVar("T", bound=BaseModel)
 
+# Local llama.cpp model used when the chat model is "custom"
+CUSTOM_MODEL_PATH = r"C:\Users\shive\.lmstudio\models\lmstudio-community\Mistral-7B-Instruct-v0.3-GGUF\Mistral-7B-Instruct-v0.3-Q4_K_M.gguf"
+CUSTOM_MODEL_PARAMS = {
+    "n_gpu_layers": -1,
+    "chat_format": "chatml",
+    "n_batch": 512,
+    "n_ctx": 8192,
+    "verbose": False,
+    "low_vram": True,
+    "f16_kv": True,
+}
+CUSTOM_MODEL_DRAFT_TOKENS = 2
+
+# Capacity of the prompt state cache of each llama.cpp instance. Prompt lookup
+# decoding keeps the logits of every token, so a state of n tokens of the
+# 32k-vocabulary model takes about n * 256 KB (128 KB of logits, 128 KB of KV
+# cache): the 2 GB hold the states of around 8000 prompt tokens, e.g. four
+# prompts of 2000 tokens. Every instance of the pool has its own cache
+CUSTOM_MODEL_CACHE_BYTES = 2 << 30
+
+# Maximum number of generations per request, including validation retries
+MAX_ATTEMPTS = 5
+
+# Static instructions sent first, as the system message, on every request.
+# Together with the schema instructions appended to it, it is the same for
+# every request of a response model, so backends that reuse the KV state of a
+# common prompt prefix only prefill it once.
+SYSTEM_PROMPT = """You are a virtual assistant for a Dungeon Master running Dungeons & Dragons (D&D) sessions.
+
+- Helping prepare and run sessions by providing ideas, rules clarifications, encounter design, and narrative suggestions.
+- Answering queries using provided campaign documents, focusing only on the relevant content.
+- If no documents are provided, rely on your general D&D knowledge (primarily 5th Edition unless specified).
+
+Be accurate, concise, and helpful. Prioritize clarity when referencing documents. Prioritize clarity and creativity when assisting with gameplay and storytelling."""
+
 # --- List of all response models ---
 
 
@@ -161,12 +213,31 @@ class InstructorAssistant:
 
     Attributes:
         model (str): Identifier for the LLM model being used
-        create: Function for creating chat completions (varies by backend)
+        create: Function for creating chat completions on Ollama, None for
+            llama.cpp, where each pooled instance has its own (see generation)
+        pool (Optional[LlamaPool]): Pool of llama.cpp instances, None for Ollama
+        response_cache (Optional[ResponseCache]): Cache of validated responses
+        constrained (bool): Whether output is constrained to the response
+            model's JSON schema during sampling, instead of generated through
+            instructor
+        grammars (GrammarCache): JSON schemas and grammars per response model
+        generations (int): Number of requests answered by the LLM so far
+        attempts (int): Number of LLM calls so far, including retries
+        prompt_tokens (int): Prompt tokens of all llama.cpp generations
+        prefill_tokens_saved (int): Prompt tokens whose KV state was reused
+            instead of prefilled, over all llama.cpp generations
+        count_tokens: Function counting the tokens of a text with the model's
+            tokenizer, None if the backend does not expose one
     """
 
     def __init__(
         self,
         model: str,
+        response_cache: ResponseCache = None,
+        pool_size: int = 1,
+        models: ModelManager = None,
+        constrained: bool = False,
+        grammars: GrammarCache = None,
     ):
         """
         Initialize the assistant with specified model backend.
@@ -177,26 +248,36 @@ class InstructorAssistant:
         Args:
             model (str): Model identifier. Use "custom" for local llama.cpp model,
                         or model name for Ollama (e.g., "mistral")
+            response_cache (Optional[ResponseCache]): Cache consulted by ask()
+                before calling the LLM (default: None, no caching)
+            pool_size (int): Maximum number of llama.cpp instances generating
+                in parallel, each with its own context (default: 1)
+            models (Optional[ModelManager]): Where llama.cpp models are loaded
+                and cached (default: the process-wide model manager)
+            constrained (bool): Constrain sampling to the response model's
+                JSON schema, instead of generating through instructor with
+                validation retries (default: False)
+            grammars (Optional[GrammarCache]): Cache of compiled schemas and
+                grammars (default: the process-wide grammar cache)
         """
 
         if model.lower() == "custom":
             print("Using custom model with llama_cpp")
-            llama = llama_cpp.Llama(
-                model_path=r"C:\Users\shive\.lmstudio\models\lmstudio-community\Mistral-7B-Instruct-v0.3-GGUF\Mistral-7B-Instruct-v0.3-Q4_K_M.gguf",
-                n_gpu_layers=-1,
-                chat_format="chatml",
-                n_batch=512,
-                n_ctx=8192,
-                draft_model=LlamaPromptLookupDecoding(num_pred_tokens=2),
-                logits_all=True,
-                verbose=False,
-                low_vram=True,
-                f16_kv=True,
+
+            # Loaded once per process and only on first use, later /setup
+            # calls reuse the already loaded model
+            self.pool = (models or model_manager).get(
+                CUSTOM_MODEL_PATH,
+                pool_size=pool_size,
+                draft_tokens=CUSTOM_MODEL_DRAFT_TOKENS,
+                cache_bytes=CUSTOM_MODEL_CACHE_BYTES,
+                **CUSTOM_MODEL_PARAMS,
             )
+            self.create = None
+            self._creates = {}
 
-            self.create = instructor.patch(
-                create=llama.create_chat_completion_openai_v1,
-                mode=instructor.Mode.JSON_SCHEMA,
+            self.count_tokens = lambda text: len(
+                self.pool.first().tokenize(text.encode("utf-8"), add_bos=False)
             )
 
         else:
@@ -207,9 +288,176 @@ class InstructorAssistant:
                 mode=instructor.Mode.JSON,
             )
 
+            # Every attempt, including validation retries, is a completion
+            client.on("completion:kwargs", lambda *args, **kwargs: self.count_attempt())
+
             self.create = client.chat.completions.create
 
+            # Ollama handles concurrent requests itself
+            self.pool = None
+
+            self.count_tokens = None
+
         self.model = model
+        self.response_cache = response_cache
+        self.constrained = constrained
+        self.grammars = grammars or grammar_cache
+        self.generations = 0
+        self.attempts = 0
+        self.prompt_tokens = 0
+        self.prefill_tokens_saved = 0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+
+    def count_attempt(self):
+        """
+        Count an LLM call of the generation running in the current thread.
+        """
+        self._local.attempts = getattr(self._local, "attempts", 0) + 1
+
+    def instructor_create(self, llama):
+        """
+        Get the instructor-patched chat completion function of an instance.
+
+        Args:
+            llama (Optional[llama_cpp.Llama]): Pooled llama.cpp instance, None
+                for Ollama
+
+        Returns:
+            Function for creating chat completions, patched by instructor
+        """
+
+        if llama is None:
+            return self.create
+
+        create = self._creates.get(id(llama))
+        if create is None:
+            completion = llama.create_chat_completion_openai_v1
+
+            def counted_completion(*args, **kwargs):
+                self.count_attempt()
+                return completion(*args, **kwargs)
+
+            create = instructor.patch(
+                create=counted_completion,
+                mode=instructor.Mode.JSON_SCHEMA,
+            )
+            self._creates[id(llama)] = create
+
+        return create
+
+    @contextmanager
+    def generation(self, usage=None):
+        """
+        Reserve the backend for one generation.
+
+        For llama.cpp, an instance is taken from the pool for the duration of
+        the generation, waiting for one if all are busy, and the prompt tokens
+        it prefilled or reused (including validation retries) are counted.
+
+        Args:
+            usage (Optional[Dict[str, Any]]): Filled with "attempts" (LLM
+                calls, including retries), and "prompt_tokens" and
+                "prefill_tokens_saved" of the generation (None for Ollama)
+
+        Yields:
+            Optional[llama_cpp.Llama]: Reserved llama.cpp instance, None for
+            Ollama
+        """
+
+        self._local.attempts = 0
+        prompt_tokens = saved = None
+
+        try:
+            if self.pool is None:
+                yield None
+                return
+
+            with self.pool.acquire() as llama:
+                before = dict(llama.prefill_counts)
+                try:
+                    yield llama
+                finally:
+                    prompt_tokens = (
+                        llama.prefill_counts["prompt_tokens"]
+                        - before["prompt_tokens"]
+                    )
+                    saved = (
+                        llama.prefill_counts["reused_tokens"]
+                        - before["reused_tokens"]
+                    )
+        finally:
+            attempts = self._local.attempts
+
+            with self._stats_lock:
+                self.generations += 1
+                self.attempts += attempts
+                self.prompt_tokens += prompt_tokens or 0
+                self.prefill_tokens_saved += saved or 0
+
+            metrics.inc("dmi_llm_attempts_total", attempts)
+            metrics.inc("dmi_llm_retries_total", max(0, attempts - 1))
+            metrics.inc("dmi_llm_tokens_total", prompt_tokens or 0, direction="in")
+
+            if usage is not None:
+                usage.update(
+                    attempts=attempts,
+                    prompt_tokens=prompt_tokens,
+                    prefill_tokens_saved=saved,
+                )
+
+    def stats(self):
+        """
+        Get generation statistics.
+
+        Returns:
+            Dict containing:
+            - model: Identifier of the LLM
+            - constrained: Whether constrained decoding is used
+            - generations: Number of requests answered by the LLM
+            - attempts: Number of LLM calls, including retries
+            - retries: Number of LLM calls that retried a failed validation
+            - prompt_tokens: Prompt tokens of all llama.cpp generations
+            - prefill_tokens_saved: Prompt tokens reused from the KV cache
+            - grammars: Statistics of the grammar cache
+        """
+
+        with self._stats_lock:
+            return {
+                "model": self.model,
+                "constrained": self.constrained,
+                "generations": self.generations,
+                "attempts": self.attempts,
+                "retries": max(0, self.attempts - self.generations),
+                "prompt_tokens": self.prompt_tokens,
+                "prefill_tokens_saved": self.prefill_tokens_saved,
+                "grammars": self.grammars.stats(),
+            }
+
+    def build_messages(self, prompt: str, response_model: Type[T]) -> List[dict]:
+        """
+        Build the chat messages of a request, static system preamble first.
+
+        With constrained decoding, the schema instructions of the response
+        model are part of the system message. Otherwise instructor appends
+        its own.
+
+        Args:
+            prompt (str): User prompt from build_prompt
+            response_model (Type[T]): Pydantic model class for response structure
+
+        Returns:
+            List[dict]: System and user messages
+        """
+
+        system = SYSTEM_PROMPT
+        if self.constrained:
+            system = f"{system}\n\n{self.grammars.instructions(response_model)}"
+
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ]
 
     def build_prompt(
         self,
@@ -217,7 +465,10 @@ class InstructorAssistant:
         context: str,
     ) -> str:
         """
-        Construct a prompt for the LLM combining query and context.
+        Construct the user prompt for the LLM combining query and context.
+
+        The static instructions are not part of it, they are sent before it
+        as the system message (see build_messages).
 
         Args:
             query (str): User's question or request
@@ -228,16 +479,6 @@ class InstructorAssistant:
         """
 
         return f"""
-        ==================
-        You are a virtual assistant for a Dungeon Master running Dungeons & Dragons (D&D) sessions.
-
-        - Helping prepare and run sessions by providing ideas, rules clarifications, encounter design, and narrative suggestions.
-        - Answering queries using provided campaign documents, focusing only on the relevant content.
-        - If no documents are provided, rely on your general D&D knowledge (primarily 5th Edition unless specified).
-
-        Be accurate, concise, and helpful. Prioritize clarity when referencing documents. Prioritize clarity and creativity when assisting with gameplay and storytelling.
-        ==================
-
         ==================
         DOCUMENT CONTEXT:
         {context}
@@ -249,33 +490,316 @@ class InstructorAssistant:
         ==================
         """
 
+    def stream_json(self, llama, messages, response_model):
+        """
+        Generate JSON text constrained to a response model's schema.
+
+        Args:
+            llama (Optional[llama_cpp.Llama]): Reserved llama.cpp instance,
+                None for Ollama
+            messages (List[dict]): Chat messages
+            response_model (Type[T]): Pydantic model class for response structure
+
+        Yields:
+            str: Pieces of the generated JSON text
+        """
+
+        self.count_attempt()
+
+        with metrics.time("generate"):
+            if llama is None:
+                for chunk in ollama.chat(
+                    model=self.model,
+                    messages=messages,
+                    format=self.grammars.schema(response_model),
+                    stream=True,
+                ):
+                    if chunk.done:
+                        metrics.inc(
+                            "dmi_llm_tokens_total",
+                            chunk.prompt_eval_count or 0,
+                            direction="in",
+                        )
+                        metrics.inc(
+                            "dmi_llm_tokens_total",
+                            chunk.eval_count or 0,
+                            direction="out",
+                        )
+                    yield chunk.message.content or ""
+            else:
+                # llama.cpp streams one chunk per generated token
+                for chunk in llama.create_chat_completion(
+                    messages=messages,
+                    grammar=self.grammars.grammar(response_model),
+                    stream=True,
+                ):
+                    metrics.inc("dmi_llm_tokens_total", direction="out")
+                    yield chunk["choices"][0]["delta"].get("content") or ""
+
+    def generate_constrained(self, llama, messages, response_model, partials=False):
+        """
+        Generate a response with constrained decoding, validating it ourselves.
+
+        The grammar guarantees syntactically valid JSON of the right shape,
+        so a retry is only needed if pydantic validation still fails, e.g.
+        when the output was cut off. The validation error is then sent back
+        to the LLM, up to MAX_ATTEMPTS generations in total.
+
+        Args:
+            llama (Optional[llama_cpp.Llama]): Reserved llama.cpp instance,
+                None for Ollama
+            messages (List[dict]): Chat messages
+            response_model (Type[T]): Pydantic model class for response structure
+            partials (bool): Also yield partially generated responses, as
+                instances of instructor.Partial[response_model] (default: False)
+
+        Yields:
+            BaseModel: Partial responses if requested, followed by the
+            complete T instance
+
+        Raises:
+            pydantic.ValidationError: If no attempt produced a valid response
+        """
+
+        partial_model = instructor.Partial[response_model] if partials else None
+        messages = list(messages)
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            text = ""
+            for piece in self.stream_json(llama, messages, response_model):
+                text += piece
+                if partial_model is None or not piece:
+                    continue
+
+                try:
+                    yield partial_model.model_validate(
+                        from_json(text, allow_partial=True)
+                    )
+                except ValueError:
+                    continue
+
+            try:
+                with metrics.time("validate"):
+                    response = response_model.model_validate_json(text)
+            except ValidationError as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+
+                messages += [
+                    {"role": "assistant", "content": text},
+                    {
+                        "role": "user",
+                        "content": f"The JSON above is invalid:\n{e}\n"
+                        "Respond again with a corrected JSON object.",
+                    },
+                ]
+            else:
+                yield response
+                return
+
     def ask(
         self,
         query: str,
         context: str,
         response_model: Type[T],
+        context_ids: List[str] = None,
+        use_cache: bool = True,
+        embed_fn: Callable[[str], List[float]] = None,
+        usage: dict = None,
     ):
         """
         Send a query to the LLM and get a structured response.
 
+        If a response cache is configured, exact repeats of the prompt and
+        near-duplicate queries over the same retrieved context are answered
+        from the cache without calling the LLM.
+
         Args:
             query (str): The user's question or request
             context (str): Additional context or relevant documents
             response_model (Type[T]): Pydantic model class for response structure
+            context_ids (Optional[List[str]]): IDs of the retrieved documents,
+                part of the cache key (default: None)
+            use_cache (bool): Whether to consult and fill the response cache
+                (default: True)
+            embed_fn (Optional[Callable[[str], List[float]]]): Query embedder
+                for near-duplicate cache hits (default: the cache's own)
+            usage (Optional[Dict[str, Any]]): Filled with the LLM calls made,
+                the prompt tokens and the prefill tokens saved, see generation
+                (no calls and no tokens on a response cache hit)
 
         Returns:
             T: Instance of response_model containing the structured response
 
         Raises:
             instructor.exceptions.ValidationError: If response doesn't match model
+            pydantic.ValidationError: If a constrained response doesn't match
         """
 
-        prompt = self.build_prompt(query, context)
+        with metrics.time("prompt"):
+            prompt = self.build_prompt(query, context)
+
+        cache = self.response_cache if use_cache else None
+        context_ids = context_ids or []
+        embedding = None
 
-        response = self.create(
-            messages=[{"role": "user", "content": prompt}],
-            response_model=response_model,
-            max_retries=5,
-        )
+        if cache is not None:
+            cached, embedding = cache.get(
+                self.model, response_model, query, prompt, context_ids, embed_fn
+            )
+            metrics.inc(
+                "dmi_cache_requests_total",
+                cache="response",
+                result="miss" if cached is None else "hit",
+            )
+            if cached is not None:
+                if usage is not None:
+                    # Answered without calling the LLM
+                    usage.update(
+                        attempts=0, prompt_tokens=None, prefill_tokens_saved=None
+                    )
+                return cached
+
+        with metrics.time("prompt"):
+            messages = self.build_messages(prompt, response_model)
+
+        with self.generation(usage) as llama:
+            if self.constrained:
+                for response in self.generate_constrained(
+                    llama, messages, response_model
+                ):
+                    pass
+            else:
+                # Includes instructor's own validation and retries
+                with metrics.time("generate"):
+                    response = self.instructor_create(llama)(
+                        messages=messages,
+                        response_model=response_model,
+                        max_retries=MAX_ATTEMPTS,
+                    )
+
+        if cache is not None:
+            cache.put(
+                self.model, response_model, prompt, context_ids, response, embedding
+            )
 
         return response
+
+    def ask_stream(
+        self,
+        query: str,
+        context: str,
+        response_model: Type[T],
+        context_ids: List[str] = None,
+        use_cache: bool = True,
+        embed_fn: Callable[[str], List[float]] = None,
+    ) -> Iterator[BaseModel]:
+        """
+        Send a query to the LLM and stream partially generated responses.
+
+        Each yielded object is an instance of instructor.Partial[response_model]
+        with the fields generated so far. The final object is the fully
+        validated response, yielded once.
+
+        The generation runs in a background thread, which hands the partial
+        responses over through an unbounded queue. The backend (on llama.cpp,
+        the pooled instance) is therefore released as soon as the generation
+        ends, however slowly the caller consumes the stream. If the caller
+        stops consuming, the generation is stopped at its next partial.
+
+        Args:
+            query (str): The user's question or request
+            context (str): Additional context or relevant documents
+            response_model (Type[T]): Pydantic model class for response structure
+            context_ids (Optional[List[str]]): IDs of the retrieved documents,
+                part of the cache key (default: None)
+            use_cache (bool): Whether to consult and fill the response cache
+                (default: True)
+            embed_fn (Optional[Callable[[str], List[float]]]): Query embedder
+                for near-duplicate cache hits (default: the cache's own)
+
+        Yields:
+            BaseModel: Partial responses, followed by the complete T instance
+        """
+
+        with metrics.time("prompt"):
+            prompt = self.build_prompt(query, context)
+
+        cache = self.response_cache if use_cache else None
+        context_ids = context_ids or []
+        embedding = None
+
+        if cache is not None:
+            cached, embedding = cache.get(
+                self.model, response_model, query, prompt, context_ids, embed_fn
+            )
+            metrics.inc(
+                "dmi_cache_requests_total",
+                cache="response",
+                result="miss" if cached is None else "hit",
+            )
+            if cached is not None:
+                yield cached
+                return
+
+        with metrics.time("prompt"):
+            messages = self.build_messages(prompt, response_model)
+
+        partials = queue.Queue()
+        stopped = threading.Event()
+
+        def generate():
+            try:
+                with self.generation() as llama:
+                    if self.constrained:
+                        stream = self.generate_constrained(
+                            llama, messages, response_model, partials=True
+                        )
+                    else:
+                        stream = self.instructor_create(llama)(
+                            messages=messages,
+                            response_model=instructor.Partial[response_model],
+                            max_retries=MAX_ATTEMPTS,
+                            stream=True,
+                        )
+
+                    for partial in stream:
+                        if stopped.is_set():
+                            break
+                        partials.put(("partial", partial))
+            except Exception as e:
+                partials.put(("error", e))
+            else:
+                partials.put(("done", None))
+
+        threading.Thread(target=generate, daemon=True).start()
+
+        partial = None
+        try:
+            while True:
+                kind, item = partials.get()
+                if kind == "error":
+                    raise item
+                if kind == "done":
+                    break
+                partial = item
+                # The final object of a constrained stream is the validated
+                # response (not a Partial subclass of it), yielded below
+                if type(partial) is not response_model:
+                    yield partial
+        finally:
+            stopped.set()
+
+        if partial is None:
+            return
+
+        response = partial
+        if type(response) is not response_model:
+            response = response_model.model_validate(partial.model_dump())
+
+        if cache is not None:
+            cache.put(
+                self.model, response_model, prompt, context_ids, response, embedding
+            )
+
+        yield response
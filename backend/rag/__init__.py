@@ -1 +1,6 @@
-from rag.vector import ChromaRag
\ No newline at end of file
+from rag.vector import ChromaRag
+from rag.ingest import IngestionProgress
+from rag.lexical import BM25Index
+from rag.context import ContextPacker
+from rag.store import ChromaStore, NumpyStore, VectorStore
+from rag.rerank import Reranker
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Caches for RAG Ingestion and Retrieval
+
+This module provides:
+1. EmbeddingCache: stores embeddings on disk, content-addressed by the
+   embedding model name and a hash of the embedded text. Identical chunks
+   across campaigns, re-runs after a crash and repeated queries are then
+   served from disk instead of being sent to Ollama again.
+2. TTLCache: a small in-memory LRU cache whose entries also expire after a
+   time-to-live, used in front of retrieval results.
+
+Both caches are size-bounded and safe to share between threads.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed LRU cache of embeddings.
+
+    Attributes:
+        path (str): Path of the SQLite cache file
+        max_entries (int): Maximum number of cached embeddings
+        hits (int): Number of lookups served from the cache
+        misses (int): Number of lookups not found in the cache
+    """
+
+    def __init__(self, path, max_entries=50000):
+        """
+        Open (or create) the cache file.
+
+        Args:
+            path (str): Path of the SQLite cache file
+            max_entries (int): Maximum number of cached embeddings, the least
+                recently used entries are evicted beyond this (default: 50000)
+        """
+
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT MAX(last_used) FROM embeddings").fetchone()
+        self._clock = row[0] or 0
+
+    @staticmethod
+    def key(model_name, text):
+        """
+        Build the cache key for a text embedded with a given model.
+
+        Args:
+            model_name (str): Name of the embedding model
+            text (str): Embedded text
+
+        Returns:
+            str: Hex digest identifying the (model, text) pair
+        """
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name, texts):
+        """
+        Look up cached embeddings for several texts.
+
+        Args:
+            model_name (str): Name of the embedding model
+            texts (List[str]): Texts to look up
+
+        Returns:
+            List[Optional[List[float]]]: Embedding per text, None on a miss
+        """
+
+        keys = [self.key(model_name, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            unique = list(set(keys))
+            for start in range(0, len(unique), 500):
+                part = unique[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    part,
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                self._clock += 1
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found],
+                )
+                self._conn.commit()
+
+            results = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(array("f", blob).tolist())
+
+        return results
+
+    def put_many(self, model_name, texts, embeddings):
+        """
+        Store embeddings for several texts, evicting old entries if needed.
+
+        Args:
+            model_name (str): Name of the embedding model
+            texts (List[str]): Embedded texts
+            embeddings (List[List[float]]): Embedding per text
+        """
+
+        if not texts:
+            return
+
+        with self._lock:
+            self._clock += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) "
+                "VALUES (?, ?, ?)",
+                [
+                    (self.key(model_name, text), array("f", vector).tobytes(), self._clock)
+                    for text, vector in zip(texts, embeddings)
+                ],
+            )
+
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict containing:
+            - hits: Number of lookups served from the cache
+            - misses: Number of lookups not found in the cache
+            - entries: Number of cached embeddings
+            - max_entries: Maximum number of cached embeddings
+        """
+
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry time-to-live.
+
+    Attributes:
+        max_entries (int): Maximum number of cached values
+        ttl (Optional[float]): Seconds before an entry expires, None for never
+        hits (int): Number of lookups served from the cache
+        misses (int): Number of lookups not found, or expired, in the cache
+    """
+
+    def __init__(self, max_entries=256, ttl=600):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries (int): Maximum number of cached values (default: 256)
+            ttl (Optional[float]): Seconds before an entry expires, None or 0
+                for never (default: 600)
+        """
+
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Look up a value.
+
+        Args:
+            key (Hashable): Cache key
+
+        Returns:
+            Optional[Any]: Cached value, None on a miss or if expired
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and self.ttl and time.monotonic() > entry[0]:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+        """
+
+        expires = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict containing:
+            - hits: Number of lookups served from the cache
+            - misses: Number of lookups not found in the cache
+            - entries: Number of cached values
+            - max_entries: Maximum number of cached values
+        """
+
+        with self._lock:
+            entries = len(self._entries)
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
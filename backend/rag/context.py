@@ -0,0 +1,359 @@
+"""
+Context Assembly for Retrieved Chunks
+
+This module provides a ContextPacker class that turns the chunks returned by
+ChromaRag.retrieve into the document context of a prompt. Retrieved
+header-split chunks often overlap or come from the same part of the same file,
+so before they are sent to the LLM the packer:
+1. Drops near-duplicate chunks, keeping the more relevant one
+2. Merges chunks that are adjacent in the same source file into one block
+3. Packs the blocks, most relevant first, into a token budget
+
+Fewer prompt tokens means less prefill time on every generation.
+"""
+
+import math
+import re
+import threading
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+CHUNK_NUMBER_PATTERN = re.compile(r"-(\d+)$")
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text without a tokenizer.
+
+    Uses the common rule of thumb of about four characters per token for
+    English text.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated number of tokens
+    """
+    return math.ceil(len(text) / 4)
+
+
+class ContextPacker:
+    """
+    Deduplicates, merges and budgets retrieved chunks into a prompt context.
+
+    Attributes:
+        max_tokens (int): Default token budget of a packed context
+        dedup_threshold (float): Minimum word-shingle Jaccard similarity for
+            two chunks to count as duplicates
+        count_tokens: Function counting the tokens of a text
+        packed (int): Number of contexts packed so far
+        tokens_before (int): Total tokens of the retrieved chunks so far
+        tokens_after (int): Total tokens of the packed contexts so far
+    """
+
+    SEPARATOR = "\n\n---\n\n"
+
+    def __init__(self, max_tokens=3000, dedup_threshold=0.85, count_tokens=None):
+        """
+        Initialize the packer.
+
+        Args:
+            max_tokens (int): Default token budget (default: 3000)
+            dedup_threshold (float): Minimum Jaccard similarity of word
+                3-gram shingles for near-duplicates (default: 0.85)
+            count_tokens (Optional[Callable[[str], int]]): Token counter, e.g.
+                the chat model's tokenizer (default: estimate_tokens)
+        """
+
+        self.max_tokens = max(1, int(max_tokens))
+        self.dedup_threshold = dedup_threshold
+        self.count_tokens = count_tokens or estimate_tokens
+        self.packed = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def split_chunk(text):
+        """
+        Split a formatted chunk into its header lines and its content.
+
+        Args:
+            text (str): Chunk formatted by ChromaRag.split_document
+
+        Returns:
+            Tuple[str, str]: Header lines and content, the header is empty for
+            chunks without a "Content:" marker
+        """
+
+        header, marker, content = text.partition("\n\nContent:\n")
+        if not marker:
+            return "", text
+        return header, content
+
+    @staticmethod
+    def shingles(text, size=3):
+        """
+        Get the set of word n-grams of a text.
+
+        Args:
+            text (str): Text to shingle
+            size (int): Number of words per shingle (default: 3)
+
+        Returns:
+            Set[Tuple[str, ...]]: Word n-grams, or the single words of texts
+            shorter than size
+        """
+
+        words = WORD_PATTERN.findall(text.lower())
+        if len(words) < size:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+    @staticmethod
+    def chunk_number(chunk_id):
+        """
+        Get the position of a chunk within its file from its ID.
+
+        Args:
+            chunk_id (str): Chunk ID of the form "<source_basename>-<n>"
+
+        Returns:
+            Optional[int]: Position n, None if the ID has no position
+        """
+
+        match = CHUNK_NUMBER_PATTERN.search(chunk_id)
+        return int(match.group(1)) if match else None
+
+    def deduplicate(self, chunks):
+        """
+        Drop chunks whose content nearly duplicates a more relevant chunk.
+
+        Args:
+            chunks (List[Dict[str, Any]]): Chunks in relevance order
+
+        Returns:
+            Tuple containing:
+            - List[Dict[str, Any]]: Kept chunks, in relevance order
+            - List[str]: IDs of the dropped chunks
+        """
+
+        kept, dropped = [], []
+
+        for chunk in chunks:
+            shingles = self.shingles(chunk["content"])
+            duplicate = False
+
+            for other in kept:
+                union = shingles | other["shingles"]
+                if not union:
+                    duplicate = True
+                    break
+                overlap = len(shingles & other["shingles"]) / len(union)
+                if overlap >= self.dedup_threshold:
+                    duplicate = True
+                    break
+
+            if duplicate:
+                dropped.append(chunk["id"])
+            else:
+                chunk["shingles"] = shingles
+                kept.append(chunk)
+
+        return kept, dropped
+
+    def merge_adjacent(self, chunks):
+        """
+        Merge chunks that directly follow each other in the same source file.
+
+        The chunks of each source file are sorted by their position in the
+        file, and every run of consecutive positions becomes one block, in
+        whatever order its chunks were retrieved. A merged block keeps the
+        relevance rank of its best chunk, and its chunks are ordered as in
+        the file.
+
+        Args:
+            chunks (List[Dict[str, Any]]): Chunks in relevance order
+
+        Returns:
+            List[List[Dict[str, Any]]]: Blocks of chunks, in relevance order
+        """
+
+        # [rank of the best chunk, chunks] per block
+        blocks = []
+        by_source = {}
+
+        for rank, chunk in enumerate(chunks):
+            source = chunk["metadata"].get("source_basename")
+            number = self.chunk_number(chunk["id"])
+
+            if source is None or number is None:
+                blocks.append([rank, [chunk]])
+            else:
+                by_source.setdefault(source, []).append((number, rank, chunk))
+
+        for positions in by_source.values():
+            positions.sort(key=lambda position: position[:2])
+
+            block, previous = None, None
+            for number, rank, chunk in positions:
+                if block is not None and number <= previous + 1:
+                    block[0] = min(block[0], rank)
+                    block[1].append(chunk)
+                else:
+                    block = [rank, [chunk]]
+                    blocks.append(block)
+                previous = number
+
+        blocks.sort(key=lambda block: block[0])
+        return [block for _, block in blocks]
+
+    def format_block(self, block):
+        """
+        Format a block of chunks as one context entry.
+
+        The header lines of the first chunk are kept, and later chunks only
+        contribute their content, since they share the source file.
+
+        Args:
+            block (List[Dict[str, Any]]): Chunks of the block, in file order
+
+        Returns:
+            str: Formatted context entry
+        """
+
+        first = block[0]
+        if len(block) == 1 or not first["header"]:
+            return "\n\n".join(
+                [first["text"]] + [chunk["content"].strip() for chunk in block[1:]]
+            )
+
+        contents = "\n\n".join(chunk["content"].strip() for chunk in block)
+        return f"{first['header']}\n\nContent:\n{contents}"
+
+    def truncate(self, text, max_tokens):
+        """
+        Cut a text down to at most max_tokens tokens.
+
+        Args:
+            text (str): Text to truncate
+            max_tokens (int): Token budget
+
+        Returns:
+            str: Longest prefix of text, cut at a word boundary where possible,
+            that fits in the budget
+        """
+
+        if self.count_tokens(text) <= max_tokens:
+            return text
+
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+
+        cut = text[:low]
+        space = cut.rfind(" ")
+        return cut[:space] if space > 0 else cut
+
+    def pack(self, docs, ids, metadatas, max_tokens=None):
+        """
+        Assemble retrieved chunks into a prompt context within a token budget.
+
+        Blocks are added most relevant first. Blocks that do not fit in the
+        remaining budget are skipped, so a smaller, less relevant block can
+        still be included. If not even the most relevant block fits, it is
+        truncated to the budget.
+
+        Args:
+            docs (List[str]): Retrieved chunk texts, most relevant first
+            ids (List[str]): Chunk IDs
+            metadatas (List[Dict[str, Any]]): Chunk metadata
+            max_tokens (Optional[int]): Token budget (default: self.max_tokens)
+
+        Returns:
+            Dict containing:
+            - text: Context to put in the prompt
+            - ids: IDs of the chunks included in the context
+            - tokens_before: Tokens of all retrieved chunks, unpacked
+            - tokens_after: Tokens of the packed context
+            - dropped: IDs of duplicate chunks and chunks over budget
+        """
+
+        max_tokens = max(1, int(max_tokens or self.max_tokens))
+
+        chunks = []
+        for text, chunk_id, metadata in zip(docs, ids, metadatas):
+            header, content = self.split_chunk(text)
+            chunks.append(
+                {
+                    "id": chunk_id,
+                    "text": text,
+                    "header": header,
+                    "content": content,
+                    "metadata": metadata or {},
+                }
+            )
+
+        tokens_before = sum(self.count_tokens(chunk["text"]) for chunk in chunks)
+        kept, dropped = self.deduplicate(chunks)
+
+        separator_tokens = self.count_tokens(self.SEPARATOR)
+        entries, included = [], []
+        used = 0
+
+        for block in self.merge_adjacent(kept):
+            entry = self.format_block(block)
+            tokens = self.count_tokens(entry) + (separator_tokens if entries else 0)
+
+            if used + tokens > max_tokens:
+                if entries:
+                    dropped.extend(chunk["id"] for chunk in block)
+                    continue
+
+                entry = self.truncate(entry, max_tokens)
+                tokens = self.count_tokens(entry)
+
+            entries.append(entry)
+            included.extend(chunk["id"] for chunk in block)
+            used += tokens
+
+        text = self.SEPARATOR.join(entries)
+        tokens_after = self.count_tokens(text) if text else 0
+
+        with self._lock:
+            self.packed += 1
+            self.tokens_before += tokens_before
+            self.tokens_after += tokens_after
+
+        return {
+            "text": text,
+            "ids": included,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "dropped": dropped,
+        }
+
+    def stats(self):
+        """
+        Get packing statistics.
+
+        Returns:
+            Dict containing:
+            - packed: Number of contexts packed
+            - tokens_before: Total tokens of the retrieved chunks
+            - tokens_after: Total tokens of the packed contexts
+            - tokens_saved: Difference of the two
+            - max_tokens: Default token budget
+        """
+
+        with self._lock:
+            return {
+                "packed": self.packed,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+                "max_tokens": self.max_tokens,
+            }
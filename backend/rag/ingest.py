@@ -0,0 +1,268 @@
+"""
+Pipelined Ingestion Engine
+
+This module provides an IngestionPipeline class that overlaps the stages of
+building a RAG index instead of running them one after another:
+1. A producer thread streams document chunks and groups them into batches
+2. A bounded pool of worker threads embeds batches concurrently
+3. A single writer (the calling thread) commits embedded batches to storage
+
+All stages are connected by bounded queues, so a slow stage applies
+backpressure to the stages before it and memory use stays flat regardless of
+the size of the vault.
+
+It also provides an IngestionProgress class that the stages update, so that
+long-running indexing can report its progress while it runs.
+"""
+
+import queue
+import threading
+import time
+
+# Marks the end of a queue's stream
+_DONE = object()
+
+
+class IngestionProgress:
+    """
+    Thread-safe progress counters of an indexing run.
+
+    Attributes:
+        files_total (int): Number of source files to scan
+        files_scanned (int): Number of source files scanned so far
+        chunks_queued (int): Number of new or changed chunks found so far
+        chunks_embedded (int): Number of chunks embedded and stored so far
+        started (Optional[float]): time.time() when indexing started
+        finished (Optional[float]): time.time() when indexing finished
+    """
+
+    def __init__(self):
+        """
+        Initialize counters for an indexing run that has not started yet.
+        """
+
+        self.files_total = 0
+        self.files_scanned = 0
+        self.chunks_queued = 0
+        self.chunks_embedded = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def start(self, files_total):
+        """
+        Mark the start of indexing.
+
+        Args:
+            files_total (int): Number of source files to scan
+        """
+
+        with self._lock:
+            self.files_total = files_total
+            self.started = time.time()
+            self.finished = None
+
+    def add(self, files_scanned=0, chunks_queued=0, chunks_embedded=0):
+        """
+        Increment the progress counters.
+
+        Args:
+            files_scanned (int): Newly scanned source files
+            chunks_queued (int): Newly found new or changed chunks
+            chunks_embedded (int): Newly embedded and stored chunks
+        """
+
+        with self._lock:
+            self.files_scanned += files_scanned
+            self.chunks_queued += chunks_queued
+            self.chunks_embedded += chunks_embedded
+
+    def finish(self):
+        """
+        Mark the end of indexing.
+        """
+        with self._lock:
+            self.finished = time.time()
+
+    def snapshot(self):
+        """
+        Get the current progress, including throughput and an ETA.
+
+        The ETA extrapolates the number of chunks found per scanned file to the
+        remaining files, and divides the remaining chunks by the current rate.
+
+        Returns:
+            Dict containing:
+            - files_total, files_scanned, chunks_queued, chunks_embedded
+            - elapsed_seconds: Time since indexing started
+            - chunks_per_sec: Embedding throughput so far
+            - eta_seconds: Estimated time remaining, None if unknown
+        """
+
+        with self._lock:
+            if self.started is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self.finished or time.time()) - self.started
+
+            rate = self.chunks_embedded / elapsed if elapsed > 0 else 0.0
+
+            if self.finished is not None:
+                eta = 0.0
+            elif rate and self.files_scanned:
+                expected = self.chunks_queued * self.files_total / self.files_scanned
+                eta = max(0.0, expected - self.chunks_embedded) / rate
+            else:
+                eta = None
+
+            return {
+                "files_total": self.files_total,
+                "files_scanned": self.files_scanned,
+                "chunks_queued": self.chunks_queued,
+                "chunks_embedded": self.chunks_embedded,
+                "elapsed_seconds": round(elapsed, 2),
+                "chunks_per_sec": round(rate, 1),
+                "eta_seconds": None if eta is None else round(eta, 1),
+            }
+
+
+class IngestionPipeline:
+    """
+    Producer / embedding workers / single writer pipeline for chunk ingestion.
+
+    Attributes:
+        embed_batch: Function taking a list of texts and returning embeddings
+        store_batch: Function taking (batch, embeddings) and storing them
+        batch_size (int): Number of chunks per batch
+        workers (int): Number of concurrent embedding workers
+        queue_depth (int): Maximum number of batches waiting between stages
+    """
+
+    def __init__(self, embed_batch, store_batch, batch_size=64, workers=4, queue_depth=8):
+        """
+        Initialize the pipeline.
+
+        Args:
+            embed_batch (Callable[[List[str]], List[List[float]]]): Embeds a
+                list of texts, called concurrently from the worker threads
+            store_batch (Callable[[List[Tuple], List[List[float]]], None]):
+                Stores a batch of chunk triples, only called from one thread
+            batch_size (int): Number of chunks per batch (default: 64)
+            workers (int): Number of embedding workers (default: 4)
+            queue_depth (int): Bound of each inter-stage queue (default: 8)
+        """
+
+        self.embed_batch = embed_batch
+        self.store_batch = store_batch
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+        self.queue_depth = max(1, int(queue_depth))
+
+    def run(self, chunk_triples):
+        """
+        Embed and store every chunk, blocking until the pipeline has drained.
+
+        The chunk iterable is consumed lazily in the producer thread, so it may
+        be a generator that loads and splits documents on demand.
+
+        Args:
+            chunk_triples: Iterable of tuples containing (text, metadata, id)
+
+        Returns:
+            int: Number of chunks stored
+
+        Raises:
+            Exception: The first error raised by any stage of the pipeline
+        """
+
+        embed_queue = queue.Queue(maxsize=self.queue_depth)
+        store_queue = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+        errors = []
+
+        def put(q, item):
+            # Blocking put that gives up once another stage has failed
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fail(error):
+            errors.append(error)
+            stop.set()
+
+        def produce():
+            try:
+                batch = []
+                for triple in chunk_triples:
+                    batch.append(triple)
+                    if len(batch) >= self.batch_size:
+                        if not put(embed_queue, batch):
+                            return
+                        batch = []
+
+                if batch:
+                    put(embed_queue, batch)
+            except Exception as e:
+                fail(e)
+            finally:
+                for _ in range(self.workers):
+                    put(embed_queue, _DONE)
+
+        def embed():
+            try:
+                while not stop.is_set():
+                    try:
+                        batch = embed_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+
+                    if batch is _DONE:
+                        break
+
+                    embeddings = self.embed_batch([text for text, _, _ in batch])
+                    if not put(store_queue, (batch, embeddings)):
+                        break
+            except Exception as e:
+                fail(e)
+            finally:
+                put(store_queue, _DONE)
+
+        threads = [threading.Thread(target=produce, daemon=True)]
+        threads += [
+            threading.Thread(target=embed, daemon=True) for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        stored = 0
+        finished_workers = 0
+
+        try:
+            while finished_workers < self.workers and not stop.is_set():
+                try:
+                    item = store_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                if item is _DONE:
+                    finished_workers += 1
+                    continue
+
+                batch, embeddings = item
+                self.store_batch(batch, embeddings)
+                stored += len(batch)
+        except Exception as e:
+            fail(e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return stored
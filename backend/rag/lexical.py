@@ -0,0 +1,217 @@
+"""
+Lexical BM25 Index for Hybrid Retrieval
+
+This module provides a BM25Index class, an in-process inverted index over the
+chunks stored in a ChromaDB collection. Dense retrieval tends to miss exact
+proper nouns (NPC names, town names), which BM25 ranks highly, so the two
+rankings are fused with reciprocal rank fusion (see reciprocal_rank_fusion).
+
+The index is built alongside the collection and persisted as JSON next to it.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        List[str]: Tokens in order of appearance
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several rankings of document IDs with reciprocal rank fusion.
+
+    Each document scores sum(1 / (k + rank)) over the rankings it appears in.
+
+    Args:
+        rankings (List[List[str]]): Rankings of document IDs, best first
+        k (int): Smoothing constant, larger values flatten the rank weights
+            (default: 60)
+
+    Returns:
+        List[Tuple[str, float]]: Document IDs and fused scores, best first
+    """
+
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Persistent Okapi BM25 inverted index of chunk texts.
+
+    Attributes:
+        path (str): Path of the JSON file the index is persisted to
+        k1 (float): Term frequency saturation parameter
+        b (float): Document length normalization parameter
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        """
+        Load the index from disk, or start an empty one if none exists.
+
+        Args:
+            path (str): Path of the JSON index file
+            k1 (float): Term frequency saturation (default: 1.5)
+            b (float): Document length normalization (default: 0.75)
+        """
+
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        self._doc_terms = defaultdict(list)
+        self._lengths = {}
+        self._total_length = 0
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+
+            if data.get("version") == self.VERSION:
+                for term, postings in data.get("postings", {}).items():
+                    self._postings[term] = postings
+                    for doc_id in postings:
+                        self._doc_terms[doc_id].append(term)
+                self._lengths = data.get("lengths", {})
+                self._total_length = sum(self._lengths.values())
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def _remove(self, doc_id):
+        length = self._lengths.pop(doc_id, None)
+        if length is None:
+            return
+
+        self._total_length -= length
+        for term in self._doc_terms.pop(doc_id, []):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def add(self, documents):
+        """
+        Add or replace documents in the index.
+
+        Args:
+            documents (Iterable[Tuple[str, str]]): (id, text) pairs
+        """
+
+        with self._lock:
+            for doc_id, text in documents:
+                self._remove(doc_id)
+
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                self._lengths[doc_id] = length
+                self._total_length += length
+
+                for term, tf in counts.items():
+                    self._postings[term][doc_id] = tf
+                self._doc_terms[doc_id] = list(counts)
+
+    def remove(self, doc_ids):
+        """
+        Remove documents from the index.
+
+        Args:
+            doc_ids (Iterable[str]): IDs of the documents to remove
+        """
+
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def clear(self):
+        """
+        Remove every document from the index.
+        """
+
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._lengths.clear()
+            self._total_length = 0
+
+    def search(self, query, k=5, allowed=None):
+        """
+        Rank documents against a query with BM25.
+
+        Args:
+            query (str): Query text
+            k (int): Number of documents to return (default: 5)
+            allowed (Optional[Set[str]]): Only rank these document IDs, e.g.
+                the chunks matching a metadata filter (default: all)
+
+        Returns:
+            List[Tuple[str, float]]: Document IDs and scores, best first
+        """
+
+        with self._lock:
+            n = len(self._lengths)
+            if not n:
+                return []
+
+            avg_length = self._total_length / n
+            scores = defaultdict(float)
+
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._lengths[doc_id] / avg_length
+                    )
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self):
+        """
+        Write the index to disk atomically.
+        """
+
+        with self._lock:
+            data = {
+                "version": self.VERSION,
+                "postings": self._postings,
+                "lengths": self._lengths,
+            }
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,172 @@
+"""
+Index Manifest for Incremental Re-indexing
+
+This module provides an IndexManifest class that records what has already been
+embedded into a ChromaDB collection so that ChromaRag does not need to wipe and
+rebuild the whole database on every /setup call.
+
+For every source file the manifest keeps:
+1. The modification time and content hash of the file
+2. The ID and content hash of every chunk produced from the file
+3. The markdown header path of every section of the file, so that the header
+   tree of a collection can be listed without querying ChromaDB
+
+The manifest is stored as JSON next to the ChromaDB files, one per collection.
+"""
+
+import hashlib
+import json
+import os
+
+
+class IndexManifest:
+    """
+    Tracks indexed source files and chunks for a single collection.
+
+    Attributes:
+        path (str): Path of the JSON manifest file
+        model_name (str): Embedding model the indexed chunks were created with
+        files (Dict[str, Dict[str, Any]]): Per source file entries containing
+            "mtime", "hash", "chunks" (a mapping of chunk ID to chunk hash) and
+            "headers" (the header path of every section, in file order)
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        """
+        Load the manifest from disk, or start an empty one if none exists.
+
+        Args:
+            path (str): Path of the JSON manifest file
+        """
+
+        self.path = path
+        self.model_name = None
+        self.files = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+
+            if data.get("version") == self.VERSION:
+                self.model_name = data.get("model_name")
+                self.files = data.get("files", {})
+
+    @staticmethod
+    def hash_text(text):
+        """
+        Hash text content for change detection.
+
+        Args:
+            text (str): Text to hash
+
+        Returns:
+            str: Hex digest of the text
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def reset(self, model_name):
+        """
+        Forget every indexed file, e.g. after a full rebuild or a model change.
+
+        Args:
+            model_name (str): Embedding model used for the new index
+        """
+        self.model_name = model_name
+        self.files = {}
+
+    def get(self, source):
+        """
+        Get the manifest entry for a source file.
+
+        Args:
+            source (str): Path of the source file
+
+        Returns:
+            Optional[Dict[str, Any]]: Entry for the file, None if not indexed
+        """
+        return self.files.get(source)
+
+    def sources(self):
+        """
+        Get all indexed source files.
+
+        Returns:
+            Set[str]: Paths of every indexed source file
+        """
+        return set(self.files)
+
+    def unchanged(self, sources):
+        """
+        Check whether source files are the indexed ones, none modified since.
+
+        Only modification times are compared, so a file saved again without
+        changes counts as modified.
+
+        Args:
+            sources (Iterable[str]): Paths of the current source files
+
+        Returns:
+            bool: Whether indexing the files would not change anything
+        """
+
+        sources = list(sources)
+        if set(sources) != set(self.files):
+            return False
+        return all(
+            "headers" in self.files[source]
+            and self.files[source]["mtime"] == os.path.getmtime(source)
+            for source in sources
+        )
+
+    def update(self, source, mtime, file_hash, chunks, headers=None):
+        """
+        Record the indexed state of a source file.
+
+        Args:
+            source (str): Path of the source file
+            mtime (float): Modification time of the file
+            file_hash (str): Content hash of the file
+            chunks (Dict[str, str]): Mapping of chunk ID to chunk hash
+            headers (Optional[List[List[str]]]): Header path of every section
+                of the file, e.g. ["Stonehearth", "Notable People"]
+        """
+        self.files[source] = {
+            "mtime": mtime,
+            "hash": file_hash,
+            "chunks": chunks,
+            "headers": headers or [],
+        }
+
+    def remove(self, source):
+        """
+        Remove a source file from the manifest.
+
+        Args:
+            source (str): Path of the source file
+
+        Returns:
+            List[str]: Chunk IDs that were recorded for the file
+        """
+        entry = self.files.pop(source, None)
+        return list(entry["chunks"]) if entry else []
+
+    def save(self):
+        """
+        Write the manifest to disk atomically.
+        """
+
+        data = {
+            "version": self.VERSION,
+            "model_name": self.model_name,
+            "files": self.files,
+        }
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,166 @@
+"""
+Two-Stage Retrieval with Re-ranking
+
+This module provides a Reranker class for a second retrieval stage. Instead of
+retrieving a fixed top_k chunks by embedding similarity alone, the collection
+is searched for several times more candidates, which is cheap, and a scoring
+model (e.g. llm.LlamaRanker, a local cross-encoder) then scores each candidate
+against the query in batches. Only candidates above a relevance cutoff are
+kept, best first and at most top_k, so top_k becomes an upper bound: a
+specific question may keep two chunks where a broad one keeps ten. The
+ContextPacker then packs the kept chunks, best first, into the token budget.
+
+The result is fewer, more relevant context tokens per LLM call.
+"""
+
+import threading
+
+
+class Reranker:
+    """
+    Over-fetches candidates and keeps the relevant ones, best first.
+
+    Attributes:
+        score_fn: Function scoring a query against a list of documents,
+            returning one relevance score between 0 and 1 per document
+        min_score (float): Relevance cutoff, candidates below it are dropped
+        overfetch (int): Candidates retrieved per requested chunk
+        max_candidates (int): Maximum number of candidates per query
+        batch_size (int): Documents per call of score_fn
+        min_keep (int): Candidates kept even when below the cutoff
+    """
+
+    def __init__(
+        self,
+        score_fn,
+        min_score=0.1,
+        overfetch=4,
+        max_candidates=50,
+        batch_size=16,
+        min_keep=1,
+    ):
+        """
+        Initialize the re-ranker.
+
+        Args:
+            score_fn (Callable[[str, List[str]], List[float]]): Scores a
+                query against documents, e.g. LlamaRanker.score
+            min_score (float): Relevance cutoff (default: 0.1)
+            overfetch (int): Candidates retrieved per requested chunk
+                (default: 4)
+            max_candidates (int): Maximum candidates per query (default: 50)
+            batch_size (int): Documents scored per call (default: 16)
+            min_keep (int): Best candidates kept regardless of the cutoff, so
+                the LLM always gets some context (default: 1)
+        """
+
+        self.score_fn = score_fn
+        self.min_score = min_score
+        self.overfetch = max(1, int(overfetch))
+        self.max_candidates = max(1, int(max_candidates))
+        self.batch_size = max(1, int(batch_size))
+        self.min_keep = max(0, int(min_keep))
+
+        self._lock = threading.Lock()
+        self._stats = {"queries": 0, "candidates": 0, "kept": 0}
+
+    def candidates(self, top_k):
+        """
+        Get the number of candidates to retrieve for a request.
+
+        Args:
+            top_k (int): Maximum number of chunks to keep
+
+        Returns:
+            int: top_k times overfetch, capped at max_candidates but never
+            below top_k
+        """
+        return max(top_k, min(top_k * self.overfetch, self.max_candidates))
+
+    def score(self, query, docs):
+        """
+        Score documents against a query, batch_size at a time.
+
+        Args:
+            query (str): Query text
+            docs (List[str]): Documents to score
+
+        Returns:
+            List[float]: Relevance score of each document, in order
+        """
+
+        scores = []
+        for start in range(0, len(docs), self.batch_size):
+            scores.extend(self.score_fn(query, docs[start : start + self.batch_size]))
+        return scores
+
+    def rerank(self, query, docs, ids, metadatas, top_k, min_score=None):
+        """
+        Re-rank retrieved candidates and keep the relevant ones.
+
+        Args:
+            query (str): Query text
+            docs (List[str]): Candidate documents
+            ids (List[str]): Candidate IDs
+            metadatas (List[Dict[str, Any]]): Candidate metadata
+            top_k (int): Maximum number of candidates to keep
+            min_score (Optional[float]): Relevance cutoff (default:
+                self.min_score)
+
+        Returns:
+            Tuple containing:
+            - List[str]: Kept documents, most relevant first
+            - List[str]: Document IDs
+            - List[Dict[str, Any]]: Document metadata, with the relevance
+              score added as "rerank_score"
+        """
+
+        min_score = self.min_score if min_score is None else float(min_score)
+        scores = self.score(query, docs) if docs else []
+
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        kept = [
+            i
+            for rank, i in enumerate(order[:top_k])
+            if scores[i] >= min_score or rank < self.min_keep
+        ]
+
+        with self._lock:
+            self._stats["queries"] += 1
+            self._stats["candidates"] += len(docs)
+            self._stats["kept"] += len(kept)
+
+        return (
+            [docs[i] for i in kept],
+            [ids[i] for i in kept],
+            [{**(metadatas[i] or {}), "rerank_score": scores[i]} for i in kept],
+        )
+
+    def stats(self):
+        """
+        Get re-ranking statistics.
+
+        Returns:
+            Dict containing:
+            - queries: Number of re-ranked queries
+            - candidates: Total candidates scored
+            - kept: Total candidates kept
+            - kept_ratio: Fraction of candidates kept
+            - min_score, overfetch: Cutoff and over-fetch factor
+            - scorer: Statistics of the object score_fn belongs to, e.g.
+              LlamaRanker.stats, if it has any
+        """
+
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats["kept_ratio"] = (
+            round(stats["kept"] / stats["candidates"], 4) if stats["candidates"] else 0.0
+        )
+        stats["min_score"] = self.min_score
+        stats["overfetch"] = self.overfetch
+
+        scorer = getattr(self.score_fn, "__self__", None)
+        if hasattr(scorer, "stats"):
+            stats["scorer"] = scorer.stats()
+        return stats
@@ -0,0 +1,1101 @@
+"""
+Vector Store Backends
+
+This module provides the storage interface behind ChromaRag and two backends:
+1. ChromaStore: a ChromaDB collection (SQLite and HNSW), the default
+2. NumpyStore: embeddings in a memory-mapped .npy matrix, searched exactly
+   with NumPy matrix products
+
+Both take and return data in ChromaDB's shapes (e.g. query returns lists of
+lists per query embedding), so ChromaRag does not depend on the backend.
+
+For vaults of up to a few hundred thousand chunks, an exact flat search is
+fast enough, and NumpyStore avoids ChromaDB's startup time, memory use and
+per-query overhead. Opening it only maps its files, so cold start takes
+milliseconds: vectors, vector norms and document texts are memory-mapped,
+and only the IDs and metadata are read into memory.
+
+NumpyStore can also keep a quantized copy of the vectors in memory: int8
+scalar quantization (4x smaller than float32) or sign bits compared by
+Hamming distance (32x smaller). Queries then scan the quantized copy for a
+pool of candidates, and only the candidates are re-scored against the
+full-precision vectors, which are read lazily from the memory-mapped file.
+"""
+
+import io
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+from chromadb import PersistentClient
+from chromadb.errors import NotFoundError
+
+# Rows converted to float32 at a time when searching float16 vectors
+SEARCH_BLOCK_ROWS = 65536
+
+# Chunks read and written at a time when copying a ChromaDB collection
+COPY_BATCH_SIZE = 1024
+
+# Quantized index modes of NumpyStore, and their default number of
+# candidates re-scored per result. Hamming distances of binary codes rank
+# much more coarsely, so they need a larger candidate pool for good recall
+QUANTIZATIONS = ("int8", "binary")
+DEFAULT_RERANK = {"int8": 4, "binary": 32}
+
+
+def quantize(vectors, quantization, scale=None):
+    """
+    Quantize vectors for the in-memory index of NumpyStore.
+
+    int8 maps each dimension linearly from its [min, max] range over the
+    vectors to [-128, 127]. binary keeps one bit per dimension, whether it is
+    above the mean of that dimension over the vectors, packed eight
+    dimensions per byte.
+
+    Args:
+        vectors (numpy.ndarray): Matrix of vectors, one per row
+        quantization (str): "int8" or "binary"
+        scale (Optional[numpy.ndarray]): Parameters returned by an earlier
+            call (default: None, fit to vectors)
+
+    Returns:
+        Tuple containing:
+        - numpy.ndarray: Quantized codes, one row per vector
+        - numpy.ndarray: Parameters per dimension: int8 offset and step, shape
+          (2, dim), or binary mean, shape (1, dim)
+    """
+
+    if quantization == "binary":
+        if scale is None:
+            total = np.zeros(vectors.shape[1], dtype=np.float64)
+            for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+                block = np.asarray(vectors[start : start + SEARCH_BLOCK_ROWS])
+                total += block.sum(axis=0, dtype=np.float64)
+            scale = (total / max(len(vectors), 1)).astype(np.float32)[None, :]
+
+        codes = np.empty((len(vectors), (vectors.shape[1] + 7) // 8), dtype=np.uint8)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + SEARCH_BLOCK_ROWS])
+            codes[start : start + len(block)] = np.packbits(block > scale[0], axis=1)
+        return codes, scale
+
+    if scale is None:
+        low = np.full(vectors.shape[1], np.inf, dtype=np.float32)
+        high = np.full(vectors.shape[1], -np.inf, dtype=np.float32)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + SEARCH_BLOCK_ROWS], np.float32)
+            low = np.minimum(low, block.min(axis=0))
+            high = np.maximum(high, block.max(axis=0))
+        step = np.maximum(high - low, 1e-12) / 255
+        scale = np.stack([low, step]).astype(np.float32)
+
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + SEARCH_BLOCK_ROWS], np.float32)
+        levels = np.rint((block - scale[0]) / scale[1])
+        codes[start : start + len(block)] = np.clip(levels, 0, 255) - 128
+    return codes, scale
+
+
+def approximate_distances(codes, scale, norms, queries):
+    """
+    Estimate the distances of every quantized vector to each query.
+
+    int8 codes give approximate squared L2 distances from the dequantized
+    dot products and the exact norms. Binary codes give Hamming distances
+    between the bits, which preserve the ranking only roughly.
+
+    Args:
+        codes (numpy.ndarray): Quantized vectors, see quantize
+        scale (numpy.ndarray): Quantization parameters, see quantize
+        norms (numpy.ndarray): Squared L2 norm of each full-precision vector
+        queries (numpy.ndarray): float32 query embeddings, one per row
+
+    Returns:
+        numpy.ndarray: float32 matrix of estimated distances, one row per
+        vector and one column per query, smaller is nearer
+    """
+
+    distances = np.empty((len(codes), len(queries)), dtype=np.float32)
+
+    if codes.dtype == np.uint8:
+        query_bits = np.packbits(queries > scale[0], axis=1)
+        for start in range(0, len(codes), SEARCH_BLOCK_ROWS):
+            block = codes[start : start + SEARCH_BLOCK_ROWS]
+            for column, bits in enumerate(query_bits):
+                distances[start : start + len(block), column] = np.bitwise_count(
+                    block ^ bits
+                ).sum(axis=1)
+        return distances
+
+    # x ~ low + step * (code + 128), so q.x ~ q.(low + 128 step) + (q step).code
+    offset = queries @ (scale[0] + 128 * scale[1])
+    weighted = (queries * scale[1]).T
+    for start in range(0, len(codes), SEARCH_BLOCK_ROWS):
+        block = codes[start : start + SEARCH_BLOCK_ROWS].astype(np.float32)
+        dots = block @ weighted + offset[None, :]
+        distances[start : start + len(block)] = (
+            np.asarray(norms[start : start + len(block)])[:, None] - 2 * dots
+        )
+    return distances
+
+
+def exact_distances(vectors, norms, queries):
+    """
+    Compute squared L2 distances of vectors to each query.
+
+    Distances are |q|^2 - 2 q.x + |x|^2, computed blockwise so that float16
+    rows are converted to float32 a block at a time.
+
+    Args:
+        vectors (numpy.ndarray): Vectors, one per row
+        norms (numpy.ndarray): Squared L2 norm of each vector
+        queries (numpy.ndarray): float32 query embeddings, one per row
+
+    Returns:
+        numpy.ndarray: float32 matrix of distances, one row per vector and
+        one column per query
+    """
+
+    distances = np.empty((len(vectors), len(queries)), dtype=np.float32)
+    for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+        end = min(start + SEARCH_BLOCK_ROWS, len(vectors))
+        block = np.asarray(vectors[start:end], dtype=np.float32)
+        distances[start:end] = np.asarray(norms[start:end])[:, None] - 2 * (
+            block @ queries.T
+        )
+    distances += np.einsum("ij,ij->i", queries, queries)[None, :]
+    return distances
+
+
+def top_k(distances, k):
+    """
+    Get the positions of the k smallest distances, smallest first.
+
+    Args:
+        distances (numpy.ndarray): Distances of one query
+        k (int): Number of positions
+
+    Returns:
+        numpy.ndarray: Positions into distances
+    """
+
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    rows = np.argpartition(distances, k - 1)[:k]
+    return rows[np.argsort(distances[rows], kind="stable")]
+
+
+def matches(metadata, where):
+    """
+    Check whether chunk metadata satisfies a ChromaDB where clause.
+
+    Supports $and, $or and the $eq, $ne, $in, $nin, $gt, $gte, $lt and $lte
+    operators, and plain values as $eq.
+
+    Args:
+        metadata (Dict[str, Any]): Chunk metadata
+        where (Dict[str, Any]): Where clause, e.g. built by
+            ChromaRag.metadata_filter
+
+    Returns:
+        bool: Whether the chunk matches
+
+    Raises:
+        ValueError: If the clause uses an unsupported operator
+    """
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+            continue
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        value = metadata.get(key)
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                ok = {
+                    "$gt": value > operand,
+                    "$gte": value >= operand,
+                    "$lt": value < operand,
+                    "$lte": value <= operand,
+                }[op]
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+
+            if not ok:
+                return False
+
+    return True
+
+
+class VectorStore(ABC):
+    """
+    Storage of chunk embeddings, texts and metadata used by ChromaRag.
+
+    Subclasses implement every abstract method, stores that write
+    immediately keep the no-op flush. Results use ChromaDB's shapes.
+    """
+
+    @abstractmethod
+    def count(self):
+        """
+        Get the number of stored chunks.
+
+        Returns:
+            int: Number of chunks
+        """
+
+    @abstractmethod
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """
+        Add chunks, replacing stored chunks with the same IDs.
+
+        Args:
+            ids (List[str]): Chunk IDs
+            embeddings (List[List[float]]): Vector embedding per chunk
+            documents (List[str]): Text per chunk
+            metadatas (List[Dict[str, Any]]): Metadata per chunk
+        """
+
+    @abstractmethod
+    def delete(self, ids):
+        """
+        Remove chunks.
+
+        Args:
+            ids (List[str]): IDs of the chunks to remove, unknown IDs are
+                ignored
+        """
+
+    @abstractmethod
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        """
+        Get stored chunks by ID and/or metadata.
+
+        Args:
+            ids (Optional[List[str]]): Chunk IDs (default: None, every chunk)
+            where (Optional[Dict[str, Any]]): Metadata filter (default: None)
+            include (Iterable[str]): Fields to return besides the IDs,
+                "documents" and/or "metadatas" (default: both)
+
+        Returns:
+            Dict[str, List[Any]]: "ids" and the included fields, in the same
+            order
+        """
+
+    @abstractmethod
+    def query(self, query_embeddings, n_results=10, where=None):
+        """
+        Find the nearest chunks of each query embedding.
+
+        Args:
+            query_embeddings (List[List[float]]): Query embeddings
+            n_results (int): Number of chunks per query (default: 10)
+            where (Optional[Dict[str, Any]]): Metadata filter (default: None)
+
+        Returns:
+            Dict[str, List[List[Any]]]: "ids", "documents", "metadatas" and
+            "distances", each with one list per query embedding, nearest first
+        """
+
+    def flush(self):
+        """
+        Persist pending changes. A no-op for stores that write immediately.
+        """
+
+    @abstractmethod
+    def reset(self):
+        """
+        Remove every chunk, e.g. when the embedding model changes.
+        """
+
+    @abstractmethod
+    def copy_to(self, name):
+        """
+        Copy every chunk, with its embedding, into another store of the same
+        backend and database, replacing its contents.
+
+        Args:
+            name (str): Name of the target collection
+        """
+
+    @abstractmethod
+    def drop(self):
+        """
+        Delete the store from disk. It must not be used afterwards.
+        """
+
+
+class ChromaStore(VectorStore):
+    """
+    Vector store backed by a persistent ChromaDB collection.
+
+    Attributes:
+        db_path (str): Path of the ChromaDB database
+        client (chromadb.PersistentClient): ChromaDB client of the database
+        name (str): Name of the collection
+        collection: ChromaDB collection instance
+    """
+
+    def __init__(self, db_path, name):
+        """
+        Open or create the collection.
+
+        Args:
+            db_path (str): Path of the ChromaDB database
+            name (str): Name of the collection
+        """
+
+        self.db_path = db_path
+        self.client = PersistentClient(path=db_path)
+        self.name = name
+        self.collection = self.client.get_or_create_collection(name=name)
+
+    def count(self):
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(
+            ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas
+        )
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        return self.collection.get(ids=ids, where=where, include=list(include))
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        return self.collection.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where
+        )
+
+    def reset(self):
+        try:
+            self.client.delete_collection(name=self.name)
+        except NotFoundError:
+            # Deleted by someone else in the meantime
+            pass
+        self.collection = self.client.get_or_create_collection(name=self.name)
+
+    def copy_to(self, name):
+        target = ChromaStore(self.db_path, name)
+        target.reset()
+
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=COPY_BATCH_SIZE,
+                offset=offset,
+            )
+            if not page["ids"]:
+                break
+            target.upsert(
+                page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+            )
+            offset += len(page["ids"])
+
+    def drop(self):
+        try:
+            self.client.delete_collection(name=self.name)
+        except NotFoundError:
+            pass
+
+
+def append_rows(path, rows, start):
+    """
+    Write rows into an .npy file in place, from a given row on.
+
+    The data is written before the header, so until the new shape is in the
+    header, readers see the file as it was. np.save pads headers so that the
+    number of rows can grow in place.
+
+    Args:
+        path (str): Path of the .npy file
+        rows (numpy.ndarray): Rows of the file's dtype and row shape
+        start (int): Row of the file to write the first row at, rows after
+            the written ones are dropped
+
+    Raises:
+        ValueError: If the rows do not fit the file's dtype, row shape or
+            header
+    """
+
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            read_header = np.lib.format.read_array_header_1_0
+            write_header = np.lib.format.write_array_header_1_0
+        elif version == (2, 0):
+            read_header = np.lib.format.read_array_header_2_0
+            write_header = np.lib.format.write_array_header_2_0
+        else:
+            raise ValueError(f"Unsupported .npy version {version}: {path}")
+
+        shape, fortran_order, dtype = read_header(f)
+        data_start = f.tell()
+        if (
+            fortran_order
+            or dtype != rows.dtype
+            or tuple(shape[1:]) != rows.shape[1:]
+            or shape[0] < start
+        ):
+            raise ValueError(f"Rows do not match the array in {path}")
+
+        header = io.BytesIO()
+        write_header(
+            header,
+            {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (start + len(rows),) + tuple(shape[1:]),
+            },
+        )
+        if header.tell() != data_start:
+            raise ValueError(f"No room for the new shape in the header of {path}")
+
+        row_bytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+        f.seek(data_start + start * row_bytes)
+        f.write(np.ascontiguousarray(rows).tobytes())
+        f.seek(0)
+        f.write(header.getvalue())
+
+
+class NumpyStore(VectorStore):
+    """
+    Vector store keeping embeddings in a memory-mapped NumPy matrix.
+
+    Queries are answered by exact search over every stored vector, ranked by
+    squared L2 distance like ChromaDB's default space, or with a quantized
+    index by re-scoring the best candidates of an approximate search.
+
+    Rows are never changed in place. A chunk that is upserted again gets a
+    new row and its old row dies, like a deleted chunk's. Changes are kept in
+    memory, and searched exactly, until flush appends the new rows to the
+    files and logs their IDs and metadata along with the rows that died. An
+    update thus writes only the rows it changes, and queries keep reading
+    the mapped files while they grow. Once more than half of the rows are
+    dead, flush rewrites the files with only the live rows instead.
+
+    Files, next to the other files of the collection in db_path:
+    - <name>.vectors.npy: float32 or float16 matrix, one row per chunk
+    - <name>.norms.npy: Squared L2 norm of each row
+    - <name>.documents.bin and <name>.offsets.npy: UTF-8 chunk texts,
+      concatenated, and the byte offset of each
+    - <name>.records.json: Chunk IDs and metadata of the rows written by the
+      last rewrite, in row order
+    - <name>.records.log: One JSON line per later flush, with the IDs and
+      metadata of the rows it appended and the rows that died
+    - <name>.int8.npy and <name>.int8-scale.npy, or <name>.binary.npy and
+      <name>.binary-scale.npy: Quantized vectors and their parameters,
+      appended to with the same parameters and refit by a rewrite, rebuilt
+      from the vectors when missing
+
+    Attributes:
+        prefix (str): Path prefix of the store's files
+        dtype (numpy.dtype): Storage type of the vectors
+        quantization (Optional[str]): "int8", "binary" or None for exact search
+        rerank (int): Candidates re-scored per result with a quantized index
+    """
+
+    VERSION = 2
+
+    # Suffixes of the store's files
+    FILES = (
+        "records.json",
+        "records.log",
+        "vectors.npy",
+        "norms.npy",
+        "offsets.npy",
+        "documents.bin",
+        "int8.npy",
+        "int8-scale.npy",
+        "binary.npy",
+        "binary-scale.npy",
+    )
+
+    def __init__(self, db_path, name, dtype="float32", quantization=None, rerank=None):
+        """
+        Open the store, or start an empty one if none exists.
+
+        Args:
+            db_path (str): Directory of the store's files
+            name (str): Name of the collection
+            dtype (str): "float32", or "float16" to halve the size of the
+                vectors at a small loss of precision (default: "float32")
+            quantization (Optional[str]): Keep an "int8" or "binary" quantized
+                index in memory instead of scanning the full-precision vectors
+                (default: None)
+            rerank (Optional[int]): With a quantized index, re-score
+                rerank * n_results candidates against the full-precision
+                vectors (default: DEFAULT_RERANK of the quantization)
+        """
+
+        self.prefix = os.path.join(db_path, name)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.quantization = quantization
+        self.rerank = max(1, int(rerank or DEFAULT_RERANK.get(quantization, 1)))
+
+        self._lock = threading.Lock()
+        self._load()
+
+    def _path(self, suffix):
+        return f"{self.prefix}.{suffix}"
+
+    def _load(self):
+        # Every row, dead or alive, by row number, and the live row of each ID
+        self._ids = []
+        self._metadatas = []
+        self._live = np.zeros(0, dtype=bool)
+        self._rows = {}
+
+        # Rows in the files, mapped
+        self._stored = 0
+        self._vectors = None
+        self._norms = None
+        self._text = None
+        self._offsets = None
+        self._codes = None
+        self._scale = None
+
+        # Rows added since the last flush, in memory
+        self._new_vectors = None
+        self._new_norms = None
+        self._new_documents = []
+
+        # Liveness of the rows as of the last flush, and bytes of the log
+        self._flushed_live = self._live
+        self._log_bytes = 0
+        self._rewrite = False
+        self._dirty = False
+
+        try:
+            with open(self._path("records.json"), "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            records = {}
+
+        # Stores of version 1 have the same files, without a log
+        if records.get("version") not in (1, self.VERSION) or not records.get("ids"):
+            return
+
+        ids, metadatas, dead = records["ids"], records["metadatas"], []
+        try:
+            with open(self._path("records.log"), "rb") as f:
+                for line in f:
+                    # A flush that did not finish leaves a partial last line
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n") or entry["rows"] != len(ids) + len(
+                        entry["ids"]
+                    ):
+                        break
+                    ids += entry["ids"]
+                    metadatas += entry["metadatas"]
+                    dead += entry["dead"]
+                    self._log_bytes += len(line)
+        except OSError:
+            pass
+
+        self._ids, self._metadatas = ids, metadatas
+        self._live = np.ones(len(ids), dtype=bool)
+        self._live[dead] = False
+        self._flushed_live = self._live
+        self._rows = {id: row for row, id in enumerate(ids) if self._live[row]}
+        self._map(len(ids))
+
+        if self._vectors.dtype != self.dtype:
+            self._vectors = self._vectors.astype(self.dtype)
+            self._rewrite = self._dirty = True
+        elif self.quantization is not None:
+            self._load_codes()
+
+    def _map(self, rows):
+        # Only the first rows are mapped, the files can hold more rows written
+        # by a flush that did not finish
+        self._stored = rows
+        self._vectors = np.load(self._path("vectors.npy"), mmap_mode="r")[:rows]
+        self._norms = np.load(self._path("norms.npy"), mmap_mode="r")[:rows]
+        self._offsets = np.load(self._path("offsets.npy"), mmap_mode="r")[: rows + 1]
+        self._text = np.zeros(0, dtype=np.uint8)
+        if self._offsets[-1]:
+            self._text = np.memmap(self._path("documents.bin"), mode="r")
+
+    def _load_codes(self):
+        # The quantized index is held in memory, unlike the mapped vectors
+        codes_path = self._path(f"{self.quantization}.npy")
+        scale_path = self._path(f"{self.quantization}-scale.npy")
+        try:
+            codes, scale = np.load(codes_path), np.load(scale_path)
+        except (OSError, ValueError):
+            codes = scale = None
+
+        # Codes of the rows flushed without quantization are missing
+        if codes is None or len(codes) < self._stored:
+            codes, scale = quantize(self._vectors, self.quantization)
+            np.save(codes_path, codes)
+            np.save(scale_path, scale)
+
+        self._codes, self._scale = codes, scale
+
+    @staticmethod
+    def _with_capacity(array, used, size):
+        # The array, or a copy of its first used rows with room for size rows
+        if len(array) >= size:
+            return array
+        grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], array.dtype)
+        grown[:used] = array[:used]
+        return grown
+
+    def index_bytes(self):
+        """
+        Get the size of the index searched by every query.
+
+        Returns:
+            int: Bytes of the quantized codes, or of the full-precision
+            vectors without quantization, plus the vector norms, of the rows
+            in the files
+        """
+
+        with self._lock:
+            if self._vectors is None:
+                return 0
+            stored = self._stored
+            searched = self._codes[:stored] if self._codes is not None else self._vectors
+            return int(searched.nbytes + self._norms.nbytes)
+
+    def _document(self, row):
+        if row >= self._stored:
+            return self._new_documents[row - self._stored]
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return bytes(self._text[start:end]).decode("utf-8")
+
+    def count(self):
+        with self._lock:
+            return len(self._rows)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+
+        with self._lock:
+            dim = embeddings.shape[1]
+            stored_dim = None
+            if self._vectors is not None:
+                stored_dim = self._vectors.shape[1]
+            elif self._new_vectors is not None:
+                stored_dim = self._new_vectors.shape[1]
+            if stored_dim is not None and dim != stored_dim:
+                raise ValueError(
+                    f"Embedding dimension {dim} does not match the store's "
+                    f"{stored_dim}"
+                )
+
+            size = len(self._ids)
+            start = size - self._stored
+            if self._new_vectors is None:
+                capacity = max(len(ids), 1024)
+                self._new_vectors = np.zeros((capacity, dim), dtype=self.dtype)
+                self._new_norms = np.zeros(capacity, dtype=np.float32)
+            else:
+                end = start + len(ids)
+                self._new_vectors = self._with_capacity(self._new_vectors, start, end)
+                self._new_norms = self._with_capacity(self._new_norms, start, end)
+
+            stored = embeddings.astype(self.dtype)
+            self._new_vectors[start : start + len(ids)] = stored
+            self._new_norms[start : start + len(ids)] = np.einsum(
+                "ij,ij->i", stored, stored, dtype=np.float32
+            )
+
+            # A new liveness array rather than updating it in place, so that
+            # queries running on the previous one stay consistent
+            live = np.ones(size + len(ids), dtype=bool)
+            live[:size] = self._live
+            for i, id in enumerate(ids):
+                row = self._rows.get(id)
+                if row is not None:
+                    live[row] = False
+                self._rows[id] = size + i
+
+            self._ids.extend(ids)
+            self._metadatas.extend(metadatas)
+            self._new_documents.extend(documents)
+            self._live = live
+            self._dirty = True
+
+    def delete(self, ids):
+        with self._lock:
+            rows = [self._rows.pop(id) for id in ids if id in self._rows]
+            if not rows:
+                return
+
+            live = self._live.copy()
+            live[rows] = False
+            self._live = live
+            self._dirty = True
+
+    def _snapshot(self):
+        # References to the current state, so that a query can search without
+        # holding the lock and queries run in parallel (NumPy releases the
+        # GIL in matrix products). Rows are only ever appended, and liveness
+        # is replaced rather than updated
+        with self._lock:
+            size, stored = len(self._ids), self._stored
+            ids, metadatas, live = self._ids, self._metadatas, self._live
+            text, offsets = self._text, self._offsets
+            vectors, norms = self._vectors, self._norms
+            new_vectors, new_norms = self._new_vectors, self._new_norms
+            new_documents = self._new_documents
+            codes, scale = self._codes, self._scale
+            if codes is not None:
+                codes = codes[:stored]
+
+        def document(row):
+            if row >= stored:
+                return new_documents[row - stored]
+            start, end = offsets[row], offsets[row + 1]
+            return bytes(text[start:end]).decode("utf-8")
+
+        def rows_of(rows):
+            # Vectors and norms of sorted rows, from the files and from memory
+            split = int(np.searchsorted(rows, stored))
+            old, new = rows[:split], rows[split:] - stored
+            if not len(new):
+                return vectors[old], norms[old]
+            if not len(old):
+                return new_vectors[new], new_norms[new]
+            return (
+                np.concatenate([vectors[old], new_vectors[new]]),
+                np.concatenate([norms[old], new_norms[new]]),
+            )
+
+        def distances_to(queries):
+            # Exact distances of every row
+            blocks = []
+            if stored:
+                blocks.append(exact_distances(vectors, norms, queries))
+            if size > stored:
+                blocks.append(
+                    exact_distances(
+                        new_vectors[: size - stored], new_norms[: size - stored], queries
+                    )
+                )
+            return np.concatenate(blocks)
+
+        return (
+            size,
+            stored,
+            ids,
+            metadatas,
+            live,
+            document,
+            rows_of,
+            distances_to,
+            norms,
+            codes,
+            scale,
+        )
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        with self._lock:
+            if ids is None:
+                rows = np.flatnonzero(self._live).tolist()
+            else:
+                rows = [self._rows[id] for id in ids if id in self._rows]
+
+            if where is not None:
+                rows = [row for row in rows if matches(self._metadatas[row], where)]
+
+            result = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self._document(row) for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            return result
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        snapshot = self._snapshot()
+        size, stored, ids, metadatas, live, document = snapshot[:6]
+        rows_of, distances_to, norms, codes, scale = snapshot[6:]
+
+        allowed = live
+        if where is not None:
+            allowed = np.fromiter(
+                (live[row] and matches(metadatas[row], where) for row in range(size)),
+                dtype=bool,
+                count=size,
+            )
+        candidates = int(allowed.sum())
+        k = min(int(n_results), candidates)
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not k:
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+
+        if codes is None:
+            distances = distances_to(queries)
+            distances[~allowed] = np.inf
+        else:
+            distances = approximate_distances(codes, scale, norms, queries)
+            distances[~allowed[:stored]] = np.inf
+            indexed = int(allowed[:stored].sum())
+            # Rows added since the last flush have no codes yet, so they are
+            # re-scored along with the candidates of every query
+            recent = np.flatnonzero(allowed[stored:]) + stored
+
+        for query, column in zip(queries, distances.T):
+            if codes is None:
+                rows = top_k(column, k)
+                exact = column[rows]
+            else:
+                # Re-score the best approximate candidates at full precision,
+                # reading only their rows from the mapped vectors, in order
+                pool = np.sort(top_k(column, min(k * self.rerank, indexed)))
+                pool = np.concatenate([pool, recent])
+                rescored = exact_distances(*rows_of(pool), query[None, :])
+                best = top_k(rescored[:, 0], k)
+                rows, exact = pool[best], rescored[best, 0]
+
+            result["ids"].append([ids[row] for row in rows])
+            result["documents"].append([document(row) for row in rows])
+            result["metadatas"].append([metadatas[row] for row in rows])
+            result["distances"].append([float(distance) for distance in exact])
+
+        return result
+
+    def flush(self):
+        """
+        Write pending changes to disk, then map the files again.
+
+        New rows are appended to the files, unless the store has no files
+        yet, its vectors change type, or more than half of its rows are
+        dead: then the files are rewritten with only the live rows.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            if self._rewrite or not self._stored or 2 * len(self._rows) < len(self._ids):
+                self._write_all()
+                return
+
+            try:
+                self._append()
+            except ValueError:
+                # Files that cannot grow in place, e.g. written by another
+                # version of NumPy
+                self._write_all()
+
+    def _append(self):
+        stored, size = self._stored, len(self._ids)
+        new = size - stored
+
+        encoded = [document.encode("utf-8") for document in self._new_documents]
+        text_end = int(self._offsets[-1])
+        offsets = text_end + np.cumsum([len(data) for data in encoded], dtype=np.int64)
+        vectors = self._new_vectors[:new] if new else None
+        norms = self._new_norms[:new] if new else None
+
+        codes = None
+        if self._codes is not None and new:
+            codes, _ = quantize(vectors, self.quantization, self._scale)
+
+        if new:
+            append_rows(self._path("vectors.npy"), vectors, stored)
+            append_rows(self._path("norms.npy"), norms, stored)
+            append_rows(self._path("offsets.npy"), offsets, stored + 1)
+            with open(self._path("documents.bin"), "r+b") as f:
+                f.seek(text_end)
+                f.write(b"".join(encoded))
+            if codes is not None:
+                append_rows(self._path(f"{self.quantization}.npy"), codes, stored)
+
+        # Rows that died since the last flush, and new rows that already did
+        died = ~self._live
+        died[:stored] &= self._flushed_live
+        entry = {
+            "rows": size,
+            "ids": self._ids[stored:],
+            "metadatas": self._metadatas[stored:],
+            "dead": np.flatnonzero(died).tolist(),
+        }
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+
+        # Logged last: until then, the rows appended above are ignored
+        log_path = self._path("records.log")
+        if os.path.exists(log_path) and os.path.getsize(log_path) > self._log_bytes:
+            os.truncate(log_path, self._log_bytes)
+        with open(log_path, "ab") as f:
+            f.write(line)
+        self._log_bytes += len(line)
+
+        self._map(size)
+        if codes is not None:
+            self._codes = self._with_capacity(self._codes, stored, size)
+            self._codes[stored:size] = codes
+        self._new_vectors = self._new_norms = None
+        self._new_documents = []
+        self._flushed_live = self._live
+        self._dirty = False
+
+    def _write_all(self):
+        # Write the live rows to new files atomically, then map them
+        stored, size = self._stored, len(self._ids)
+        rows = np.flatnonzero(self._live)
+
+        vectors = [np.zeros((0, 0), dtype=self.dtype)]
+        norms = [np.zeros(0, dtype=np.float32)]
+        if stored:
+            vectors.append(np.asarray(self._vectors[self._live[:stored]]))
+            norms.append(np.asarray(self._norms[self._live[:stored]]))
+        if size > stored:
+            vectors.append(self._new_vectors[: size - stored][self._live[stored:]])
+            norms.append(self._new_norms[: size - stored][self._live[stored:]])
+        # Without live rows, only the empty arrays are written
+        if len(rows):
+            vectors, norms = vectors[1:], norms[1:]
+        else:
+            vectors, norms = vectors[:1], norms[:1]
+
+        encoded = [self._document(row).encode("utf-8") for row in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(data) for data in encoded])
+
+        arrays = {
+            "vectors.npy": np.concatenate(vectors).astype(self.dtype, copy=False),
+            "norms.npy": np.concatenate(norms).astype(np.float32, copy=False),
+            "offsets.npy": offsets,
+        }
+        for suffix, array in arrays.items():
+            with open(self._path(f"{suffix}.tmp"), "wb") as f:
+                np.save(f, array)
+        with open(self._path("documents.bin.tmp"), "wb") as f:
+            f.write(b"".join(encoded))
+
+        for suffix in list(arrays) + ["documents.bin"]:
+            os.replace(self._path(f"{suffix}.tmp"), self._path(suffix))
+
+        # Written last, so a crash before this point keeps the old store
+        tmp_path = self._path("records.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": self.VERSION,
+                    "ids": [self._ids[row] for row in rows],
+                    "metadatas": [self._metadatas[row] for row in rows],
+                },
+                f,
+            )
+        os.replace(tmp_path, self._path("records.json"))
+
+        # The log of the previous rows, and the quantized codes of the
+        # previous vectors, refit by _load
+        for suffix in (
+            "records.log",
+            "int8.npy",
+            "int8-scale.npy",
+            "binary.npy",
+            "binary-scale.npy",
+        ):
+            try:
+                os.remove(self._path(suffix))
+            except OSError:
+                pass
+
+        self._load()
+
+    def _remove_files(self, prefix):
+        for suffix in self.FILES:
+            try:
+                os.remove(f"{prefix}.{suffix}")
+            except OSError:
+                pass
+
+    def reset(self):
+        with self._lock:
+            self._remove_files(self.prefix)
+            self._load()
+
+    def copy_to(self, name):
+        self.flush()
+        target = os.path.join(os.path.dirname(self.prefix), name)
+
+        with self._lock:
+            self._remove_files(target)
+            for suffix in self.FILES:
+                if os.path.exists(self._path(suffix)):
+                    shutil.copyfile(self._path(suffix), f"{target}.{suffix}")
+
+    def drop(self):
+        self.reset()
+
+
+# Vector store backends, by the name passed to ChromaRag
+VECTOR_STORES = {"chroma": ChromaStore, "numpy": NumpyStore}
+
+
+def open_store(kind, db_path, name, dtype="float32", quantization=None):
+    """
+    Open a vector store backend.
+
+    Args:
+        kind (str): "chroma" or "numpy"
+        db_path (str): Path of the database directory
+        name (str): Name of the collection
+        dtype (str): Vector storage type of the "numpy" backend, "float32" or
+            "float16" (default: "float32")
+        quantization (Optional[str]): Quantized index of the "numpy"
+            backend, "int8" or "binary" (default: None)
+
+    Returns:
+        VectorStore: The opened store
+
+    Raises:
+        ValueError: If kind is unknown, or quantization is requested for the
+            "chroma" backend
+    """
+
+    if kind not in VECTOR_STORES:
+        raise ValueError(f"Unknown vector store: {kind}")
+    if kind == "numpy":
+        return NumpyStore(db_path, name, dtype=dtype, quantization=quantization)
+    if quantization is not None:
+        raise ValueError("Quantization requires the numpy vector store")
+    return ChromaStore(db_path, name)
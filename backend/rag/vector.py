@@ -7,17 +7,90 @@ This module provides a ChromaRag class that implements RAG functionality by:
 3. Storing documents and embeddings in ChromaDB
 4. Retrieving relevant context for queries
 
+Indexing is incremental by default: a manifest of indexed files and chunks is
+kept next to the database, so only added or changed files are re-embedded.
+Embeddings are also cached on disk by (model, text hash), so identical chunks
+and repeated queries are never sent to Ollama twice, and retrieval results are
+cached in memory until the collection changes.
+
+A BM25 index of the same chunks is kept alongside the collection, so that a
+hybrid retrieve mode can fuse lexical and vector rankings and find exact proper
+nouns that dense retrieval misses.
+
+Retrieval can be scoped to part of the vault with metadata filters on the
+source file and markdown header path of each chunk, which are pushed down into
+the ChromaDB query. The header tree of the vault is kept in the manifest, so it
+can be listed without querying ChromaDB.
+
+Single files can also be re-indexed in place (see ChromaRag.update_files), e.g.
+when a watcher notices that the vault was edited, without scanning the rest of
+the vault.
+
+Chunks are stored in a ChromaDB collection by default, or in a memory-mapped
+NumPy matrix searched exactly (see rag.store), through the same interface.
+
+Embedding, vector store queries, BM25 searches and ingestion are timed as stages
+of the process-wide metrics (see telemetry.metrics), along with cache hits.
+
 The implementation is specifically tailored for D&D campaign documents but can be used
 for any markdown-based knowledge base that largely utlizes markdown headers.
 """
 
+import json
 import os
 import re
 import shutil
-from chromadb import PersistentClient
+import threading
+from pathlib import Path
 import ollama
 from langchain.text_splitter import MarkdownHeaderTextSplitter
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
+from langchain_community.document_loaders import TextLoader
+from rag.cache import EmbeddingCache, TTLCache
+from rag.ingest import IngestionPipeline, IngestionProgress
+from rag.lexical import BM25Index, reciprocal_rank_fusion
+from rag.manifest import IndexManifest
+from rag.store import open_store
+from telemetry import metrics
+
+# Chunk metadata keys holding the markdown header path, outermost first
+HEADER_KEYS = ["Header 1", "Header 2", "Header 3", "Header 4"]
+
+
+def generation_storage_name(collection_name, generation):
+    """
+    Get the storage name of a generation of a collection.
+
+    Args:
+        collection_name (str): Normalized collection name
+        generation (int): Generation of the collection
+
+    Returns:
+        str: The collection name for generation 0, "<name>.<generation>"
+        for later ones
+    """
+    if not generation:
+        return collection_name
+    return f"{collection_name}.{generation}"
+
+
+def iter_markdown_files(directory):
+    """
+    Walk the markdown files in a directory.
+
+    Hidden files and directories are skipped, like DirectoryLoader does.
+
+    Args:
+        directory (str): Directory to walk, recursively
+
+    Yields:
+        str: Path of each markdown file
+    """
+
+    root = Path(directory)
+    for path in sorted(root.glob("**/*.md")):
+        relative = path.relative_to(root)
+        if path.is_file() and not any(part.startswith(".") for part in relative.parts):
+            yield str(path)
 
 
 class ChromaRag:
@@ -25,7 +98,7 @@ class ChromaRag:
     Implements RAG using ChromaDB for document storage and Ollama for embeddings.
 
     This class handles the complete RAG pipeline from document ingestion to retrieval:
-    - Loads markdown files from a directory
+    - Streams markdown files from a directory, one file at a time
     - Splits documents based on markdown headers
     - Creates embeddings using Ollama
     - Stores documents and embeddings in ChromaDB
@@ -36,10 +109,46 @@ class ChromaRag:
         collection_name (str): Name of the ChromaDB collection
         db_path (str): Path to store the ChromaDB database
         model_name (str): Name of the Ollama model for embeddings
-        collection: ChromaDB collection instance
+        incremental (bool): Whether to reuse the existing index and only
+            re-embed added or changed files
+        batch_size (int): Number of chunks embedded and stored per call
+        embed_workers (int): Number of concurrent embedding workers
+        queue_depth (int): Maximum number of batches queued between stages
+        embed_fn: Embedding function with the signature of ollama.embed
+        vector_store (str): Vector store backend, "chroma" or "numpy"
+        generation (int): Version of the collection's storage, a new one is
+            built next to the one being served and then swapped in
+        storage_name (str): Name the store, manifest and lexical index of
+            this generation are kept under
+        collection (VectorStore): Vector store of the chunks
+        manifest (IndexManifest): Record of indexed files and chunks
+        lexical_index (Optional[BM25Index]): BM25 index of the chunks, used by
+            hybrid retrieval
     """
 
-    def __init__(self, source_directory, collection_name, db_path, model_name):
+    def __init__(
+        self,
+        source_directory,
+        collection_name,
+        db_path,
+        model_name,
+        incremental=True,
+        batch_size=64,
+        embed_fn=None,
+        embed_workers=4,
+        queue_depth=8,
+        embedding_cache_size=50000,
+        retrieval_cache_size=256,
+        retrieval_cache_ttl=600,
+        progress=None,
+        index=True,
+        lexical_index=True,
+        vector_store="chroma",
+        vector_dtype="float32",
+        vector_quantization=None,
+        generation=0,
+        copy_from=None,
+    ):
         """
         Initialize the RAG system.
 
@@ -48,6 +157,45 @@ class ChromaRag:
             collection_name (str): Name for the ChromaDB collection
             db_path (str): Path where ChromaDB will store its files
             model_name (str): Name of the Ollama model to use for embeddings
+            incremental (bool): Reuse the existing index if True, otherwise
+                drop this collection, its manifest and its lexical index and
+                rebuild them from scratch (default: True)
+            batch_size (int): Number of chunks per embedding request and
+                collection insert (default: 64)
+            embed_fn (Optional[Callable]): Replacement for ollama.embed, e.g. a
+                stub embedder for benchmarks (default: ollama.embed)
+            embed_workers (int): Number of concurrent embedding workers used
+                while indexing (default: 4)
+            queue_depth (int): Maximum number of batches buffered between the
+                loading, embedding and storing stages (default: 8)
+            embedding_cache_size (int): Maximum number of embeddings kept in
+                the on-disk cache in db_path, 0 disables it (default: 50000)
+            retrieval_cache_size (int): Maximum number of retrieve results kept
+                in memory, 0 disables the cache (default: 256)
+            retrieval_cache_ttl (float): Seconds before a cached retrieve
+                result expires, 0 for never (default: 600)
+            progress (Optional[IngestionProgress]): Progress counters to
+                update while indexing, e.g. for a status endpoint
+            index (bool): Index the source directory on creation. False opens
+                the existing collection as is, without scanning any files
+                (default: True)
+            lexical_index (bool): Maintain a BM25 index next to the collection
+                for hybrid retrieval (default: True)
+            vector_store (str): "chroma" to store chunks in ChromaDB, or
+                "numpy" for a memory-mapped matrix with exact search, which
+                opens in milliseconds and has less per-query overhead for
+                vaults of up to a few hundred thousand chunks
+                (default: "chroma")
+            vector_dtype (str): Vector storage type of the "numpy" store,
+                "float32" or "float16" (default: "float32")
+            vector_quantization (Optional[str]): Quantized in-memory index of
+                the "numpy" store, "int8" or "binary", whose candidates are
+                re-scored at full precision (default: None, exact search)
+            generation (int): Version of the collection's storage to open
+                (default: 0)
+            copy_from (Optional[int]): Generation to copy the store, manifest
+                and lexical index from before an incremental update, which
+                then leaves that generation untouched (default: None)
         """
 
         self.source_directory = source_directory
@@ -55,19 +203,94 @@ class ChromaRag:
         self.collection_name = self.normalize(collection_name)
         self.db_path = db_path
         self.model_name = model_name
-
-        try:
-            shutil.rmtree(self.db_path)
-        except:
-            pass
+        self.incremental = incremental
+        self.batch_size = max(1, int(batch_size))
+        self.embed_fn = embed_fn or ollama.embed
+        self.embed_workers = max(1, int(embed_workers))
+        self.queue_depth = max(1, int(queue_depth))
+        self.vector_store = vector_store
+        self.generation = int(generation)
+        self.storage_name = self.generation_name(self.generation)
+        self.progress = progress or IngestionProgress()
+        # Serializes indexing runs, which share the manifest
+        self._index_lock = threading.Lock()
 
         os.makedirs(self.db_path, exist_ok=True)
 
-        client = PersistentClient(path=db_path)
-        self.collection = client.get_or_create_collection(name=self.collection_name)
-        self.create_rag()
+        self.embedding_cache = None
+        if embedding_cache_size:
+            self.embedding_cache = EmbeddingCache(
+                os.path.join(self.db_path, "embedding_cache.sqlite"),
+                max_entries=embedding_cache_size,
+            )
+
+        self.version = 0
+        self.retrieval_cache = None
+        if retrieval_cache_size:
+            self.retrieval_cache = TTLCache(
+                max_entries=retrieval_cache_size, ttl=retrieval_cache_ttl
+            )
+
+        if self.incremental and copy_from is not None and copy_from != self.generation:
+            source = self.generation_name(copy_from)
+            open_store(vector_store, db_path, source, dtype=vector_dtype).copy_to(
+                self.storage_name
+            )
+            for suffix in ("manifest.json", "bm25.json"):
+                path = os.path.join(self.db_path, f"{source}.{suffix}")
+                target = os.path.join(self.db_path, f"{self.storage_name}.{suffix}")
+                if os.path.exists(path):
+                    shutil.copyfile(path, target)
+
+        self.collection = open_store(
+            vector_store,
+            db_path,
+            self.storage_name,
+            dtype=vector_dtype,
+            quantization=vector_quantization,
+        )
+        self.manifest = IndexManifest(
+            os.path.join(self.db_path, f"{self.storage_name}.manifest.json")
+        )
+
+        self.lexical_index = None
+        if lexical_index:
+            self.lexical_index = BM25Index(
+                os.path.join(self.db_path, f"{self.storage_name}.bm25.json")
+            )
+
+        # A rebuild starts only this collection over: other collections in
+        # db_path and the embedding cache they share are kept. Chunks embedded
+        # with another model are not comparable, so they are dropped as well
+        if not self.incremental or self.manifest.model_name != self.model_name:
+            self.collection.reset()
+            self.manifest.reset(self.model_name)
+            self.manifest.save()
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+                self.lexical_index.save()
+
+        # The database was removed or reset behind the manifest's back
+        if self.manifest.files and self.collection.count() == 0:
+            self.manifest.reset(self.model_name)
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
+
+        # Collections indexed before the lexical index existed
+        if (
+            self.lexical_index is not None
+            and not len(self.lexical_index)
+            and self.collection.count()
+        ):
+            stored = self.collection.get(include=["documents"])
+            self.lexical_index.add(zip(stored["ids"], stored["documents"]))
+            self.lexical_index.save()
 
-    def normalize(self, name):
+        if index:
+            self.create_rag()
+
+    @staticmethod
+    def normalize(name):
         """
         Normalize a string for use as a collection or chunk ID.
 
@@ -79,16 +302,323 @@ class ChromaRag:
         """
         return re.sub(r"[-_. ]+", "-", name).lower()
 
+    def generation_name(self, generation):
+        """
+        Get the storage name of a generation of the collection.
+
+        Generation 0 is stored under the collection name itself, later ones
+        append ".<generation>", which normalize never produces, so they cannot
+        clash with another collection.
+
+        Args:
+            generation (int): Generation of the collection
+
+        Returns:
+            str: Name of the generation's store, manifest and lexical index
+        """
+        return generation_storage_name(self.collection_name, generation)
+
+    def drop(self):
+        """
+        Delete this generation's store, manifest and lexical index from disk,
+        e.g. once a newer generation was swapped in. The embedding cache is
+        shared and kept. The collection must not be used afterwards.
+        """
+
+        self.collection.drop()
+        paths = [self.manifest.path]
+        if self.lexical_index is not None:
+            paths.append(self.lexical_index.path)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def drop_stored(config):
+        """
+        Delete a generation from disk without loading it.
+
+        Like drop, for a generation that is not open: only its store is
+        opened to delete it, the manifest and lexical index are not read.
+
+        Args:
+            config (Dict[str, Any]): ChromaRag keyword arguments the
+                generation was created with (collection_name, db_path,
+                generation, vector_store, ...)
+        """
+
+        name = generation_storage_name(
+            ChromaRag.normalize(config["collection_name"]), config.get("generation", 0)
+        )
+        db_path = config["db_path"]
+        open_store(
+            config.get("vector_store", "chroma"),
+            db_path,
+            name,
+            dtype=config.get("vector_dtype", "float32"),
+        ).drop()
+        for suffix in ("manifest.json", "bm25.json"):
+            try:
+                os.remove(os.path.join(db_path, f"{name}.{suffix}"))
+            except OSError:
+                pass
+
+    @staticmethod
+    def is_current(config):
+        """
+        Check whether a generation already indexes every file of its source
+        directory as it is now, without loading it.
+
+        Only the generation's manifest is read, and the files are compared by
+        modification time like an incremental update does.
+
+        Args:
+            config (Dict[str, Any]): ChromaRag keyword arguments the
+                generation was created with
+
+        Returns:
+            bool: Whether an incremental update would not change anything
+        """
+
+        name = generation_storage_name(
+            ChromaRag.normalize(config["collection_name"]), config.get("generation", 0)
+        )
+        manifest = IndexManifest(
+            os.path.join(config["db_path"], f"{name}.manifest.json")
+        )
+        return manifest.model_name == config["model_name"] and manifest.unchanged(
+            iter_markdown_files(config["source_directory"])
+        )
+
     def create_rag(self):
         """
-        Create the RAG knowledge base from markdown files.
+        Create or update the RAG knowledge base from markdown files.
 
         This method:
-        1. Loads all markdown files from the source directory
-        2. Splits them based on headers
-        3. Processes metadata and content
-        4. Creates embeddings
-        5. Stores everything in ChromaDB
+        1. Walks the markdown files in the source directory
+        2. Skips files whose modification time or content hash is unchanged
+        3. Loads and splits added or changed files based on headers
+        4. Creates embeddings for new or changed chunks only
+        5. Stores everything in ChromaDB and removes chunks of deleted files
+
+        Files are loaded lazily, one at a time, and splitting, embedding and
+        storing run as a pipeline (see IngestionPipeline). Peak memory is
+        therefore bounded by the largest single file plus the pipeline queues,
+        and the first chunks are stored before the whole vault has been read.
+        """
+
+        with self._index_lock, metrics.time("index"):
+            self._create_rag()
+
+    def update_files(self, paths):
+        """
+        Re-index only some files of the vault, in place.
+
+        Each file is re-split like in create_rag, and only its new or changed
+        chunks are embedded and upserted under their chunk IDs, while chunks
+        that disappeared from it are deleted. Files that no longer exist have
+        all their chunks deleted. No other file is scanned, so an edit to one
+        note is searchable within seconds, also on large vaults.
+
+        Args:
+            paths (Iterable[str]): Added, changed or deleted markdown files,
+                as yielded by iter_sources
+
+        Returns:
+            Dict containing:
+            - files: Number of existing files re-split
+            - chunks_embedded: Number of chunks embedded and upserted
+            - chunks_deleted: Number of chunks deleted
+        """
+
+        progress = IngestionProgress()
+
+        with self._index_lock, metrics.time("update"):
+            # Keep the counters of the last full indexing run intact
+            previous, self.progress = self.progress, progress
+            try:
+                deleted = self._create_rag(paths)
+            finally:
+                self.progress = previous
+
+        snapshot = progress.snapshot()
+        return {
+            "files": snapshot["files_scanned"],
+            "chunks_embedded": snapshot["chunks_embedded"],
+            "chunks_deleted": deleted,
+        }
+
+    def _create_rag(self, paths=None):
+        stale_ids = []
+        seen_sources = set()
+        pending = {}
+
+        if paths is None:
+            sources = list(self.iter_sources())
+            removable = self.manifest.sources()
+        else:
+            paths = {str(path) for path in paths}
+            sources = sorted(path for path in paths if os.path.isfile(path))
+            removable = paths & self.manifest.sources()
+        self.progress.start(len(sources))
+
+        pipeline = IngestionPipeline(
+            embed_batch=self.embed_texts,
+            store_batch=self.store_batch,
+            batch_size=self.batch_size,
+            workers=self.embed_workers,
+            queue_depth=self.queue_depth,
+        )
+        pipeline.run(self.changed_chunks(seen_sources, stale_ids, pending, sources))
+
+        # Only now that every chunk is stored, so a failed run leaves the
+        # files it did not finish marked as out of date
+        for source, entry in pending.items():
+            self.manifest.update(source, *entry)
+
+        for source in removable - seen_sources:
+            stale_ids.extend(self.manifest.remove(source))
+
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+            if self.lexical_index is not None:
+                self.lexical_index.remove(stale_ids)
+            self.invalidate()
+
+        self.collection.flush()
+        self.manifest.save()
+        if self.lexical_index is not None:
+            self.lexical_index.save()
+        self.progress.finish()
+        return len(stale_ids)
+
+    def invalidate(self):
+        """
+        Mark the collection as modified, invalidating cached retrieve results.
+        """
+
+        self.version += 1
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
+
+    def iter_sources(self):
+        """
+        Walk the markdown files in the source directory.
+
+        Hidden files and directories are skipped, like DirectoryLoader does.
+
+        Yields:
+            str: Path of each markdown file
+        """
+        yield from iter_markdown_files(self.source_directory)
+
+    def load_text(self, source):
+        """
+        Load the content of a single markdown file.
+
+        Args:
+            source (str): Path of the markdown file
+
+        Returns:
+            str: Content of the file
+        """
+
+        docs = TextLoader(source, encoding="utf-8").load()
+        return docs[0].page_content if docs else ""
+
+    def iter_chunks(self, sources=None):
+        """
+        Lazily load and split markdown files into chunks, one file at a time.
+
+        Args:
+            sources (Optional[Iterable[str]]): Files to load (default: every
+                markdown file in the source directory)
+
+        Yields:
+            Tuple[str, Dict[str, Any], str]: (text, metadata, id) per chunk
+        """
+
+        for source in sources if sources is not None else self.iter_sources():
+            yield from self.split_document(self.load_text(source), source)
+
+    def changed_chunks(self, seen_sources, stale_ids, pending, sources=None):
+        """
+        Lazily split added or changed files and yield the chunks to re-embed.
+
+        Files whose modification time is unchanged are not read at all. The
+        progress is updated for every file as it is processed, while its new
+        manifest entry is only collected in pending: the caller applies it
+        once the yielded chunks have been stored.
+
+        Args:
+            seen_sources (Set[str]): Collects the path of every source file
+            stale_ids (List[str]): Collects IDs of chunks that no longer exist
+            pending (Dict[str, Tuple]): Collects the manifest entry of every
+                added or changed file, as IndexManifest.update arguments after
+                the source
+            sources (Optional[Iterable[str]]): Files to scan (default: every
+                markdown file in the source directory)
+
+        Yields:
+            Tuple[str, Dict[str, Any], str]: (text, metadata, id) of new or
+            changed chunks
+        """
+
+        for source in sources if sources is not None else self.iter_sources():
+            seen_sources.add(source)
+
+            mtime = os.path.getmtime(source)
+            entry = self.manifest.get(source)
+
+            # Entries from before header paths were recorded are re-split
+            # once, which only re-embeds chunks whose hash changed
+            if entry and "headers" not in entry:
+                entry = dict(entry, mtime=None, hash=None)
+
+            if entry and entry["mtime"] == mtime:
+                self.progress.add(files_scanned=1)
+                continue
+
+            text = self.load_text(source)
+            file_hash = self.manifest.hash_text(text)
+            if entry and entry["hash"] == file_hash:
+                pending[source] = (mtime, file_hash, entry["chunks"], entry["headers"])
+                self.progress.add(files_scanned=1)
+                continue
+
+            previous_chunks = entry["chunks"] if entry else {}
+            chunk_hashes = {}
+            headers = []
+            changed = 0
+
+            for formatted, metadata, chunk_id in self.split_document(text, source):
+                chunk_hash = self.manifest.hash_text(formatted)
+                chunk_hashes[chunk_id] = chunk_hash
+
+                path = [metadata[key] for key in HEADER_KEYS if key in metadata]
+                if path and path not in headers:
+                    headers.append(path)
+
+                if previous_chunks.get(chunk_id) != chunk_hash:
+                    changed += 1
+                    yield formatted, metadata, chunk_id
+
+            stale_ids.extend(set(previous_chunks) - set(chunk_hashes))
+            pending[source] = (mtime, file_hash, chunk_hashes, headers)
+            self.progress.add(files_scanned=1, chunks_queued=changed)
+
+    def split_document(self, text, source):
+        """
+        Split a markdown document into formatted chunks based on its headers.
+
+        Args:
+            text (str): Markdown content of the document
+            source (str): Path of the source file
+
+        Returns:
+            List[Tuple[str, Dict[str, Any], str]]: (text, metadata, id) per chunk
         """
 
         headers_to_split_on = [
@@ -103,102 +633,484 @@ class ChromaRag:
             headers_to_split_on, strip_headers=False
         )
 
-        loader = DirectoryLoader(
-            self.source_directory,
-            glob="**/*.md",
-            loader_cls=TextLoader,
-            loader_kwargs={"encoding": "utf-8"},
-        )
-        docs = loader.load()
-
         chunks = []
-        for doc in docs:
+        splits = markdown_splitter.split_text(text)
 
-            text = doc.page_content
-            splits = markdown_splitter.split_text(text)
-            source = doc.metadata.get("source")
+        for i, split in enumerate(splits):
 
-            for i, split in enumerate(splits):
-
-                source_basename = self.normalize(os.path.basename(source)).replace(
-                    ".md", ""
-                )
-                chunk_id = f"{self.normalize(source_basename).replace('.md', '')}-{i+1}"
+            source_basename = self.normalize(os.path.basename(source)).replace(
+                ".md", ""
+            )
+            chunk_id = f"{self.normalize(source_basename).replace('.md', '')}-{i+1}"
 
-                page_content = split.page_content
-                header_metadata = split.metadata
+            page_content = split.page_content
+            header_metadata = split.metadata
 
-                title = header_metadata.get("Header 1", "Untitled")
-                section = header_metadata.get("Header 2", "Untitled")
-                subsection = header_metadata.get("Header 3", "Untitled")
+            title = header_metadata.get("Header 1", "Untitled")
+            section = header_metadata.get("Header 2", "Untitled")
+            subsection = header_metadata.get("Header 3", "Untitled")
 
-                header_metadata["source"] = source
-                header_metadata["source_basename"] = source_basename
-                header_metadata["chunk_id"] = chunk_id
+            header_metadata["source"] = source
+            header_metadata["source_basename"] = source_basename
+            header_metadata["chunk_id"] = chunk_id
 
-                formatted = (
-                    f"Title: {title}\n"
-                    f"Section: {section}\n"
-                    f"Subsection: {subsection}\n"
-                    f"Source: {source_basename}\n\n"
-                    f"Content:\n{page_content.strip()}"
-                )
+            formatted = (
+                f"Title: {title}\n"
+                f"Section: {section}\n"
+                f"Subsection: {subsection}\n"
+                f"Source: {source_basename}\n\n"
+                f"Content:\n{page_content.strip()}"
+            )
 
-                chunks.append((formatted, header_metadata, chunk_id))
+            chunks.append((formatted, header_metadata, chunk_id))
 
-        self.embed_and_store(chunks)
+        return chunks
 
     def embed_text(self, text):
         """
         Create embeddings for text using Ollama.
 
         Args:
-            text (str): Text to embed
+            text (Union[str, List[str]]): Text, or list of texts, to embed
 
         Returns:
-            List[float]: Vector embedding of the text
+            List[List[float]]: One vector embedding per input text
         """
 
-        resp = ollama.embed(model=self.model_name, input=text)
+        with metrics.time("embed"):
+            resp = self.embed_fn(model=self.model_name, input=text)
         return resp["embeddings"]
 
+    def embed_texts(self, texts):
+        """
+        Create embeddings for a list of texts, consulting the embedding cache.
+
+        Only texts missing from the cache are sent to Ollama, in a single
+        request, and their embeddings are added to the cache.
+
+        Args:
+            texts (List[str]): Texts to embed
+
+        Returns:
+            List[List[float]]: Vector embeddings, in the same order as texts
+        """
+
+        texts = list(texts)
+        if not texts:
+            return []
+
+        if self.embedding_cache is None:
+            return self.embed_text(texts)
+
+        embeddings = self.embedding_cache.get_many(self.model_name, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        metrics.inc(
+            "dmi_cache_requests_total",
+            len(texts) - len(missing),
+            cache="embedding",
+            result="hit",
+        )
+        metrics.inc(
+            "dmi_cache_requests_total", len(missing), cache="embedding", result="miss"
+        )
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = self.embed_text(missing_texts)
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+            self.embedding_cache.put_many(self.model_name, missing_texts, fresh)
+
+        return embeddings
+
+    def batches(self, chunk_triples):
+        """
+        Group document chunks into batches of at most batch_size.
+
+        Args:
+            chunk_triples: Iterable of tuples containing (text, metadata, id)
+
+        Yields:
+            List[Tuple[str, Dict[str, Any], str]]: Batch of chunk triples
+        """
+
+        batch = []
+        for triple in chunk_triples:
+            batch.append(triple)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
     def embed_and_store(self, chunk_triples):
         """
         Embed and store document chunks in ChromaDB.
 
+        Chunks are processed in batches, each costing a single embedding
+        request and a single collection insert.
+
         Args:
-            chunk_triples: List of tuples containing (text, metadata, id)
+            chunk_triples: Iterable of tuples containing (text, metadata, id)
+        """
+
+        for batch in self.batches(chunk_triples):
+            texts = [text for text, _, _ in batch]
+            with metrics.time("embed_batch"):
+                embeddings = self.embed_texts(texts)
+            self.store_batch(batch, embeddings)
+
+    def store_batch(self, batch, embeddings):
+        """
+        Store a batch of embedded chunks in ChromaDB.
+
+        Args:
+            batch: List of tuples containing (text, metadata, id)
+            embeddings (List[List[float]]): Vector embedding for each chunk
+        """
+
+        with metrics.time("store"):
+            self.collection.upsert(
+                ids=[id for _, _, id in batch],
+                embeddings=embeddings,
+                documents=[text for text, _, _ in batch],
+                metadatas=[metadata for _, metadata, _ in batch],
+            )
+            if self.lexical_index is not None:
+                self.lexical_index.add((id, text) for text, _, id in batch)
+        self.invalidate()
+        self.progress.add(chunks_embedded=len(batch))
+        metrics.inc("dmi_chunks_indexed_total", len(batch))
+
+    def metadata_filter(self, source=None, headers=None):
+        """
+        Build a ChromaDB where clause scoping retrieval to part of the vault.
+
+        Args:
+            source (Optional[str]): Prefix of the source file path, relative
+                to the source directory, e.g. "npcs/" or "towns/stonehearth"
+            headers (Optional[List[str]]): Header path the chunks must be
+                under, outermost first, e.g. ["Stonehearth", "Notable People"]
+
+        Returns:
+            Optional[Dict[str, Any]]: Where clause, None if there is no filter
+
+        Raises:
+            ValueError: If the filter is malformed, or no indexed file matches
+                the source prefix
+        """
+
+        conditions = []
+
+        if source:
+            if not isinstance(source, str):
+                raise ValueError("Source filter must be a path prefix")
+
+            prefix = source.replace("\\", "/")
+            matches = sorted(
+                path
+                for path in self.manifest.sources()
+                if self.relative_source(path).startswith(prefix)
+            )
+            if not matches:
+                raise ValueError(f"No indexed files match source prefix: {source}")
+
+            conditions.append({"source": {"$in": matches}})
+
+        if headers:
+            if isinstance(headers, str) or len(headers) > len(HEADER_KEYS):
+                raise ValueError(
+                    f"Header filter must be a list of at most {len(HEADER_KEYS)} headers"
+                )
+
+            conditions += [
+                {key: {"$eq": header}} for key, header in zip(HEADER_KEYS, headers)
+            ]
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def relative_source(self, source):
+        """
+        Get the path of a source file relative to the source directory.
+
+        Args:
+            source (str): Path of the source file
+
+        Returns:
+            str: Relative path with forward slashes
+        """
+        return Path(source).relative_to(self.source_directory).as_posix()
+
+    def header_tree(self):
+        """
+        List the markdown header tree of every indexed file.
+
+        The tree is built from the header paths recorded in the manifest, so
+        no ChromaDB query is needed.
+
+        Returns:
+            List[Dict[str, Any]]: Per file, in path order, its "source"
+            (relative path), "source_basename" and "sections", a list of
+            {"title", "sections"} nodes nested by header level
         """
 
-        for text, metadata, id in chunk_triples:
-            embeddings = self.embed_text(text)
-            self.collection.add(
-                ids=[id], embeddings=embeddings, documents=[text], metadatas=[metadata]
+        tree = []
+
+        for source in sorted(self.manifest.sources()):
+            root = {"sections": []}
+
+            for path in self.manifest.get(source).get("headers", []):
+                node = root
+                for title in path:
+                    child = next(
+                        (c for c in node["sections"] if c["title"] == title), None
+                    )
+                    if child is None:
+                        child = {"title": title, "sections": []}
+                        node["sections"].append(child)
+                    node = child
+
+            tree.append(
+                {
+                    "source": self.relative_source(source),
+                    "source_basename": self.normalize(
+                        os.path.basename(source)
+                    ).replace(".md", ""),
+                    "sections": root["sections"],
+                }
             )
 
-    def retrieve(self, query, k=5):
+        return tree
+
+    def retrieve(self, query, k=5, mode="vector", where=None):
         """
         Retrieve relevant documents for a query.
 
+        Results are cached per (query, k, mode, filter, collection version),
+        so repeated queries skip both the embedding request and the ChromaDB
+        query until the collection is re-indexed.
+
         Args:
             query (str): Query text to search for
             k (int): Number of documents to retrieve (default: 5)
+            mode (str): "vector" for dense retrieval only, or "hybrid" to fuse
+                the dense and BM25 rankings (default: "vector")
+            where (Optional[Dict[str, Any]]): ChromaDB metadata filter, see
+                metadata_filter (default: None, search the whole collection)
 
         Returns:
             Tuple containing:
             - List[str]: Retrieved documents
             - List[str]: Document IDs
             - List[Dict[str, Any]]: Document metadata
+
+        Raises:
+            ValueError: If mode is unknown, or "hybrid" without a lexical index
+        """
+
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if mode == "hybrid" and self.lexical_index is None:
+            raise ValueError("Hybrid retrieval requires the lexical index")
+
+        key = (query, k, mode, json.dumps(where, sort_keys=True), self.version)
+        if self.retrieval_cache is not None:
+            cached = self.retrieval_cache.get(key)
+            metrics.inc(
+                "dmi_cache_requests_total",
+                cache="retrieval",
+                result="miss" if cached is None else "hit",
+            )
+            if cached is not None:
+                return tuple(list(part) for part in cached)
+
+        if mode == "hybrid":
+            retrieved = self.hybrid_search(query, k, where=where)
+        else:
+            query_embedding = self.embed_texts([query])
+            with metrics.time("vector_query"):
+                results = self.collection.query(
+                    query_embeddings=query_embedding, n_results=k, where=where
+                )
+            retrieved = (
+                results["documents"][0],
+                results["ids"][0],
+                results["metadatas"][0],
+            )
+
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.put(key, retrieved)
+
+        return tuple(list(part) for part in retrieved)
+
+    def retrieve_many(self, queries, k=5, mode="vector", where=None):
         """
+        Retrieve relevant documents for several queries at once.
 
-        query_embedding = self.embed_text(query)
-        results = self.collection.query(query_embeddings=query_embedding, n_results=k)
+        Queries missing from the retrieval cache are embedded in a single
+        request, and in "vector" mode searched with a single ChromaDB query.
 
-        return results["documents"][0], results["ids"][0], results["metadatas"][0]
+        Args:
+            queries (List[str]): Query texts to search for
+            k (int): Number of documents to retrieve per query (default: 5)
+            mode (str): "vector" or "hybrid", see retrieve (default: "vector")
+            where (Optional[Dict[str, Any]]): ChromaDB metadata filter, see
+                metadata_filter (default: None)
+
+        Returns:
+            List[Tuple[List[str], List[str], List[Dict[str, Any]]]]: Documents,
+            IDs and metadata per query, in the same order as queries
+
+        Raises:
+            ValueError: If mode is unknown, or "hybrid" without a lexical index
+        """
+
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if mode == "hybrid" and self.lexical_index is None:
+            raise ValueError("Hybrid retrieval requires the lexical index")
+
+        where_key = json.dumps(where, sort_keys=True)
+        keys = [(query, k, mode, where_key, self.version) for query in queries]
+        retrieved = [None] * len(queries)
+
+        if self.retrieval_cache is not None:
+            retrieved = [self.retrieval_cache.get(key) for key in keys]
+
+        missing = [i for i, result in enumerate(retrieved) if result is None]
+        if self.retrieval_cache is not None:
+            metrics.inc(
+                "dmi_cache_requests_total",
+                len(keys) - len(missing),
+                cache="retrieval",
+                result="hit",
+            )
+            metrics.inc(
+                "dmi_cache_requests_total",
+                len(missing),
+                cache="retrieval",
+                result="miss",
+            )
+        if missing:
+            embeddings = self.embed_texts([queries[i] for i in missing])
+
+            if mode == "hybrid":
+                fresh = [
+                    self.hybrid_search(
+                        queries[i], k, where=where, query_embedding=embedding
+                    )
+                    for i, embedding in zip(missing, embeddings)
+                ]
+            else:
+                with metrics.time("vector_query"):
+                    results = self.collection.query(
+                        query_embeddings=embeddings, n_results=k, where=where
+                    )
+                fresh = list(
+                    zip(results["documents"], results["ids"], results["metadatas"])
+                )
+
+            for i, result in zip(missing, fresh):
+                retrieved[i] = result
+                if self.retrieval_cache is not None:
+                    self.retrieval_cache.put(keys[i], result)
+
+        return [tuple(list(part) for part in result) for result in retrieved]
+
+    def hybrid_search(
+        self, query, k=5, candidates=None, where=None, query_embedding=None
+    ):
+        """
+        Retrieve documents by fusing the dense and BM25 rankings of a query.
+
+        Both retrievers over-fetch candidates, which are then fused with
+        reciprocal rank fusion. Documents found only by BM25 are fetched from
+        the collection by ID.
+
+        Args:
+            query (str): Query text to search for
+            k (int): Number of documents to retrieve (default: 5)
+            candidates (Optional[int]): Number of candidates taken from each
+                ranking (default: max(4 * k, 20))
+            where (Optional[Dict[str, Any]]): ChromaDB metadata filter applied
+                to both rankings (default: None)
+            query_embedding (Optional[List[float]]): Embedding of the query,
+                if already computed (default: None, embed the query)
+
+        Returns:
+            Tuple containing:
+            - List[str]: Retrieved documents
+            - List[str]: Document IDs
+            - List[Dict[str, Any]]: Document metadata
+        """
+
+        candidates = candidates or max(4 * k, 20)
+
+        if query_embedding is None:
+            query_embedding = self.embed_texts([query])[0]
+
+        with metrics.time("vector_query"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding], n_results=candidates, where=where
+            )
+        vector_ids = results["ids"][0]
+
+        with metrics.time("lexical_query"):
+            allowed = None
+            if where is not None:
+                allowed = set(self.collection.get(where=where, include=[])["ids"])
+
+            lexical_ids = [
+                id for id, _ in self.lexical_index.search(query, candidates, allowed)
+            ]
+
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids])
+        ids = [id for id, _ in fused[:k]]
+
+        found = {
+            id: (document, metadata)
+            for id, document, metadata in zip(
+                vector_ids, results["documents"][0], results["metadatas"][0]
+            )
+        }
+        missing = [id for id in ids if id not in found]
+        if missing:
+            stored = self.collection.get(ids=missing)
+            found.update(
+                zip(stored["ids"], zip(stored["documents"], stored["metadatas"]))
+            )
+
+        ids = [id for id in ids if id in found]
+        return (
+            [found[id][0] for id in ids],
+            ids,
+            [found[id][1] for id in ids],
+        )
+
+    def cache_stats(self):
+        """
+        Get hit/miss statistics of the embedding and retrieval caches.
+
+        Returns:
+            Dict containing:
+            - embedding: Embedding cache statistics, None if disabled
+            - retrieval: Retrieval cache statistics, None if disabled
+        """
+
+        return {
+            "embedding": self.embedding_cache and self.embedding_cache.stats(),
+            "retrieval": self.retrieval_cache and self.retrieval_cache.stats(),
+        }
 
     def inspect_db(self, limit=None):
         """
-        Inspect the contents of the ChromaDB collection.
+        Inspect the contents of the vector store.
 
         Args:
             limit (Optional[int]): Maximum number of documents to return
@@ -7,19 +7,59 @@ This module provides a REST API for the DMI application, handling:
 3. D&D content generation endpoints
 
 The server uses Flask and connects to ChromaDB for document retrieval and
-Ollama or llama.cpp for text generation.
+Ollama or llama.cpp for text generation. Run with --production to serve
+requests concurrently from a waitress worker-thread pool instead of the Flask
+development server. Shared state is guarded by a readers-writer lock: queries
+retrieve under the read lock, while /setup indexes in a background job and
+swaps the new index in under the write lock. With "watch" set in /setup, edits
+to the vault are re-indexed in place as they happen, file by file.
 
 Routes:
-    /setup: Initialize global variables and objects
+    /setup: Initialize global variables and objects (as a background job)
+    /jobs/<job_id>: Status and progress of a background indexing job
+    /collections: Registered collections (one per campaign)
+    /collections/<name>/sections: Header tree of a collection's files
+    /stats: Cache, context packing, prefetch and model statistics
+    /prefetch: Warm the embedding and retrieval caches for a partial query
+        while the user is still typing
     /ask: General question answering
     /gen/*: Content generation endpoints for NPCs, locations, etc.
+    /ask/stream, /gen/*/stream: Server-Sent Events variants streaming partial
+        responses while they are generated
+    /gen/batch: Many generation jobs in one request, streamed as they complete
+    /metrics: Request, stage latency, cache, token and retry metrics in the
+        Prometheus text format
+
+With a reranking model set up, queries retrieve several times top_k candidate
+chunks and a local cross-encoder keeps only the relevant ones, at most top_k.
+
+Every request is timed, and the time spent in each stage (embedding, ChromaDB
+query, re-ranking, context packing, prompt build, generation, validation,
+serialization)
+is recorded in the metrics. Requests sent with an X-Request-Timing header get
+their own stage timings back in a Server-Timing response header.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from rag import ChromaRag
+from rag import ChromaRag, ContextPacker, IngestionProgress, Reranker
+from service import (
+    BatchRunner,
+    CollectionRegistry,
+    JobConflictError,
+    JobManager,
+    PrefetchCancelled,
+    Prefetcher,
+    ReadWriteLock,
+    UnknownCollectionError,
+    VaultWatcher,
+    scan_vault,
+)
 from llm import (
     InstructorAssistant,
+    LlamaRanker,
+    ResponseCache,
+    model_manager,
     Answer,
     NPCList,
     LocationList,
@@ -28,40 +68,245 @@ from llm import (
     RumourList,
     GeneratedNameList,
 )
+from telemetry import metrics
+import argparse
+import hashlib
+import json
 import os
+import time
 from typing import Type, TypeVar
 from pydantic import BaseModel
 
 T = TypeVar("T", bound=BaseModel)
 
 app = Flask(__name__)
-CORS(app)
+CORS(
+    app,
+    expose_headers=[
+        "X-Context-Tokens-Before",
+        "X-Context-Tokens-After",
+        "X-Prompt-Tokens",
+        "X-Prefill-Tokens-Saved",
+        "X-Generation-Attempts",
+        "Server-Timing",
+    ],
+)
 
 # Global variables for maintaining state
 model_embed = None
 model_chat = None
 db_path = None
 source_dir = None
-chroma_rag = None
 instructor_assistant = None
 
+# Deduplicates and budgets retrieved chunks into the prompt context
+context_packer = None
+
+# Re-ranks over-fetched candidate chunks, None without a reranking model
+reranker = None
+
+# Named, persistent collections (one per campaign) loaded on demand
+registry = CollectionRegistry()
+
+# Guards the globals above: held for reading while retrieving from a
+# collection, and for writing while /setup swaps in a new one
+state_lock = ReadWriteLock()
+
+# Background indexing jobs started by /setup
+jobs = JobManager()
+
+# Admits, rate-limits and cancels speculative /prefetch requests
+prefetcher = Prefetcher()
+
+# Vault watchers re-indexing edited files in place, by collection name
+watchers = {}
+
+# Upper bounds of a /gen/batch request
+MAX_BATCH_JOBS = 50
+MAX_BATCH_CONCURRENCY = 16
+
+# Response models of the /gen/* endpoints, by route name
+GENERATOR_MODELS = {
+    "npc": NPCList,
+    "location": LocationList,
+    "puzzle": PuzzleList,
+    "item": ItemList,
+    "rumour": RumourList,
+    "name": GeneratedNameList,
+}
+
+
+# Accepted string spellings of boolean flags, e.g. from form-encoded clients
+FLAG_STRINGS = {
+    "true": True,
+    "1": True,
+    "yes": True,
+    "on": True,
+    "false": False,
+    "0": False,
+    "no": False,
+    "off": False,
+}
+
+
+def parse_flag(data: dict, key: str, default: bool) -> bool:
+    """
+    Read a boolean flag of a JSON payload.
+
+    Unlike bool(), which turns the string "false" into True, strings are
+    interpreted by their meaning.
+
+    Args:
+        data: JSON payload
+        key: Name of the flag
+        default: Value if the flag is missing or null
+
+    Returns:
+        bool: Value of the flag
+
+    Raises:
+        ValueError: If the value is neither a boolean, 0 or 1, nor one of
+            the strings in FLAG_STRINGS
+    """
+
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in FLAG_STRINGS:
+        return FLAG_STRINGS[value.strip().lower()]
+    raise ValueError(f'"{key}" must be true or false, got {value!r}')
+
+
+def parse_number(
+    data: dict, key: str, default, number_type=int, minimum=None, maximum=None
+):
+    """
+    Read a numeric field of a JSON payload.
+
+    Args:
+        data: JSON payload
+        key: Name of the field
+        default: Value if the field is missing or null, returned as is
+        number_type: int or float (default: int)
+        minimum: Smallest allowed value (default: no bound)
+        maximum: Largest allowed value (default: no bound)
+
+    Returns:
+        The value of the field as number_type
+
+    Raises:
+        ValueError: If the value is not a number of number_type (numeric
+            strings are accepted), or out of bounds
+    """
+
+    value = data.get(key)
+    if value is None:
+        return default
+
+    kind = "an integer" if number_type is int else "a number"
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        if number_type is int and isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        number = number_type(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'"{key}" must be {kind}, got {value!r}')
+
+    if number != number:
+        raise ValueError(f'"{key}" must be {kind}, got {value!r}')
+    if minimum is not None and number < minimum:
+        raise ValueError(f'"{key}" must be at least {minimum}, got {value!r}')
+    if maximum is not None and number > maximum:
+        raise ValueError(f'"{key}" must be at most {maximum}, got {value!r}')
+    return number
+
+
+def parse_retrieval_args(data: dict) -> dict:
+    """
+    Read the retrieval options shared by /ask, /gen/*, /gen/batch and /prefetch.
+
+    Args:
+        data: JSON payload
+
+    Returns:
+        Dict containing:
+        - mode: "vector" or "hybrid"
+        - filters: Keyword arguments of ChromaRag.metadata_filter
+        - top_k: Number of documents to retrieve (default: 5)
+        - rerank: The reranker, None without a reranking model or if the
+          request turns re-ranking off
+        - min_score: Relevance cutoff of re-ranking, None for the default
+        - context_tokens: Token budget of the context, None for the default
+
+    Raises:
+        ValueError: If the retrieval mode, filters, top_k, min_score,
+            context_tokens or rerank flag are invalid
+    """
+
+    mode = data.get("mode", "vector")
+    if mode not in ("vector", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+
+    filters = data.get("filters") or {}
+    if not isinstance(filters, dict) or set(filters) - {"source", "headers"}:
+        raise ValueError('Filters may only contain "source", "headers"')
+
+    return {
+        "mode": mode,
+        "filters": filters,
+        "top_k": parse_number(data, "top_k", 5, minimum=1),
+        "rerank": reranker if parse_flag(data, "rerank", True) else None,
+        "min_score": parse_number(data, "min_score", None, float, 0, 1),
+        "context_tokens": parse_number(data, "context_tokens", None, minimum=1),
+    }
+
+
+def creative_query(query: str) -> str:
+    """
+    Prompt a generation request for a creative answer.
+
+    Args:
+        query: The user's prompt
+
+    Returns:
+        str: Query sent to retrieval and the LLM by the /gen/* endpoints
+    """
+    return f"This query requires creativity and imagination to generate the following: {query}"
+
 
 def llm_rag_call(
     request: str,
     instructor_assistant: InstructorAssistant,
-    chroma_rag: ChromaRag,
+    registry: CollectionRegistry,
     response_model: Type[T],
     generator=False,
+    use_cache=True,
 ):
     """
     Handle RAG-based LLM queries with structured responses.
 
+    With a reranking model, top_k is an upper bound: several times more
+    candidates are retrieved, and only those the reranker finds relevant are
+    kept. Retrieved chunks are packed into the prompt context by the context
+    packer, and the context's token counts before and after packing are reported in
+    the X-Context-Tokens-Before and X-Context-Tokens-After response headers.
+    On llama.cpp, the prompt tokens of the generation and how many of them
+    were reused from the KV cache are reported in the X-Prompt-Tokens and
+    X-Prefill-Tokens-Saved headers, and the number of LLM calls it took,
+    including validation retries, in the X-Generation-Attempts header.
+
     Args:
         request: Flask request object containing query parameters
         instructor_assistant: LLM interface instance
-        chroma_rag: RAG system instance
+        registry: Collections to retrieve from, by the request's "collection"
         response_model: Pydantic model for response structure (imported from llm)
         generator: Whether this is a generation request (adds creativity prompt)
+        use_cache: Whether the response cache may answer this request
 
     Returns:
         Tuple containing:
@@ -69,7 +314,9 @@ def llm_rag_call(
         - HTTP status code
 
     Raises:
-        400: If no query is provided
+        400: If no query is provided, or the retrieval arguments are invalid
+            (see parse_retrieval_args)
+        404: If the requested collection does not exist
         500: For processing errors
     """
 
@@ -80,22 +327,304 @@ def llm_rag_call(
         return jsonify({"error": "No query provided"}), 400
 
     try:
-        top_k = int(data.get("top_k", 5))
+        args = parse_retrieval_args(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rerank, top_k = args["rerank"], args["top_k"]
 
+    try:
         if generator:
-            query = f"This query requires creativity and imagination to generate the following: {query}"
+            query = creative_query(query)
 
         # saving ids and metadata for later use cases
-        docs, ids, metadata = chroma_rag.retrieve(query, k=top_k)
+        with state_lock.read():
+            chroma_rag = registry.get(data.get("collection"))
+            try:
+                where = chroma_rag.metadata_filter(**args["filters"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            with metrics.time("retrieve"):
+                docs, ids, metadata = chroma_rag.retrieve(
+                    query,
+                    k=rerank.candidates(top_k) if rerank else top_k,
+                    mode=args["mode"],
+                    where=where,
+                )
+        if rerank:
+            with metrics.time("rerank"):
+                docs, ids, metadata = rerank.rerank(
+                    query, docs, ids, metadata, top_k, args["min_score"]
+                )
+        with metrics.time("pack"):
+            packed = context_packer.pack(
+                docs, ids, metadata, max_tokens=args["context_tokens"]
+            )
+        usage = {}
         response = instructor_assistant.ask(
-            query=query, context=docs, response_model=response_model
+            query=query,
+            context=packed["text"],
+            response_model=response_model,
+            context_ids=context_ids(chroma_rag, packed, docs, ids),
+            use_cache=use_cache,
+            embed_fn=lambda text: chroma_rag.embed_texts([text])[0],
+            usage=usage,
         )
-        return jsonify(response.model_dump())
+
+        headers = context_headers(packed)
+        headers["X-Generation-Attempts"] = str(usage.get("attempts", 0))
+        if usage.get("prompt_tokens") is not None:
+            headers["X-Prompt-Tokens"] = str(usage["prompt_tokens"])
+            headers["X-Prefill-Tokens-Saved"] = str(usage["prefill_tokens_saved"])
+        with metrics.time("serialize"):
+            body = jsonify(response.model_dump())
+        return body, 200, headers
+
+    except UnknownCollectionError as e:
+        return jsonify({"error": e.args[0]}), 404
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def context_ids(chroma_rag, packed, docs, ids):
+    """
+    Identify the chunks of a packed context for the response cache.
+
+    Each ID carries a hash of the chunk's text: a file edited in place keeps
+    the IDs of its chunks, and responses cached for their old text must not
+    be served for the new one.
+
+    Args:
+        chroma_rag: Collection the chunks were retrieved from
+        packed: Result of ContextPacker.pack
+        docs: Texts of the retrieved chunks
+        ids: IDs of the retrieved chunks
+
+    Returns:
+        List[str]: "<collection>/<chunk id>@<text hash>" per packed chunk
+    """
+
+    texts = dict(zip(ids, docs))
+    return [
+        f"{chroma_rag.collection_name}/{id}@"
+        + hashlib.sha256(texts[id].encode("utf-8")).hexdigest()[:16]
+        for id in packed["ids"]
+    ]
+
+
+def server_timing(timings: dict, total: float) -> str:
+    """
+    Format stage timings as a Server-Timing header value.
+
+    Args:
+        timings: Seconds spent per stage, see metrics.start_trace
+        total: Seconds spent on the whole request
+
+    Returns:
+        Header value with the duration of each stage in milliseconds
+    """
+
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def context_headers(packed: dict) -> dict:
+    """
+    Build the response headers reporting the effect of context packing.
+
+    Args:
+        packed: Result of ContextPacker.pack
+
+    Returns:
+        Headers with the context's token counts before and after packing
+    """
+    return {
+        "X-Context-Tokens-Before": str(packed["tokens_before"]),
+        "X-Context-Tokens-After": str(packed["tokens_after"]),
+    }
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Format a Server-Sent Event.
+
+    Args:
+        event: Event name
+        data: JSON serializable event payload
+
+    Returns:
+        Encoded event, ready to be written to the response stream
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def llm_rag_stream(
+    request: str,
+    instructor_assistant: InstructorAssistant,
+    registry: CollectionRegistry,
+    response_model: Type[T],
+    generator=False,
+    use_cache=True,
+):
+    """
+    Handle RAG-based LLM queries, streaming partial responses as Server-Sent Events.
+
+    Retrieval and re-ranking happen before the stream is opened, so request
+    errors are
+    still reported with a regular JSON response and status code. The stream
+    then emits:
+        partial: The fields generated so far, repeated while generating
+        done: The complete, validated response, not also sent as a partial
+        error: An error raised during generation
+
+    Args:
+        request: Flask request object containing query parameters
+        instructor_assistant: LLM interface instance
+        registry: Collections to retrieve from, by the request's "collection"
+        response_model: Pydantic model for response structure (imported from llm)
+        generator: Whether this is a generation request (adds creativity prompt)
+        use_cache: Whether the response cache may answer this request
+
+    Returns:
+        Streaming text/event-stream response, or a JSON error and status code
+
+    Raises:
+        400: If no query is provided, or the retrieval arguments are invalid
+            (see parse_retrieval_args)
+        404: If the requested collection does not exist
+        500: For retrieval errors
+    """
+
+    data = request.get_json()
+    query = data.get("query")
+
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    try:
+        args = parse_retrieval_args(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rerank, top_k = args["rerank"], args["top_k"]
+
+    try:
+        if generator:
+            query = creative_query(query)
+
+        with state_lock.read():
+            chroma_rag = registry.get(data.get("collection"))
+            try:
+                where = chroma_rag.metadata_filter(**args["filters"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            with metrics.time("retrieve"):
+                docs, ids, metadata = chroma_rag.retrieve(
+                    query,
+                    k=rerank.candidates(top_k) if rerank else top_k,
+                    mode=args["mode"],
+                    where=where,
+                )
+        if rerank:
+            with metrics.time("rerank"):
+                docs, ids, metadata = rerank.rerank(
+                    query, docs, ids, metadata, top_k, args["min_score"]
+                )
+        with metrics.time("pack"):
+            packed = context_packer.pack(
+                docs, ids, metadata, max_tokens=args["context_tokens"]
+            )
+
+    except UnknownCollectionError as e:
+        return jsonify({"error": e.args[0]}), 404
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def events():
+        try:
+            # The last object of the stream is the final response, so each
+            # object is only sent as a partial once the next one has arrived
+            previous = None
+            for response in instructor_assistant.ask_stream(
+                query=query,
+                context=packed["text"],
+                response_model=response_model,
+                context_ids=context_ids(chroma_rag, packed, docs, ids),
+                use_cache=use_cache,
+                embed_fn=lambda text: chroma_rag.embed_texts([text])[0],
+            ):
+                if previous is not None:
+                    yield sse_event("partial", previous.model_dump())
+                previous = response
+
+            if previous is not None:
+                yield sse_event("done", previous.model_dump())
+
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            **context_headers(packed),
+        },
+    )
+
+
+def watch_collection(name, source_directory, interval, debounce, snapshot=None):
+    """
+    Re-index the files of a collection in place whenever they are edited.
+
+    Replaces any earlier watcher of the collection. Changes are applied
+    through ChromaRag.update_files under the read lock, so queries keep being
+    served meanwhile. While an indexing job runs, a batch of changes fails and
+    is retried later. Re-indexed files are counted in the
+    dmi_files_reindexed_total metric.
+
+    Args:
+        name (str): Collection name, of a registered collection
+        source_directory (str): Vault directory of the collection
+        interval (float): Seconds between two polls of the vault
+        debounce (float): Quiet seconds before changes are re-indexed
+        snapshot (Optional[Dict[str, Tuple[int, int]]]): scan_vault result
+            the first poll is compared with (default: scan now)
+
+    Returns:
+        VaultWatcher: The started watcher
+    """
+
+    def update(paths):
+        if jobs.active() is not None:
+            raise RuntimeError("Indexing in progress, changes will be retried")
+
+        with state_lock.read():
+            result = registry.get(name).update_files(paths)
+        metrics.inc("dmi_files_reindexed_total", result["files"], collection=name)
+
+    unwatch_collection(name)
+    watcher = VaultWatcher(source_directory, update, interval, debounce)
+    watcher.start(snapshot)
+    watchers[name] = watcher
+    return watcher
+
+
+def unwatch_collection(name):
+    """
+    Stop watching a collection's vault, if it is watched.
+
+    Args:
+        name (str): Collection name
+    """
+
+    watcher = watchers.pop(name, None)
+    if watcher is not None:
+        watcher.stop()
+
+
 def check_initialization():
     """
     Check if required global objects are initialized.
@@ -104,7 +633,7 @@ def check_initialization():
         Tuple[Dict, int]: Error response and status code if not initialized,
                          None if initialization check passes
     """
-    if chroma_rag is None or instructor_assistant is None:
+    if not registry.names() or instructor_assistant is None:
         return (
             jsonify({"error": "Globals not initialized. Please call /setup first."}),
             400,
@@ -122,18 +651,61 @@ def setup_globals():
         model_chat: Name of chat model (default: "llama3.1:8b")
         db_path: Path to ChromaDB directory (default: "markdown_db")
         source_dir: Path to markdown documents directory
+        rebuild: Drop the collection and re-embed every file (default: False)
+        batch_size: Chunks per embedding request during indexing (default: 64)
+        embed_workers: Concurrent embedding requests during indexing (default: 4)
+        queue_depth: Batches buffered between indexing stages (default: 8)
+        embedding_cache_size: Embeddings kept in the on-disk cache (default: 50000)
+        retrieval_cache_size: Retrieval results kept in memory (default: 256)
+        retrieval_cache_ttl: Seconds a cached retrieval result lives (default: 600)
+        vector_store: "chroma", or "numpy" for a memory-mapped matrix with
+            exact search (default: "chroma")
+        vector_dtype: "float32" or "float16" vectors of the numpy store
+            (default: "float32")
+        vector_quantization: "int8" or "binary" quantized index of the numpy
+            store, re-ranked at full precision (default: None, exact search)
+        response_cache_size: LLM responses kept in memory, 0 disables (default: 512)
+        response_cache_threshold: Similarity for near-duplicate hits (default: 0.95)
+        context_tokens: Token budget of the packed prompt context (default: 3000)
+        context_dedup_threshold: Shingle overlap of duplicate chunks (default: 0.85)
+        llama_pool_size: Parallel llama.cpp instances of the custom model (default: 1)
+        constrained: Constrain LLM output to the response schema (default: False)
+        rerank_model: Path of a GGUF reranking model (cross-encoder) to re-rank
+            retrieved chunks with (default: None, no re-ranking)
+        rerank_min_score: Relevance cutoff of re-ranked chunks (default: 0.1)
+        rerank_overfetch: Candidates retrieved per requested chunk (default: 4)
+        rerank_batch_size: Chunks scored per batch, decoded together by the
+            reranking model (default: 16, at most 64)
+        watch: Keep watching source_dir and re-index edited files in place
+            (default: False, which also stops an earlier watcher)
+        watch_interval: Seconds between two polls of source_dir (default: 1.0)
+        watch_debounce: Quiet seconds before edits are re-indexed (default: 2.0)
+        background: Index in a background job and return at once (default: True)
+
+    Indexing runs as a background job, into a new generation of the
+    collection; until it completes, queries are served by the previous one,
+    which is then swapped out and deleted. Poll /jobs/<job_id> for progress.
 
     Returns:
         Tuple containing:
-        - Success message
-        - HTTP status code 200
+        - Job ID and status URL (or the finished job if background is False)
+        - HTTP status code 202 (200 if background is False, 400 if a flag is
+          not a boolean or a number is invalid, 409 if another indexing job
+          is still running)
     """
 
     global model_embed, model_chat, db_path, source_dir
-    global chroma_rag, instructor_assistant
 
     data = request.get_json()
 
+    try:
+        rebuild = parse_flag(data, "rebuild", False)
+        constrained = parse_flag(data, "constrained", False)
+        watch = parse_flag(data, "watch", False)
+        background = parse_flag(data, "background", True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     # Will remove defaults later, but for now, they are useful for testing
     model_embed = data.get("model_embed", "mxbai-embed-large")
     model_chat = data.get("model_chat", "llama3.1:8b")
@@ -142,19 +714,296 @@ def setup_globals():
         "source_dir",
         r"C:\Users\shive\OneDrive\Documents\DnD\Adventures\Stone-Heart Hollow",
     )
+    vector_store = data.get("vector_store", "chroma")
+    vector_dtype = data.get("vector_dtype", "float32")
+    vector_quantization = data.get("vector_quantization")
+    rerank_model = data.get("rerank_model")
+
+    try:
+        batch_size = parse_number(data, "batch_size", 64, minimum=1)
+        embed_workers = parse_number(data, "embed_workers", 4, minimum=1)
+        queue_depth = parse_number(data, "queue_depth", 8, minimum=1)
+        embedding_cache_size = parse_number(
+            data, "embedding_cache_size", 50000, minimum=0
+        )
+        retrieval_cache_size = parse_number(
+            data, "retrieval_cache_size", 256, minimum=0
+        )
+        retrieval_cache_ttl = parse_number(
+            data, "retrieval_cache_ttl", 600.0, float, minimum=0
+        )
+        response_cache_size = parse_number(data, "response_cache_size", 512, minimum=0)
+        response_cache_threshold = parse_number(
+            data, "response_cache_threshold", 0.95, float, 0, 1
+        )
+        context_tokens = parse_number(data, "context_tokens", 3000, minimum=1)
+        context_dedup_threshold = parse_number(
+            data, "context_dedup_threshold", 0.85, float, 0, 1
+        )
+        llama_pool_size = parse_number(data, "llama_pool_size", 1, minimum=1)
+        rerank_min_score = parse_number(data, "rerank_min_score", 0.1, float, 0, 1)
+        rerank_overfetch = parse_number(data, "rerank_overfetch", 4, minimum=1)
+        rerank_batch_size = parse_number(data, "rerank_batch_size", 16, minimum=1)
+        watch_interval = parse_number(data, "watch_interval", 1.0, float, minimum=0)
+        watch_debounce = parse_number(data, "watch_debounce", 2.0, float, minimum=0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     print(source_dir)
-    # Initialize objects with the new global variables
-    collection_name = os.path.basename(source_dir)
-    chroma_rag = ChromaRag(
-        source_directory=source_dir,
-        collection_name=collection_name,
-        db_path=db_path,
-        model_name=model_embed,
+
+    if vector_store not in ("chroma", "numpy"):
+        return jsonify({"error": f"Unknown vector store: {vector_store}"}), 400
+    if vector_dtype not in ("float32", "float16"):
+        return jsonify({"error": f"Unsupported vector dtype: {vector_dtype}"}), 400
+    if vector_quantization not in (None, "int8", "binary"):
+        return (
+            jsonify({"error": f"Unsupported quantization: {vector_quantization}"}),
+            400,
+        )
+    if vector_quantization and vector_store != "numpy":
+        return jsonify({"error": "Quantization requires the numpy vector store"}), 400
+    if rerank_model and not os.path.isfile(rerank_model):
+        return jsonify({"error": f"Reranking model not found: {rerank_model}"}), 400
+
+    progress = IngestionProgress()
+
+    # Everything needed to reopen the collection later, see CollectionRegistry
+    config = {
+        "source_directory": source_dir,
+        "collection_name": os.path.basename(source_dir),
+        "db_path": db_path,
+        "model_name": model_embed,
+        "batch_size": batch_size,
+        "embed_workers": embed_workers,
+        "queue_depth": queue_depth,
+        "embedding_cache_size": embedding_cache_size,
+        "retrieval_cache_size": retrieval_cache_size,
+        "retrieval_cache_ttl": retrieval_cache_ttl,
+        "vector_store": vector_store,
+        "vector_dtype": vector_dtype,
+        "vector_quantization": vector_quantization,
+    }
+
+    name = ChromaRag.normalize(config["collection_name"])
+
+    def build():
+        # Index into a new generation of the collection next to the one being
+        # served, which stays untouched until the swap. An incremental update
+        # starts from a copy of it, a rebuild from scratch
+        previous = registry.config(name)
+        copy_from = None
+
+        # Unless nothing would change: the served generation is kept as it
+        # is rather than copied, which costs as much as the whole vault
+        current = (
+            previous is not None
+            and not rebuild
+            and {key: value for key, value in previous.items() if key != "generation"}
+            == config
+            and ChromaRag.is_current(previous)
+        )
+        if current:
+            progress.start(0)
+            progress.finish()
+        elif previous is not None:
+            generation = previous.get("generation", 0)
+            config["generation"] = generation + 1
+            # Only a generation of the same store and database can be copied
+            backend = previous.get("vector_store", "chroma")
+            if previous["db_path"] == db_path and backend == vector_store:
+                copy_from = generation
+
+        # Initialize objects with the new global variables
+        new_chroma_rag = None
+        if not current:
+            new_chroma_rag = ChromaRag(
+                **config, incremental=not rebuild, copy_from=copy_from, progress=progress
+            )
+
+        # The embedder is picked per request, from the queried collection
+        response_cache = None
+        if response_cache_size:
+            response_cache = ResponseCache(
+                threshold=response_cache_threshold,
+                max_entries=response_cache_size,
+            )
+
+        new_instructor_assistant = InstructorAssistant(
+            model=model_chat,
+            response_cache=response_cache,
+            pool_size=llama_pool_size,
+            constrained=constrained,
+        )
+
+        # Count context tokens with the chat model's tokenizer when available
+        new_context_packer = ContextPacker(
+            max_tokens=context_tokens,
+            dedup_threshold=context_dedup_threshold,
+            count_tokens=new_instructor_assistant.count_tokens,
+        )
+
+        new_reranker = None
+        if rerank_model:
+            new_reranker = Reranker(
+                LlamaRanker(
+                    rerank_model,
+                    batch_size=rerank_batch_size,
+                    pool_size=llama_pool_size,
+                ).score,
+                min_score=rerank_min_score,
+                overfetch=rerank_overfetch,
+                batch_size=rerank_batch_size,
+            )
+        return (
+            new_chroma_rag,
+            new_instructor_assistant,
+            new_context_packer,
+            new_reranker,
+        )
+
+    def swap(
+        new_chroma_rag, new_instructor_assistant, new_context_packer, new_reranker
+    ):
+        global instructor_assistant, context_packer, reranker
+        # Only look the previous generation up, loading it here would keep
+        # every reader waiting behind the load. Without a new generation, the
+        # served one stays registered
+        old_config = old_chroma_rag = None
+        if new_chroma_rag is None:
+            registry.set_default(name)
+        else:
+            old_config = registry.config(name)
+            old_chroma_rag = registry.loaded(name)
+            registry.add(new_chroma_rag, config)
+        instructor_assistant = new_instructor_assistant
+        context_packer = new_context_packer
+        reranker = new_reranker
+        return old_config, old_chroma_rag
+
+    def index():
+        # The collection is not re-indexed in place while it is indexed, nor
+        # watched at all if indexing fails. The vault is scanned now, so edits
+        # made while indexing are picked up once the watcher starts
+        unwatch_collection(name)
+        snapshot = scan_vault(source_dir) if watch else None
+
+        # Queries are served by the previous generation until this swap, the
+        # write lock is only held to replace the references
+        new_objects = build()
+        with state_lock.write():
+            old_config, old_chroma_rag = swap(*new_objects)
+
+        # Queries only retrieve from a collection under the read lock, so
+        # none reads the previous generation's store anymore. Requests still
+        # generating may call its embed_texts through their embed_fn, which
+        # only uses the shared embedding cache and the embedding model
+        if old_config is not None and old_config.get("generation", 0) != config.get(
+            "generation", 0
+        ):
+            if old_chroma_rag is not None:
+                old_chroma_rag.drop()
+            else:
+                ChromaRag.drop_stored(old_config)
+
+        if watch:
+            watch_collection(name, source_dir, watch_interval, watch_debounce, snapshot)
+
+    try:
+        job = jobs.start(index, progress)
+    except JobConflictError as e:
+        return (
+            jsonify({"error": "Indexing already in progress", "job": e.job.to_dict()}),
+            409,
+        )
+
+    if not background:
+        job.wait()
+        if job.status == "failed":
+            return jsonify({"error": job.error, "job": job.to_dict()}), 500
+        return (
+            jsonify({"message": "Globals set successfully", "job": job.to_dict()}),
+            200,
+        )
+
+    return (
+        jsonify(
+            {
+                "message": "Indexing started",
+                "job_id": job.job_id,
+                "status_url": f"/jobs/{job.job_id}",
+            }
+        ),
+        202,
     )
 
-    instructor_assistant = InstructorAssistant(model=model_chat)
 
-    return jsonify({"message": "Globals set successfully"}), 200
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Report the status and progress of a background indexing job.
+
+    Returns:
+        JSON response with the job status, error, timestamps and progress
+        (files scanned, chunks embedded, chunks/sec and ETA), or 404
+    """
+
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+
+    return jsonify(job.to_dict())
+
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    g.timings = metrics.start_trace()
+
+
+@app.after_request
+def finish_request_timing(response):
+    """
+    Record the metrics of a finished request, and its timings if asked for.
+
+    Streamed responses are only counted, their duration is not known yet.
+
+    Args:
+        response: Flask response about to be sent
+
+    Returns:
+        The response, with a Server-Timing header if the request had an
+        X-Request-Timing header
+    """
+
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.inc("dmi_requests_total", endpoint=endpoint, status=response.status_code)
+
+    if response.is_streamed:
+        return response
+
+    elapsed = time.perf_counter() - g.request_start
+    metrics.observe("dmi_request_duration_seconds", elapsed, endpoint=endpoint)
+
+    if request.headers.get("X-Request-Timing"):
+        response.headers["Server-Timing"] = server_timing(g.timings, elapsed)
+    return response
+
+
+@app.teardown_request
+def stop_request_timing(error=None):
+    metrics.stop_trace()
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """
+    Expose request, stage latency, cache, token and retry metrics.
+
+    Available before /setup, so indexing can be monitored from the start.
+
+    Returns:
+        Metrics in the Prometheus text exposition format
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/", methods=["GET"])
@@ -162,6 +1011,184 @@ def index():
     return "RAG API is running."
 
 
+@app.route("/stats", methods=["GET"])
+def stats():
+    """
+    Report cache, context packing and model statistics.
+
+    Returns:
+        JSON response with hits, misses and size of the embedding and
+        retrieval caches of every loaded collection and of the response cache,
+        the prompt context tokens saved by packing, the candidates kept by
+        re-ranking, the outcomes of prefetches, the state of vault watchers,
+        the generations and
+        prefill tokens saved by KV cache reuse, and the load time and memory
+        use of loaded llama.cpp models
+    """
+
+    error = check_initialization()
+    if error:
+        return error
+
+    collections = registry.describe()["collections"]
+    response_cache = instructor_assistant.response_cache
+
+    return jsonify(
+        {
+            "collections": {
+                name: collection["cache"] for name, collection in collections.items()
+            },
+            "response": response_cache and response_cache.stats(),
+            "context": context_packer.stats(),
+            "prefetch": prefetcher.stats(),
+            "rerank": reranker and reranker.stats(),
+            "watchers": {name: watcher.stats() for name, watcher in watchers.items()},
+            "generation": instructor_assistant.stats(),
+            "models": model_manager.stats(),
+        }
+    )
+
+
+@app.route("/collections", methods=["GET"])
+def list_collections():
+    """
+    List the registered collections.
+
+    Returns:
+        JSON response with the default collection and, per collection, its
+        source directory, embedding model and whether it is loaded
+    """
+    return jsonify(registry.describe())
+
+
+@app.route("/collections/<name>/sections", methods=["GET"])
+def list_sections(name):
+    """
+    List the markdown header tree of a collection, e.g. to pick filters.
+
+    The tree is precomputed in the collection's manifest while indexing, so
+    listing it does not query ChromaDB.
+
+    Returns:
+        JSON response with, per file, its relative path, basename and nested
+        sections, or 404 if the collection does not exist
+    """
+
+    try:
+        with state_lock.read():
+            tree = registry.get(name).header_tree()
+    except UnknownCollectionError as e:
+        return jsonify({"error": e.args[0]}), 404
+
+    return jsonify({"collection": name, "files": tree})
+
+
+@app.route("/prefetch", methods=["POST"])
+def prefetch():
+    """
+    Speculatively embed and retrieve a partial query while the user types.
+
+    Warms the embedding and retrieval caches with the same key that /ask or
+    /gen/* will use for the query, so on submit only generation is left.
+    Prefetches never queue: one that cannot start right away, or comes too
+    soon after the client's previous one, is refused with 429. A newer
+    prefetch of the same client cancels the older ones between embedding and
+    search.
+
+    Expected JSON payload:
+        query: Partial question or prompt typed so far
+        client_id: Identifier of the typing client, e.g. one per input field
+            (optional, default: the client's address)
+        generator: Whether the query is for a /gen/* endpoint (optional,
+            default: false)
+        top_k, collection, mode, filters, rerank: As sent to /ask or /gen/*
+
+    Returns:
+        JSON response with the prefetch status: "warmed", "cancelled",
+        "throttled" or "busy" (429), or error message
+    """
+
+    error = check_initialization()
+    if error:
+        return error
+
+    data = request.get_json()
+    query = data.get("query")
+    client = str(data.get("client_id") or request.remote_addr)
+
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+
+    try:
+        args = parse_retrieval_args(data)
+        generator = parse_flag(data, "generator", False)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rerank, top_k = args["rerank"], args["top_k"]
+
+    generation, status = prefetcher.admit(client)
+    if generation is None:
+        metrics.inc("dmi_prefetch_total", result=status)
+        return jsonify({"status": status}), 429
+
+    try:
+        if generator:
+            query = creative_query(query)
+
+        with prefetcher.run(client, generation) as checkpoint:
+            with state_lock.read():
+                chroma_rag = registry.get(data.get("collection"))
+                where = chroma_rag.metadata_filter(**args["filters"])
+                with metrics.time("prefetch"):
+                    checkpoint()
+                    chroma_rag.embed_texts([query])
+                    checkpoint()
+                    # Candidates depend on the query, so only retrieval is warmed
+                    chroma_rag.retrieve(
+                        query,
+                        k=rerank.candidates(top_k) if rerank else top_k,
+                        mode=args["mode"],
+                        where=where,
+                    )
+
+    except PrefetchCancelled:
+        metrics.inc("dmi_prefetch_total", result="cancelled")
+        return jsonify({"status": "cancelled"})
+
+    except UnknownCollectionError as e:
+        metrics.inc("dmi_prefetch_total", result="failed")
+        return jsonify({"error": e.args[0]}), 404
+
+    except ValueError as e:
+        metrics.inc("dmi_prefetch_total", result="failed")
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        metrics.inc("dmi_prefetch_total", result="failed")
+        return jsonify({"error": str(e)}), 500
+
+    metrics.inc("dmi_prefetch_total", result="warmed")
+    return jsonify({"status": "warmed"})
+
+
+@app.route("/prefetch", methods=["DELETE"])
+def cancel_prefetch():
+    """
+    Cancel the running prefetches of a client.
+
+    Expected JSON payload:
+        client_id: Identifier of the client, see POST /prefetch (optional,
+            default: the client's address)
+
+    Returns:
+        JSON response with status "cancelled"
+    """
+
+    data = request.get_json(silent=True) or {}
+    prefetcher.cancel(str(data.get("client_id") or request.remote_addr))
+    return jsonify({"status": "cancelled"})
+
+
 @app.route("/ask", methods=["POST"])
 def ask_query():
     """
@@ -169,7 +1196,15 @@ def ask_query():
 
     Expected JSON payload:
         query: Question or prompt to process
-        top_k: Number of documents to retrieve (optional, default: 5)
+        top_k: Number of documents to retrieve, at most when re-ranking
+            (optional, default: 5)
+        collection: Collection to query (optional, default: last set up)
+        mode: "vector" or "hybrid" retrieval (optional, default: "vector")
+        filters: {"source": path prefix, "headers": header path} (optional)
+        rerank: Re-rank the retrieved chunks with the reranking model, if
+            one is set up (optional, default: true)
+        min_score: Relevance cutoff of re-ranking (optional, default: from /setup)
+        context_tokens: Token budget of the context (optional, default: from /setup)
 
     Returns:
         JSON response with answer and references or error message
@@ -179,7 +1214,208 @@ def ask_query():
     if error:
         return error
 
-    return llm_rag_call(request, instructor_assistant, chroma_rag, Answer)
+    return llm_rag_call(request, instructor_assistant, registry, Answer)
+
+
+@app.route("/ask/stream", methods=["POST"])
+def ask_query_stream():
+    """
+    Handle general questions using RAG and LLM, streaming the answer.
+
+    Expected JSON payload:
+        query: Question or prompt to process
+        top_k: Number of documents to retrieve, at most when re-ranking
+            (optional, default: 5)
+        collection: Collection to query (optional, default: last set up)
+        mode: "vector" or "hybrid" retrieval (optional, default: "vector")
+        filters: {"source": path prefix, "headers": header path} (optional)
+        rerank: Re-rank the retrieved chunks with the reranking model, if
+            one is set up (optional, default: true)
+        min_score: Relevance cutoff of re-ranking (optional, default: from /setup)
+        context_tokens: Token budget of the context (optional, default: from /setup)
+
+    Returns:
+        text/event-stream of partial answers, or JSON error message
+    """
+
+    error = check_initialization()
+    if error:
+        return error
+
+    return llm_rag_stream(request, instructor_assistant, registry, Answer)
+
+
+@app.route("/gen/<generator>/stream", methods=["POST"])
+def gen_stream(generator):
+    """
+    Generate details using RAG context, streaming the result.
+
+    Expected JSON payload:
+        query: Generation prompt
+        top_k: Number of documents to retrieve, at most when re-ranking
+            (optional, default: 5)
+        collection: Collection to query (optional, default: last set up)
+        mode: "vector" or "hybrid" retrieval (optional, default: "vector")
+        filters: {"source": path prefix, "headers": header path} (optional)
+        rerank: Re-rank the retrieved chunks with the reranking model, if
+            one is set up (optional, default: true)
+        min_score: Relevance cutoff of re-ranking (optional, default: from /setup)
+        context_tokens: Token budget of the context (optional, default: from /setup)
+
+    Returns:
+        text/event-stream of partial results, or JSON error message
+    """
+
+    error = check_initialization()
+    if error:
+        return error
+
+    response_model = GENERATOR_MODELS.get(generator)
+    if response_model is None:
+        return jsonify({"error": f"Unknown generator: {generator}"}), 404
+
+    return llm_rag_stream(
+        request,
+        instructor_assistant,
+        registry,
+        response_model,
+        generator=True,
+        use_cache=False,
+    )
+
+
+@app.route("/gen/batch", methods=["POST"])
+def gen_batch():
+    """
+    Run many generation jobs in one request, streaming each result as it completes.
+
+    All queries are embedded in a single request and retrieved together, then
+    the generations run concurrently, at most `concurrency` at a time. Each
+    job retrieves its own top_k documents (the batch retrieves the largest
+    top_k once and each job keeps its best top_k, or re-ranks the candidates
+    with a reranking model).
+
+    Expected JSON payload:
+        jobs: List of {"type": generator, "query": prompt, "top_k": 5}, where
+            type is one of npc, location, puzzle, item, rumour, name
+        concurrency: Generations running at the same time (optional, default: 4)
+        collection: Collection to query (optional, default: last set up)
+        mode: "vector" or "hybrid" retrieval (optional, default: "vector")
+        filters: {"source": path prefix, "headers": header path} (optional)
+        rerank: Re-rank the retrieved chunks with the reranking model, if
+            one is set up (optional, default: true)
+        context_tokens: Token budget of each context (optional, default: from /setup)
+
+    Returns:
+        text/event-stream of events, or JSON error message:
+            result: {"index", "type", "result"} of a completed job
+            error: {"index", "type", "error"} of a failed job
+            done: {"completed", "failed"} once every job has finished
+    """
+
+    error = check_initialization()
+    if error:
+        return error
+
+    data = request.get_json()
+    batch = data.get("jobs")
+
+    if not isinstance(batch, list) or not batch:
+        return jsonify({"error": "No jobs provided"}), 400
+    if len(batch) > MAX_BATCH_JOBS:
+        return jsonify({"error": f"At most {MAX_BATCH_JOBS} jobs per batch"}), 400
+
+    for i, job in enumerate(batch):
+        if not isinstance(job, dict) or not job.get("query"):
+            return jsonify({"error": f"Job {i} has no query"}), 400
+        if job.get("type") not in GENERATOR_MODELS:
+            return jsonify({"error": f"Job {i} has an unknown type"}), 400
+
+    try:
+        args = parse_retrieval_args(data)
+        concurrency = min(
+            parse_number(data, "concurrency", 4, minimum=1), MAX_BATCH_CONCURRENCY
+        )
+        top_ks = [
+            parse_number(job, "top_k", args["top_k"], minimum=1) for job in batch
+        ]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rerank = args["rerank"]
+
+    try:
+        queries = [creative_query(job["query"]) for job in batch]
+
+        with state_lock.read():
+            chroma_rag = registry.get(data.get("collection"))
+            try:
+                where = chroma_rag.metadata_filter(**args["filters"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            with metrics.time("retrieve"):
+                retrieved = chroma_rag.retrieve_many(
+                    queries,
+                    k=rerank.candidates(max(top_ks)) if rerank else max(top_ks),
+                    mode=args["mode"],
+                    where=where,
+                )
+
+    except UnknownCollectionError as e:
+        return jsonify({"error": e.args[0]}), 404
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # The assistant and packer of this request, even if /setup swaps them
+    assistant = instructor_assistant
+    packer = context_packer
+
+    def generate(index):
+        if rerank:
+            with metrics.time("rerank"):
+                docs, ids, metadata = rerank.rerank(
+                    queries[index], *retrieved[index], top_ks[index]
+                )
+        else:
+            docs, ids, metadata = (part[: top_ks[index]] for part in retrieved[index])
+        with metrics.time("pack"):
+            packed = packer.pack(
+                docs, ids, metadata, max_tokens=args["context_tokens"]
+            )
+        return assistant.ask(
+            query=queries[index],
+            context=packed["text"],
+            response_model=GENERATOR_MODELS[batch[index]["type"]],
+            context_ids=context_ids(chroma_rag, packed, docs, ids),
+            use_cache=False,
+        )
+
+    def events():
+        completed = failed = 0
+
+        for index, response, error in BatchRunner(concurrency).run(
+            generate, range(len(batch))
+        ):
+            job_type = batch[index]["type"]
+            if error is None:
+                completed += 1
+                yield sse_event(
+                    "result",
+                    {"index": index, "type": job_type, "result": response.model_dump()},
+                )
+            else:
+                failed += 1
+                yield sse_event(
+                    "error", {"index": index, "type": job_type, "error": str(error)}
+                )
+
+        yield sse_event("done", {"completed": completed, "failed": failed})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # Route handlers for content generation endpoints
@@ -187,11 +1423,20 @@ def ask_query():
 """
 All routes below use the same pattern:
 
-Generate details using RAG context.
+Generate details using RAG context. Generation skips the response cache so
+that repeated prompts still produce new ideas.
 
 Expected JSON payload:
     query: NPC generation prompt
-    top_k: Number of documents to retrieve (optional, default: 5)
+    top_k: Number of documents to retrieve, at most when re-ranking
+        (optional, default: 5)
+    collection: Collection to query (optional, default: last set up)
+    mode: "vector" or "hybrid" retrieval (optional, default: "vector")
+    filters: {"source": path prefix, "headers": header path} (optional)
+    rerank: Re-rank the retrieved chunks with the reranking model, if one is
+        set up (optional, default: true)
+    min_score: Relevance cutoff of re-ranking (optional, default: from /setup)
+    context_tokens: Token budget of the context (optional, default: from /setup)
 
 Returns:
     JSON response with NPC details or error message
@@ -205,7 +1450,12 @@ def gen_npc():
         return error
 
     return llm_rag_call(
-        request, instructor_assistant, chroma_rag, NPCList, generator=True
+        request,
+        instructor_assistant,
+        registry,
+        NPCList,
+        generator=True,
+        use_cache=False,
     )
 
 
@@ -216,7 +1466,12 @@ def gen_location():
         return error
 
     return llm_rag_call(
-        request, instructor_assistant, chroma_rag, LocationList, generator=True
+        request,
+        instructor_assistant,
+        registry,
+        LocationList,
+        generator=True,
+        use_cache=False,
     )
 
 
@@ -227,7 +1482,12 @@ def gen_puzzle():
         return error
 
     return llm_rag_call(
-        request, instructor_assistant, chroma_rag, PuzzleList, generator=True
+        request,
+        instructor_assistant,
+        registry,
+        PuzzleList,
+        generator=True,
+        use_cache=False,
     )
 
 
@@ -238,7 +1498,12 @@ def gen_item():
         return error
 
     return llm_rag_call(
-        request, instructor_assistant, chroma_rag, ItemList, generator=True
+        request,
+        instructor_assistant,
+        registry,
+        ItemList,
+        generator=True,
+        use_cache=False,
     )
 
 
@@ -249,7 +1514,12 @@ def gen_rumour():
         return error
 
     return llm_rag_call(
-        request, instructor_assistant, chroma_rag, RumourList, generator=True
+        request,
+        instructor_assistant,
+        registry,
+        RumourList,
+        generator=True,
+        use_cache=False,
     )
 
 
@@ -260,9 +1530,32 @@ def gen_name():
         return error
 
     return llm_rag_call(
-        request, instructor_assistant, chroma_rag, GeneratedNameList, generator=True
+        request,
+        instructor_assistant,
+        registry,
+        GeneratedNameList,
+        generator=True,
+        use_cache=False,
     )
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    parser = argparse.ArgumentParser(description="DMI backend server")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Serve concurrently with waitress instead of the Flask dev server",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument(
+        "--threads", type=int, default=8, help="Worker threads in production mode"
+    )
+    args = parser.parse_args()
+
+    if args.production:
+        from waitress import serve
+
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        app.run(debug=True, host=args.host, port=args.port)
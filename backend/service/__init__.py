@@ -0,0 +1,6 @@
+from service.locks import ReadWriteLock
+from service.jobs import IndexJob, JobConflictError, JobManager
+from service.registry import CollectionRegistry, UnknownCollectionError
+from service.batch import BatchRunner
+from service.prefetch import PrefetchCancelled, Prefetcher
+from service.watcher import VaultWatcher, scan_vault
\ No newline at end of file
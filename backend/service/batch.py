@@ -0,0 +1,74 @@
+"""
+Concurrency-Limited Batch Execution
+
+This module provides a BatchRunner class that runs many independent tasks,
+e.g. the LLM generations of a /gen/batch request, on a bounded pool of worker
+threads and hands back each result as soon as it completes, so that results
+can be streamed to the client instead of waiting for the whole batch.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class BatchRunner:
+    """
+    Runs a function over many items with at most `concurrency` in flight.
+
+    Attributes:
+        concurrency (int): Maximum number of tasks running at the same time
+    """
+
+    def __init__(self, concurrency=4):
+        """
+        Initialize the runner.
+
+        Args:
+            concurrency (int): Maximum number of concurrent tasks (default: 4)
+        """
+        self.concurrency = max(1, int(concurrency))
+
+    def run(self, fn, items):
+        """
+        Call fn on every item and yield the outcomes in completion order.
+
+        Items are only submitted while fewer than `concurrency` tasks are
+        running. If the consumer stops iterating, e.g. because the client
+        disconnected, items that have not started yet are never run.
+
+        Args:
+            fn (Callable[[Any], Any]): Function to call with each item
+            items (Iterable[Any]): Items to process
+
+        Yields:
+            Tuple[int, Any, Optional[Exception]]: Index of the item, result of
+            fn (None on failure) and the exception it raised (None on success)
+        """
+
+        pending = iter(enumerate(items))
+        running = {}
+
+        def submit(executor):
+            entry = next(pending, None)
+            if entry is None:
+                return False
+
+            index, item = entry
+            running[executor.submit(fn, item)] = index
+            return True
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for _ in range(self.concurrency):
+                if not submit(executor):
+                    break
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    index = running.pop(future)
+                    error = future.exception()
+                    yield index, None if error else future.result(), error
+                    submit(executor)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,198 @@
+"""
+Background Indexing Jobs
+
+This module provides IndexJob and JobManager classes so that building a RAG
+index can run in a background thread while the server keeps answering
+requests, and clients can poll the job for its progress. Only one job runs
+at a time.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class JobConflictError(Exception):
+    """
+    Raised when a job is started while another one is still active.
+
+    Attributes:
+        job (IndexJob): The active job
+    """
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.job_id} is still {job.status}")
+        self.job = job
+
+
+class IndexJob:
+    """
+    A background indexing job.
+
+    Attributes:
+        job_id (str): Unique identifier of the job
+        target: Function run by the job
+        progress (IngestionProgress): Progress counters updated by target
+        status (str): One of "pending", "running", "completed" or "failed"
+        error (Optional[str]): Error message if the job failed
+        created (float): time.time() when the job was created
+        finished (Optional[float]): time.time() when the job ended
+    """
+
+    def __init__(self, target, progress):
+        """
+        Create a job that has not started yet.
+
+        Args:
+            target (Callable[[], None]): Function to run in the background
+            progress (IngestionProgress): Progress counters updated by target
+        """
+
+        self.job_id = uuid.uuid4().hex
+        self.target = target
+        self.progress = progress
+        self.status = "pending"
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        self.status = "running"
+        try:
+            self.target()
+            self.status = "completed"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.finished = time.time()
+
+    def start(self):
+        """
+        Start running the job in a background thread.
+        """
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Block until the job has ended.
+
+        Args:
+            timeout (Optional[float]): Maximum number of seconds to wait
+
+        Returns:
+            bool: True if the job has ended
+        """
+
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def is_active(self):
+        """
+        Check whether the job is still pending or running.
+
+        Returns:
+            bool: True until the job has completed or failed
+        """
+        return self.status in ("pending", "running")
+
+    def to_dict(self):
+        """
+        Describe the job for the status endpoint.
+
+        Returns:
+            Dict containing the job ID, status, error, timestamps and progress
+        """
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "progress": self.progress.snapshot(),
+        }
+
+
+class JobManager:
+    """
+    Starts background jobs and keeps the most recent ones for status queries.
+
+    Attributes:
+        max_jobs (int): Number of finished jobs to remember
+    """
+
+    def __init__(self, max_jobs=20):
+        """
+        Initialize an empty manager.
+
+        Args:
+            max_jobs (int): Number of finished jobs to remember (default: 20)
+        """
+
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, target, progress):
+        """
+        Create and start a background job, unless another one is active.
+
+        Checking for an active job and registering the new one happen under
+        the same lock, so of two concurrent calls only one starts a job.
+
+        Args:
+            target (Callable[[], None]): Function to run in the background
+            progress (IngestionProgress): Progress counters updated by target
+
+        Returns:
+            IndexJob: The started job
+
+        Raises:
+            JobConflictError: If a job is still pending or running
+        """
+
+        job = IndexJob(target, progress)
+
+        with self._lock:
+            for other in self._jobs.values():
+                if other.is_active():
+                    raise JobConflictError(other)
+
+            self._jobs[job.job_id] = job
+            finished = [j for j in self._jobs.values() if not j.is_active()]
+            for old in finished[: max(0, len(self._jobs) - self.max_jobs)]:
+                del self._jobs[old.job_id]
+
+        job.start()
+        return job
+
+    def get(self, job_id):
+        """
+        Look up a job.
+
+        Args:
+            job_id (str): Identifier of the job
+
+        Returns:
+            Optional[IndexJob]: The job, None if unknown
+        """
+
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self):
+        """
+        Get the job that is currently pending or running, if any.
+
+        Returns:
+            Optional[IndexJob]: The active job, None if idle
+        """
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job.is_active():
+                    return job
+        return None
@@ -0,0 +1,74 @@
+"""
+Synchronization Primitives for Concurrent Request Serving
+
+This module provides a ReadWriteLock so that many requests can read the shared
+RAG state at once, while re-indexing or replacing it gets exclusive access.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Writer-preferring readers-writer lock.
+
+    Any number of readers may hold the lock at the same time. A writer waits
+    for in-flight readers to finish and blocks new readers while it is
+    waiting, so a writer cannot be starved by a steady stream of requests.
+    """
+
+    def __init__(self):
+        """
+        Initialize an unlocked lock.
+        """
+
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        """
+        Hold the lock for reading.
+
+        Yields:
+            None
+        """
+
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock exclusively.
+
+        Yields:
+            None
+        """
+
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
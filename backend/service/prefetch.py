@@ -0,0 +1,178 @@
+"""
+Rate-Limited, Cancellable Retrieval Prefetching
+
+This module provides a Prefetcher class that admits the speculative /prefetch
+requests sent by the frontend while the user is still typing. Prefetching
+embeds the partial query and retrieves its documents ahead of time, so the
+embedding and retrieval caches already hold the results when the query is
+submitted, and only generation is left to do.
+
+Prefetches are best effort and must never slow down real requests:
+1. At most `max_concurrent` prefetches run at a time, and a prefetch that
+   cannot start immediately is skipped rather than queued
+2. Each client may start at most one prefetch every `min_interval` seconds
+3. A newer prefetch of the same client cancels its older ones, which stop at
+   the next checkpoint (e.g. between embedding and search)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class PrefetchCancelled(Exception):
+    """
+    Raised at a checkpoint of a prefetch superseded by a newer one.
+    """
+
+
+class Prefetcher:
+    """
+    Admission control for speculative prefetches.
+
+    Attributes:
+        max_concurrent (int): Maximum number of prefetches running at once
+        min_interval (float): Minimum seconds between two prefetches of a client
+        max_clients (int): Number of clients whose state is remembered
+    """
+
+    def __init__(self, max_concurrent=1, min_interval=0.25, max_clients=1024):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            max_concurrent (int): Maximum number of concurrent prefetches
+                (default: 1)
+            min_interval (float): Minimum seconds between two prefetches of
+                the same client (default: 0.25)
+            max_clients (int): Number of clients to remember, least recently
+                seen clients are forgotten first (default: 1024)
+        """
+
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.min_interval = min_interval
+        self.max_clients = max_clients
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        # client -> (generation of its latest prefetch, time it was admitted)
+        self._clients = OrderedDict()
+        self._stats = {
+            "warmed": 0,
+            "cancelled": 0,
+            "throttled": 0,
+            "busy": 0,
+            "failed": 0,
+        }
+
+    def admit(self, client):
+        """
+        Decide whether a prefetch of a client may start now.
+
+        An admitted prefetch supersedes every earlier prefetch of the client,
+        even one that is still running.
+
+        Args:
+            client (str): Client identifier
+
+        Returns:
+            Tuple containing:
+            - Optional[int]: Generation of the admitted prefetch, None if it
+              was refused
+            - str: "admitted", or why it was refused: "throttled" if the
+              client prefetched too recently, "busy" if every slot is in use
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            generation, admitted_at = self._clients.get(client, (0, None))
+            if admitted_at is not None and now - admitted_at < self.min_interval:
+                self._stats["throttled"] += 1
+                return None, "throttled"
+
+            if not self._slots.acquire(blocking=False):
+                self._stats["busy"] += 1
+                return None, "busy"
+
+            generation += 1
+            self._clients[client] = (generation, now)
+            self._clients.move_to_end(client)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+        return generation, "admitted"
+
+    def cancel(self, client):
+        """
+        Cancel the running prefetches of a client, e.g. once it submits.
+
+        Args:
+            client (str): Client identifier
+        """
+
+        with self._lock:
+            generation, _ = self._clients.get(client, (0, None))
+            # Keep the rate limit window closed to any prefetch still in flight
+            self._clients[client] = (generation + 1, time.monotonic())
+            self._clients.move_to_end(client)
+
+    def checkpoint(self, client, generation):
+        """
+        Stop a prefetch if a newer one of the same client was admitted.
+
+        Args:
+            client (str): Client identifier
+            generation (int): Generation returned by admit
+
+        Raises:
+            PrefetchCancelled: If the prefetch was superseded or cancelled
+        """
+
+        with self._lock:
+            current, _ = self._clients.get(client, (generation, None))
+        if current != generation:
+            raise PrefetchCancelled()
+
+    @contextmanager
+    def run(self, client, generation):
+        """
+        Hold an admitted prefetch's slot while it runs, and count its outcome.
+
+        Args:
+            client (str): Client identifier
+            generation (int): Generation returned by admit
+
+        Yields:
+            Callable[[], None]: Checkpoint to call between the prefetch's
+            steps, see checkpoint
+        """
+
+        outcome = "warmed"
+        try:
+            yield lambda: self.checkpoint(client, generation)
+        except PrefetchCancelled:
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "failed"
+            raise
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._stats[outcome] += 1
+
+    def stats(self):
+        """
+        Get prefetch statistics.
+
+        Returns:
+            Dict containing:
+            - warmed, cancelled, failed: Prefetches by outcome
+            - throttled, busy: Refused prefetches by reason
+            - clients: Number of remembered clients
+        """
+
+        with self._lock:
+            return {**self._stats, "clients": len(self._clients)}
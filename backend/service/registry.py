@@ -0,0 +1,233 @@
+"""
+Registry of Named, Persistent RAG Collections
+
+This module provides a CollectionRegistry class so that several campaigns can
+be indexed side by side instead of replacing a single global ChromaRag:
+1. Every collection set up through /setup is registered under its name, with
+   the configuration needed to reopen it, persisted to a JSON file
+2. Collections are loaded lazily on first use, by opening the existing ChromaDB
+   collection without re-indexing it
+3. Only a bounded number of collections stay loaded; the least recently used
+   ones, and those idle for too long, are unloaded to cap memory
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from rag import ChromaRag
+
+
+class UnknownCollectionError(KeyError):
+    """
+    Raised when a request names a collection that was never set up.
+    """
+
+
+class CollectionRegistry:
+    """
+    Named ChromaRag collections with lazy loading and LRU unloading.
+
+    Attributes:
+        path (str): Path of the JSON file persisting collection configurations
+        max_loaded (int): Maximum number of collections kept loaded
+        idle_seconds (Optional[float]): Unload collections unused for this long
+        default (Optional[str]): Collection used when a request names none,
+            the most recently set up one
+    """
+
+    def __init__(self, path="collections.json", max_loaded=3, idle_seconds=1800):
+        """
+        Load the registered collection configurations, without opening any.
+
+        Args:
+            path (str): Path of the registry JSON file (default: "collections.json")
+            max_loaded (int): Maximum number of loaded collections (default: 3)
+            idle_seconds (Optional[float]): Unload collections unused for this
+                many seconds, None or 0 to only unload by LRU (default: 1800)
+        """
+
+        self.path = path
+        self.max_loaded = max(1, int(max_loaded))
+        self.idle_seconds = idle_seconds or None
+        self.default = None
+
+        self._configs = {}
+        self._loaded = OrderedDict()
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._configs = data.get("collections", {})
+                self.default = data.get("default")
+            except (OSError, ValueError):
+                pass
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"default": self.default, "collections": self._configs}, f)
+        os.replace(tmp_path, self.path)
+
+    def _evict(self):
+        # Unload idle collections, then the least recently used beyond the cap
+        now = time.monotonic()
+        if self.idle_seconds:
+            for name in list(self._loaded):
+                if now - self._last_used[name] > self.idle_seconds:
+                    self._unload(name)
+
+        while len(self._loaded) > self.max_loaded:
+            self._unload(next(iter(self._loaded)))
+
+    def _unload(self, name):
+        # In-flight requests keep their own reference, so only drop ours
+        self._loaded.pop(name)
+        self._last_used.pop(name, None)
+
+    def add(self, chroma_rag, config):
+        """
+        Register a freshly indexed collection and make it the default.
+
+        Args:
+            chroma_rag (ChromaRag): Indexed collection
+            config (Dict[str, Any]): ChromaRag keyword arguments needed to
+                reopen the collection (source_directory, db_path, model_name,
+                cache settings, ...)
+        """
+
+        name = chroma_rag.collection_name
+
+        with self._lock:
+            self._configs[name] = config
+            self._loaded[name] = chroma_rag
+            self._loaded.move_to_end(name)
+            self._last_used[name] = time.monotonic()
+            self.default = name
+
+            self._evict()
+            self._save()
+
+    def set_default(self, name):
+        """
+        Make a registered collection the default, e.g. when /setup finds it
+        already up to date.
+
+        Args:
+            name (str): Collection name
+
+        Raises:
+            UnknownCollectionError: If no collection with that name is registered
+        """
+
+        name = ChromaRag.normalize(name)
+
+        with self._lock:
+            if name not in self._configs:
+                raise UnknownCollectionError(f"Unknown collection: {name}")
+            self.default = name
+            self._save()
+
+    def get(self, name=None):
+        """
+        Get a collection, loading it if needed.
+
+        Args:
+            name (Optional[str]): Collection name, normalized like ChromaRag
+                collection names (default: the default collection)
+
+        Returns:
+            ChromaRag: The loaded collection
+
+        Raises:
+            UnknownCollectionError: If no collection with that name is registered
+        """
+
+        name = ChromaRag.normalize(name) if name else self.default
+
+        with self._lock:
+            if name not in self._configs:
+                raise UnknownCollectionError(f"Unknown collection: {name}")
+
+            rag = self._loaded.get(name)
+            if rag is None:
+                rag = ChromaRag(**self._configs[name], index=False)
+                self._loaded[name] = rag
+
+            self._loaded.move_to_end(name)
+            self._last_used[name] = time.monotonic()
+            self._evict()
+
+            return rag
+
+    def loaded(self, name):
+        """
+        Get a collection only if it is loaded, without loading it.
+
+        Args:
+            name (str): Collection name
+
+        Returns:
+            Optional[ChromaRag]: The loaded collection, None if it is not
+            loaded or not registered
+        """
+
+        with self._lock:
+            return self._loaded.get(ChromaRag.normalize(name))
+
+    def config(self, name):
+        """
+        Get the configuration a collection was registered with.
+
+        Args:
+            name (str): Collection name
+
+        Returns:
+            Optional[Dict[str, Any]]: ChromaRag keyword arguments, None if unknown
+        """
+
+        with self._lock:
+            return self._configs.get(ChromaRag.normalize(name))
+
+    def names(self):
+        """
+        Get the names of all registered collections.
+
+        Returns:
+            List[str]: Registered collection names
+        """
+
+        with self._lock:
+            return list(self._configs)
+
+    def describe(self):
+        """
+        Describe every registered collection.
+
+        Returns:
+            Dict containing:
+            - default: Name of the default collection
+            - collections: Per collection source directory, embedding model,
+              whether it is loaded and, if so, its cache statistics
+        """
+
+        with self._lock:
+            return {
+                "default": self.default,
+                "collections": {
+                    name: {
+                        "source_directory": config["source_directory"],
+                        "model_name": config["model_name"],
+                        "loaded": name in self._loaded,
+                        "cache": self._loaded[name].cache_stats()
+                        if name in self._loaded
+                        else None,
+                    }
+                    for name, config in self._configs.items()
+                },
+            }
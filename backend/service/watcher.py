@@ -0,0 +1,197 @@
+"""
+Live Vault Updates
+
+This module provides a VaultWatcher class that watches the markdown files of a
+collection's source directory while the server runs, so notes edited during a
+session are picked up without calling /setup again.
+
+The watcher polls the modification time and size of every markdown file,
+which needs no extra dependency and also works on synced folders (OneDrive,
+Dropbox) and network drives where filesystem notifications are unreliable.
+Changes are debounced: a burst of saves, or an editor writing a file several
+times, is handed over as one batch of paths once the vault has been quiet for
+`debounce` seconds. The callback, typically ChromaRag.update_files, then
+re-indexes only those files.
+"""
+
+import os
+import threading
+import time
+
+from rag.vector import iter_markdown_files
+
+
+def scan_vault(directory):
+    """
+    Stat every markdown file of a directory.
+
+    Args:
+        directory (str): Directory to scan, recursively
+
+    Returns:
+        Dict[str, Tuple[int, int]]: Modification time (ns) and size per path
+    """
+
+    files = {}
+    for path in iter_markdown_files(directory):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Deleted between listing and stat
+            continue
+        files[path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class VaultWatcher:
+    """
+    Polls a directory for added, changed and deleted markdown files.
+
+    Attributes:
+        source_directory (str): Directory being watched
+        on_change: Function called with the sorted paths of a batch of
+            changes; if it raises, the batch is retried after the next debounce
+        interval (float): Seconds between two polls
+        debounce (float): Quiet seconds before a batch of changes is handed over
+        updates (int): Batches handed over successfully
+        files_updated (int): Paths handed over successfully
+        last_update (Optional[float]): time.time() of the last successful batch
+        last_error (Optional[str]): Error of the last failed batch, None once a
+            batch succeeds again
+    """
+
+    def __init__(self, source_directory, on_change, interval=1.0, debounce=2.0):
+        """
+        Initialize the watcher, call start to begin watching.
+
+        Args:
+            source_directory (str): Directory to watch, recursively
+            on_change (Callable[[List[str]], Any]): Called with each batch of
+                changed paths, from the watcher thread
+            interval (float): Seconds between two polls (default: 1.0)
+            debounce (float): Quiet seconds before changes are handed over
+                (default: 2.0)
+        """
+
+        self.source_directory = source_directory
+        self.on_change = on_change
+        self.interval = max(0.05, float(interval))
+        self.debounce = max(0.0, float(debounce))
+        self.updates = 0
+        self.files_updated = 0
+        self.last_update = None
+        self.last_error = None
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._thread = None
+
+    def scan(self):
+        """
+        Stat every markdown file of the directory.
+
+        Returns:
+            Dict[str, Tuple[int, int]]: Modification time (ns) and size per path
+        """
+        return scan_vault(self.source_directory)
+
+    def start(self, snapshot=None):
+        """
+        Start polling in a background thread.
+
+        Changes made after the snapshot are picked up, so a snapshot taken
+        before indexing also covers files edited while the collection was
+        being indexed.
+
+        Args:
+            snapshot (Optional[Dict[str, Tuple[int, int]]]): Result of scan
+                to compare the first poll with (default: scan now)
+        """
+
+        if snapshot is None:
+            snapshot = self.scan()
+        self._thread = threading.Thread(target=self._run, args=(snapshot,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop polling. Pending changes that were not handed over are dropped.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for the thread to exit
+        """
+
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self, snapshot):
+        last_change = None
+
+        while not self._stop.wait(self.interval):
+            try:
+                current = self.scan()
+            except OSError as e:
+                # The directory itself is unavailable, e.g. a disconnected drive
+                self.last_error = str(e)
+                continue
+
+            changed = {
+                path
+                for path in set(snapshot) | set(current)
+                if snapshot.get(path) != current.get(path)
+            }
+            snapshot = current
+
+            with self._lock:
+                if changed:
+                    self._pending |= changed
+                    last_change = time.monotonic()
+
+                if not self._pending or time.monotonic() - last_change < self.debounce:
+                    continue
+
+                batch = sorted(self._pending)
+                self._pending.clear()
+
+            try:
+                self.on_change(batch)
+            except Exception as e:
+                self.last_error = str(e)
+                with self._lock:
+                    self._pending.update(batch)
+                last_change = time.monotonic()
+                continue
+
+            self.updates += 1
+            self.files_updated += len(batch)
+            self.last_update = time.time()
+            self.last_error = None
+
+    def stats(self):
+        """
+        Get the state of the watcher.
+
+        Returns:
+            Dict containing:
+            - source_directory: Directory being watched
+            - running: Whether the watcher thread is alive
+            - pending: Changed paths waiting for the debounce
+            - updates, files_updated: Batches and paths handed over
+            - last_update: time.time() of the last successful batch
+            - last_error: Error of the last failed batch
+        """
+
+        with self._lock:
+            pending = len(self._pending)
+
+        return {
+            "source_directory": self.source_directory,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "pending": pending,
+            "updates": self.updates,
+            "files_updated": self.files_updated,
+            "last_update": self.last_update,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1 @@
+from telemetry.metrics import Metrics, metrics
\ No newline at end of file
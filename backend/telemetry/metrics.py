@@ -0,0 +1,301 @@
+"""
+Latency and Throughput Metrics
+
+This module provides a Metrics class that records counters and latency
+histograms in process, and renders them in the Prometheus text exposition
+format for the /metrics endpoint.
+
+Code paths are instrumented with Metrics.time, which times a named stage
+(query embedding, ChromaDB query, prompt build, LLM generation, validation,
+serialization, ingestion batches, ...). Each stage is recorded in the
+dmi_stage_duration_seconds histogram and, while a request is being traced
+(see Metrics.start_trace), in the per-request timings of the calling thread, so a
+single request can report where it spent its time.
+"""
+
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Exposed metrics, by name: Prometheus type and help text
+METRICS = {
+    "dmi_requests_total": ("counter", "HTTP requests by endpoint and status code"),
+    "dmi_request_duration_seconds": (
+        "histogram",
+        "Time to respond to an HTTP request, by endpoint",
+    ),
+    "dmi_stage_duration_seconds": (
+        "histogram",
+        "Time spent in each stage of query handling and indexing",
+    ),
+    "dmi_cache_requests_total": ("counter", "Cache lookups by cache and result"),
+    "dmi_llm_attempts_total": ("counter", "LLM calls, including retries"),
+    "dmi_llm_retries_total": ("counter", "LLM calls retrying a failed validation"),
+    "dmi_llm_tokens_total": (
+        "counter",
+        "LLM tokens by direction, in (prompt) or out (generated)",
+    ),
+    "dmi_chunks_indexed_total": ("counter", "Chunks embedded and stored"),
+    "dmi_files_reindexed_total": (
+        "counter",
+        "Files re-indexed in place after vault edits, by collection",
+    ),
+    "dmi_prefetch_total": (
+        "counter",
+        "Prefetch requests by result: warmed, cancelled, throttled, busy or failed",
+    ),
+}
+
+
+def format_labels(labels, extra=None):
+    """
+    Format a label set for the Prometheus text format.
+
+    Args:
+        labels (Tuple[Tuple[str, str], ...]): Sorted (name, value) pairs
+        extra (Optional[Tuple[str, str]]): One more pair, appended last
+
+    Returns:
+        str: Labels in braces, or an empty string without labels
+    """
+
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+
+    def escape(value):
+        return (
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    """
+    Format a sample value for the Prometheus text format.
+
+    Args:
+        value (float): Sample value
+
+    Returns:
+        str: Integers without a decimal point, "+Inf" for infinity
+    """
+
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms with Prometheus text rendering.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Upper bounds of the histogram buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize empty metrics.
+
+        Args:
+            buckets (Tuple[float, ...]): Histogram bucket upper bounds in
+                seconds (default: DEFAULT_BUCKETS)
+        """
+
+        self.buckets = tuple(sorted(buckets))
+
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._local = threading.local()
+
+    @staticmethod
+    def key(name, labels):
+        """
+        Build the key of a metric's label set.
+
+        Args:
+            name (str): Metric name
+            labels (Dict[str, Any]): Label values
+
+        Returns:
+            Tuple[str, Tuple[Tuple[str, str], ...]]: Name and sorted labels
+        """
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increase a counter.
+
+        Args:
+            name (str): Counter name, one of METRICS
+            value (float): Amount to add (default: 1)
+            **labels: Label values, e.g. cache="retrieval"
+        """
+
+        if not value:
+            return
+
+        with self._lock:
+            self._counters[self.key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        """
+        Record an observation in a histogram.
+
+        Args:
+            name (str): Histogram name, one of METRICS
+            value (float): Observed value, in seconds for durations
+            **labels: Label values, e.g. stage="embed"
+        """
+
+        key = self.key(name, labels)
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def time(self, stage):
+        """
+        Time a stage, also when it raises.
+
+        Args:
+            stage (str): Stage name, e.g. "embed" or "generate"
+
+        Yields:
+            None
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("dmi_stage_duration_seconds", elapsed, stage=stage)
+
+            timings = getattr(self._local, "timings", None)
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+
+    def start_trace(self):
+        """
+        Start collecting the stage timings of the current thread.
+
+        A stage that runs several times, such as generation with retries, is
+        reported with its total time.
+
+        Returns:
+            Dict[str, float]: Seconds spent per stage, filled until
+            stop_trace is called
+        """
+
+        timings = {}
+        self._local.timings = timings
+        return timings
+
+    def stop_trace(self):
+        """
+        Stop collecting the stage timings of the current thread.
+        """
+        self._local.timings = None
+
+    @contextmanager
+    def trace(self):
+        """
+        Collect the stage timings of the current thread for a block of code.
+
+        Yields:
+            Dict[str, float]: Seconds spent per stage, see start_trace
+        """
+
+        timings = self.start_trace()
+        try:
+            yield timings
+        finally:
+            self.stop_trace()
+
+    def clear(self):
+        """
+        Reset every counter and histogram.
+        """
+
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics text, as served by /metrics
+        """
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: {
+                    "buckets": list(h["buckets"]),
+                    "sum": h["sum"],
+                    "count": h["count"],
+                }
+                for key, h in self._histograms.items()
+            }
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(
+                            f"{name}{format_labels(labels)} {format_value(value)}"
+                        )
+                continue
+
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    cumulative += count
+                    le = format_labels(labels, ("le", format_value(bound)))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+
+                le = format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{name}_bucket{le} {histogram['count']}")
+                lines.append(
+                    f"{name}_sum{format_labels(labels)} "
+                    f"{format_value(histogram['sum'])}"
+                )
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {histogram['count']}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every component of the process
+metrics = Metrics()
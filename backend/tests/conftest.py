@@ -0,0 +1,137 @@
+"""
+Shared fixtures of the backend tests.
+
+Collections are indexed with the offline hashing embedder of the benchmarks,
+and the LLM is replaced by a fake chat completion function, so the tests run
+without Ollama or a GGUF model.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stubs import HashingEmbedder  # noqa: E402
+from rag import ChromaRag  # noqa: E402
+
+VAULT = {
+    "npcs/innkeeper.md": "# Innkeeper\n\n## Appearance\n\nBorin the innkeeper has a red beard and a wooden leg.\n",
+    "places/harbour.md": "# Harbour\n\n## Docks\n\nThe docks of Saltmere smell of tar and fish.\n",
+}
+
+
+def write_vault(directory, files):
+    """
+    Write markdown files into a vault directory.
+
+    Args:
+        directory (str): Vault directory
+        files (Dict[str, str]): Content per path relative to the vault
+    """
+
+    for name, text in files.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+@pytest.fixture
+def vault(tmp_path):
+    """Directory with a small markdown vault."""
+    directory = str(tmp_path / "vault")
+    write_vault(directory, VAULT)
+    return directory
+
+
+@pytest.fixture
+def make_rag(tmp_path):
+    """Factory of collections indexed with the hashing embedder."""
+
+    def make(source_directory, collection_name="campaign", **kwargs):
+        kwargs.setdefault("db_path", str(tmp_path / "db"))
+        kwargs.setdefault("embedding_cache_size", 0)
+        kwargs.setdefault("embed_fn", HashingEmbedder())
+        return ChromaRag(
+            source_directory=source_directory,
+            collection_name=collection_name,
+            model_name="stub",
+            **kwargs,
+        )
+
+    return make
+
+
+class FakeCompletion:
+    """
+    Stand-in for instructor's chat completion function.
+
+    Attributes:
+        calls (int): Number of completions requested
+    """
+
+    def __init__(self, assistant):
+        self.assistant = assistant
+        self.calls = 0
+
+    def __call__(self, messages, response_model, max_retries):
+        self.assistant.count_attempt()
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        return response_model(
+            answer=f"answer {self.calls}",
+            references=["wooden leg"] if "wooden leg" in prompt else [],
+        )
+
+
+@pytest.fixture
+def ollama_embed(monkeypatch):
+    """Hashing embedder standing in for ollama.embed, e.g. for /setup."""
+
+    import ollama
+
+    embedder = HashingEmbedder()
+    monkeypatch.setattr(ollama, "embed", embedder)
+    return embedder
+
+
+@pytest.fixture
+def assistant():
+    """Ollama assistant with a response cache and a fake LLM."""
+
+    from llm import InstructorAssistant, ResponseCache
+
+    assistant = InstructorAssistant(
+        "mistral", response_cache=ResponseCache(), constrained=False
+    )
+    assistant.create = FakeCompletion(assistant)
+    return assistant
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, vault, make_rag, assistant):
+    """Flask test client of the server, set up with the vault's collection."""
+
+    import server
+    from rag import ContextPacker
+    from service import CollectionRegistry
+
+    registry = CollectionRegistry(path=str(tmp_path / "collections.json"))
+    rag = make_rag(vault)
+    registry.add(
+        rag,
+        {
+            "source_directory": vault,
+            "db_path": rag.db_path,
+            "model_name": rag.model_name,
+        },
+    )
+
+    monkeypatch.setattr(server, "registry", registry)
+    monkeypatch.setattr(server, "instructor_assistant", assistant)
+    monkeypatch.setattr(server, "context_packer", ContextPacker())
+    monkeypatch.setattr(server, "reranker", None)
+
+    return server.app.test_client()
@@ -0,0 +1,86 @@
+"""
+Tests of the reproducible benchmark suite.
+"""
+
+import argparse
+import json
+
+from benchmarks import suite
+from benchmarks.vault import write_vault
+
+
+def options(**overrides):
+    # The suite's command line defaults, scaled down to a few files
+    args = {
+        "files": 3,
+        "sections": 2,
+        "paragraphs": 1,
+        "depth": 3,
+        "words": 12,
+        "seed": 0,
+        "queries": 4,
+        "top_k": 2,
+        "batch_size": 4,
+        "workers": 2,
+        "dim": 32,
+        "vector_store": "chroma",
+        "vector_dtype": "float32",
+        "embed_latency": 0.0,
+        "llm_latency": 0.0,
+    }
+    return argparse.Namespace(**{**args, **overrides})
+
+
+def test_the_same_seed_writes_the_same_vault(tmp_path):
+    first = write_vault(str(tmp_path / "first"), files=2, depth=4, seed=7)
+    second = write_vault(str(tmp_path / "second"), files=2, depth=4, seed=7)
+
+    for name in ("chapter-0.md", "chapter-1.md"):
+        text = (tmp_path / "first" / name).read_text(encoding="utf-8")
+        assert text == (tmp_path / "second" / name).read_text(encoding="utf-8")
+        assert "#### Part" in text
+
+    assert suite.make_queries(5, seed=1) == suite.make_queries(5, seed=1)
+    assert len(set(suite.make_queries(5, seed=1))) == 5
+
+
+def test_latency_summary_and_server_timing():
+    summary = suite.latency_summary([0.001, 0.002, 0.003, 0.004])
+    assert summary["requests"] == 4
+    assert summary["p50_ms"] == 2.5
+    assert summary["mean_ms"] == 2.5
+    assert summary["requests_per_sec"] == 400.0
+    assert suite.latency_summary([])["requests_per_sec"] == 0.0
+
+    timing = suite.parse_server_timing("embed;dur=1.5, retrieve;dur=2, total")
+    assert timing == {"embed": 1.5, "retrieve": 2.0}
+
+
+def test_run_reports_every_phase(monkeypatch):
+    import server
+
+    # bench_ask serves the indexed collection through the module's globals
+    for name in ("registry", "instructor_assistant", "context_packer"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    monkeypatch.setattr(server, "reranker", None)
+
+    output = suite.run(options(vector_store="numpy"))
+    results = output["results"]
+
+    # 3 files of 2 sections each, one chunk per section
+    assert results["ingest"]["chunks"] == 6
+    assert results["ingest"]["peak_rss_bytes"] > 0
+    assert set(results["retrieve"]) == {"vector", "hybrid"}
+    assert results["retrieve"]["hybrid"]["requests"] == 4
+    assert results["ask"]["requests"] == 4
+    assert results["ask"]["errors"] == 0
+    assert "total" in results["ask"]["stages_p50_ms"]
+
+    # The output is JSON, and a run compares with itself without change
+    output = json.loads(json.dumps(output))
+    comparison = suite.compare(output, output)
+    assert comparison["ingest.chunks"] == {
+        "baseline": 6,
+        "current": 6,
+        "change_pct": 0.0,
+    }
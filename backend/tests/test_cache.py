@@ -0,0 +1,78 @@
+"""
+Tests of the embedding and retrieval caches.
+"""
+
+import os
+
+import rag.cache
+from benchmarks.stubs import HashingEmbedder
+from conftest import write_vault
+from rag.cache import EmbeddingCache, TTLCache
+
+
+def test_embeddings_are_kept_per_model_across_restarts(tmp_path):
+    path = str(tmp_path / "embedding_cache.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("mxbai-embed-large", ["red beard"], [[0.5, -1.0]])
+    cache.close()
+
+    cache = EmbeddingCache(path)
+    assert cache.get_many("mxbai-embed-large", ["red beard", "wooden leg"]) == [
+        [0.5, -1.0],
+        None,
+    ]
+    assert cache.get_many("nomic-embed-text", ["red beard"]) == [None]
+    assert cache.stats()["hits"] == 1
+
+
+def test_least_recently_used_embeddings_are_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embedding_cache.sqlite"), max_entries=2)
+    cache.put_many("stub", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("stub", ["a"])
+    cache.put_many("stub", ["c"], [[3.0]])
+
+    assert cache.get_many("stub", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+
+
+def test_collections_share_cached_chunk_embeddings(tmp_path, vault, make_rag):
+    make_rag(vault, embedding_cache_size=100)
+
+    # The same chunks in another collection of the database
+    embedder = HashingEmbedder()
+    rag = make_rag(vault, "copy", embed_fn=embedder, embedding_cache_size=100)
+
+    assert embedder.calls == 0
+    assert rag.collection.count() == 2
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rag.cache.time, "monotonic", lambda: now[0])
+
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_retrieval_is_cached_until_the_collection_changes(vault, make_rag):
+    embedder = HashingEmbedder()
+    rag = make_rag(vault, embed_fn=embedder, retrieval_cache_size=16)
+
+    docs, _, _ = rag.retrieve("pet owl", k=1)
+    calls = embedder.calls
+    assert rag.retrieve("pet owl", k=1)[0] == docs
+    assert embedder.calls == calls
+
+    path = os.path.join(vault, "npcs", "innkeeper.md")
+    write_vault(vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin keeps a pet owl.\n"})
+    rag.update_files([path])
+
+    docs, _, _ = rag.retrieve("pet owl", k=1)
+    assert "owl" in docs[0]
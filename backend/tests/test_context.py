@@ -0,0 +1,75 @@
+"""
+Tests of the context packer.
+"""
+
+from rag.context import ContextPacker
+
+WORDS = "borin keeps the inn by the harbour and sells ale to sailors".split()
+
+
+def chunk(source, number, words=6, offset=0):
+    """Make a retrieved chunk with distinct content for each position."""
+    content = " ".join(
+        f"{WORDS[(i + offset) % len(WORDS)]}{number}{source}" for i in range(words)
+    )
+    text = f"Source: {source}.md\n\nContent:\n{content}"
+    return text, f"{source}-{number}", {"source_basename": f"{source}.md"}
+
+
+def pack(packer, chunks, **kwargs):
+    docs, ids, metadatas = (list(part) for part in zip(*chunks))
+    return packer.pack(docs, ids, metadatas, **kwargs)
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_chunks_merge_when_their_neighbour_arrives_later():
+    packer = ContextPacker()
+    chunks = [chunk("inn", 1), chunk("harbour", 4), chunk("inn", 3), chunk("inn", 2)]
+
+    blocks = packer.merge_adjacent(
+        [
+            {"id": chunk_id, "metadata": metadata}
+            for _, chunk_id, metadata in chunks
+        ]
+    )
+
+    # inn-1 and inn-3 are only adjacent through inn-2, retrieved last
+    assert [[c["id"] for c in block] for block in blocks] == [
+        ["inn-1", "inn-2", "inn-3"],
+        ["harbour-4"],
+    ]
+
+
+def test_merged_block_keeps_the_rank_of_its_best_chunk():
+    packer = ContextPacker()
+    chunks = [chunk("harbour", 7), chunk("inn", 5), chunk("harbour", 2), chunk("inn", 4)]
+
+    packed = pack(packer, chunks)
+
+    assert packed["ids"] == ["harbour-7", "inn-4", "inn-5", "harbour-2"]
+
+
+def test_blocks_over_budget_are_skipped_for_smaller_ones():
+    packer = ContextPacker(count_tokens=count_words)
+    chunks = [chunk("inn", 1), chunk("harbour", 1, words=40), chunk("ship", 1)]
+
+    packed = pack(packer, chunks, max_tokens=30)
+
+    assert packed["ids"] == ["inn-1", "ship-1"]
+    assert packed["dropped"] == ["harbour-1"]
+    assert packed["tokens_after"] <= 30
+
+
+def test_most_relevant_block_is_truncated_to_the_budget():
+    packer = ContextPacker(count_tokens=count_words)
+    chunks = [chunk("inn", 1, words=40), chunk("ship", 1)]
+
+    packed = pack(packer, chunks, max_tokens=10)
+
+    assert packed["ids"] == ["inn-1"]
+    assert packed["dropped"] == ["ship-1"]
+    assert packed["tokens_after"] == 10
+    assert packed["text"].startswith("Source: inn.md")
@@ -0,0 +1,77 @@
+"""
+Tests of the pipelined ingestion engine.
+"""
+
+import threading
+import time
+
+import pytest
+
+from rag.ingest import IngestionPipeline
+
+
+def triples(count, produced=None):
+    for i in range(count):
+        if produced is not None:
+            produced.append(i)
+        yield f"chunk {i}", {}, f"id-{i}"
+
+
+def test_batches_are_embedded_concurrently():
+    barrier = threading.Barrier(3, timeout=5)
+    stored = []
+
+    def embed_batch(texts):
+        # Only passes once three workers are embedding at the same time
+        barrier.wait()
+        return [[0.0] for _ in texts]
+
+    pipeline = IngestionPipeline(
+        embed_batch,
+        lambda batch, embeddings: stored.extend(batch),
+        batch_size=1,
+        workers=3,
+    )
+
+    assert pipeline.run(triples(3)) == 3
+    assert sorted(id for _, _, id in stored) == ["id-0", "id-1", "id-2"]
+
+
+def test_a_slow_stage_holds_the_producer_back():
+    produced = []
+    release = threading.Event()
+
+    def embed_batch(texts):
+        release.wait(5)
+        return [[0.0] for _ in texts]
+
+    pipeline = IngestionPipeline(
+        embed_batch, lambda batch, embeddings: None, batch_size=1, workers=1, queue_depth=1
+    )
+    thread = threading.Thread(target=pipeline.run, args=(triples(100, produced),))
+    thread.start()
+    time.sleep(0.3)
+
+    # One batch being embedded, one queued and one waiting to be queued
+    assert len(produced) <= 3
+
+    release.set()
+    thread.join(5)
+    assert len(produced) == 100
+
+
+def test_the_first_error_of_a_stage_is_raised():
+    stored = []
+
+    def embed_batch(texts):
+        if "chunk 4" in texts:
+            raise RuntimeError("embedding server unavailable")
+        return [[0.0] for _ in texts]
+
+    pipeline = IngestionPipeline(
+        embed_batch, lambda batch, embeddings: stored.extend(batch), batch_size=1
+    )
+
+    with pytest.raises(RuntimeError, match="unavailable"):
+        pipeline.run(triples(100))
+    assert len(stored) < 100
@@ -0,0 +1,49 @@
+"""
+Tests of the background job manager.
+"""
+
+import threading
+
+import pytest
+
+from rag import IngestionProgress
+from service import JobConflictError, JobManager
+
+
+def test_start_refuses_while_a_job_is_active():
+    jobs = JobManager()
+    release = threading.Event()
+
+    first = jobs.start(release.wait, IngestionProgress())
+    with pytest.raises(JobConflictError) as conflict:
+        jobs.start(lambda: None, IngestionProgress())
+    assert conflict.value.job is first
+
+    release.set()
+    assert first.wait(5)
+    second = jobs.start(lambda: None, IngestionProgress())
+    assert second.wait(5) and second.status == "completed"
+
+
+def test_concurrent_starts_run_one_job():
+    jobs = JobManager()
+    release = threading.Event()
+    barrier = threading.Barrier(8)
+    started, conflicts = [], []
+
+    def start():
+        barrier.wait()
+        try:
+            started.append(jobs.start(release.wait, IngestionProgress()))
+        except JobConflictError:
+            conflicts.append(True)
+
+    threads = [threading.Thread(target=start) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+
+    assert len(started) == 1
+    assert len(conflicts) == 7
@@ -0,0 +1,44 @@
+"""
+Tests of the BM25 index and hybrid retrieval.
+"""
+
+import pytest
+
+from rag.lexical import BM25Index, reciprocal_rank_fusion
+
+
+def test_rare_terms_rank_first_and_the_index_persists(tmp_path):
+    path = str(tmp_path / "campaign.bm25.json")
+    index = BM25Index(path)
+    index.add(
+        [
+            ("inn", "The inn of the town serves ale in the town square"),
+            ("borin", "Borin runs the inn of the town"),
+            ("docks", "The docks of the town smell of tar"),
+        ]
+    )
+    assert [doc_id for doc_id, _ in index.search("Borin inn", k=2)] == ["borin", "inn"]
+
+    index.remove(["borin"])
+    index.save()
+
+    reloaded = BM25Index(path)
+    assert len(reloaded) == 2
+    assert reloaded.search("Borin") == []
+    assert [doc_id for doc_id, _ in reloaded.search("tar", allowed={"inn"})] == []
+
+
+def test_documents_found_by_both_rankings_fuse_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]])
+
+    assert {doc_id for doc_id, _ in fused[:2]} == {"b", "c"}
+
+
+def test_hybrid_retrieval_finds_proper_nouns(vault, make_rag):
+    rag = make_rag(vault)
+
+    docs, _, _ = rag.retrieve("Saltmere", k=1, mode="hybrid")
+    assert "Saltmere" in docs[0]
+
+    with pytest.raises(ValueError):
+        make_rag(vault, "dense", lexical_index=False).retrieve("x", mode="hybrid")
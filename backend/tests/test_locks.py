@@ -0,0 +1,66 @@
+"""
+Tests of the readers-writer lock guarding the shared server state.
+"""
+
+import threading
+import time
+
+from service import ReadWriteLock
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    both = threading.Barrier(2, timeout=5)
+
+    def read():
+        with lock.read():
+            both.wait()
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert not both.broken
+
+
+def test_waiting_writer_goes_before_new_readers():
+    lock = ReadWriteLock()
+    order = []
+    reading = threading.Event()
+    release = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reading.set()
+            release.wait(5)
+            order.append("first reader")
+
+    def writer():
+        with lock.write():
+            order.append("writer")
+
+    def second_reader():
+        with lock.read():
+            order.append("second reader")
+
+    threads = [threading.Thread(target=first_reader)]
+    threads[0].start()
+    assert reading.wait(5)
+
+    threads.append(threading.Thread(target=writer))
+    threads[1].start()
+    while not lock._waiting_writers:
+        time.sleep(0.01)
+
+    threads.append(threading.Thread(target=second_reader))
+    threads[2].start()
+    time.sleep(0.1)
+    assert order == []
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["first reader", "writer", "second reader"]
@@ -0,0 +1,62 @@
+"""
+Tests of the latency metrics and their Prometheus rendering.
+"""
+
+import pytest
+
+from telemetry.metrics import Metrics
+
+
+def test_counters_and_histograms_render_in_the_text_format():
+    metrics = Metrics(buckets=(0.1, 1))
+    metrics.inc("dmi_cache_requests_total", 3, cache="retrieval", result="hit")
+    metrics.observe("dmi_stage_duration_seconds", 0.05, stage="embed")
+    metrics.observe("dmi_stage_duration_seconds", 0.5, stage="embed")
+    metrics.observe("dmi_stage_duration_seconds", 5, stage="embed")
+
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE dmi_cache_requests_total counter" in lines
+    assert 'dmi_cache_requests_total{cache="retrieval",result="hit"} 3' in lines
+    assert "# TYPE dmi_stage_duration_seconds histogram" in lines
+    assert 'dmi_stage_duration_seconds_bucket{stage="embed",le="0.1"} 1' in lines
+    assert 'dmi_stage_duration_seconds_bucket{stage="embed",le="1"} 2' in lines
+    assert 'dmi_stage_duration_seconds_bucket{stage="embed",le="+Inf"} 3' in lines
+    assert 'dmi_stage_duration_seconds_sum{stage="embed"} 5.55' in lines
+    assert 'dmi_stage_duration_seconds_count{stage="embed"} 3' in lines
+
+
+def test_traced_stages_are_timed_also_when_they_raise():
+    metrics = Metrics()
+
+    with metrics.trace() as timings:
+        with pytest.raises(RuntimeError):
+            with metrics.time("generate"):
+                raise RuntimeError("model unavailable")
+        with metrics.time("generate"):
+            pass
+
+    # Only timed while tracing
+    with metrics.time("embed"):
+        pass
+
+    assert set(timings) == {"generate"}
+    assert 'dmi_stage_duration_seconds_count{stage="generate"} 2' in metrics.render()
+
+
+def test_metrics_endpoint_counts_requests(client):
+    client.post("/ask", json={"query": "What does the innkeeper look like?"})
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'dmi_requests_total{endpoint="/ask",status="200"}' in text
+
+    timed = client.post(
+        "/ask",
+        json={"query": "What does the innkeeper look like?"},
+        headers={"X-Request-Timing": "1"},
+    )
+    assert "total;dur=" in timed.headers["Server-Timing"]
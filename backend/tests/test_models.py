@@ -0,0 +1,127 @@
+"""
+Tests of the llama.cpp model pool, with a fake model class.
+"""
+
+import threading
+
+import numpy as np
+
+import llm.models
+from llm.models import LlamaPool, ModelManager, PromptStateCache
+
+
+class SlowLlama:
+    """Stand-in for llama_cpp.Llama whose construction waits for an event."""
+
+    loading = threading.Event()
+    release = threading.Event()
+
+    def __init__(self, **params):
+        SlowLlama.loading.set()
+        SlowLlama.release.wait(5)
+
+    def generate(self, tokens, *args, **kwargs):
+        return iter(())
+
+
+def test_stats_do_not_wait_for_a_load(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm.models.llama_cpp, "Llama", SlowLlama)
+    SlowLlama.loading.clear()
+    SlowLlama.release.clear()
+
+    model_path = tmp_path / "model.gguf"
+    model_path.write_bytes(b"GGUF")
+    pool = LlamaPool(str(model_path), {}, size=2)
+
+    acquired = []
+
+    def generate():
+        with pool.acquire() as llama:
+            acquired.append(llama)
+
+    thread = threading.Thread(target=generate)
+    thread.start()
+    assert SlowLlama.loading.wait(5)
+
+    # Answered while the instance is still loading
+    stats = pool.stats()
+    assert stats["loaded"] == 0
+    assert stats["loading"] == 1
+
+    SlowLlama.release.set()
+    thread.join(5)
+    assert pool.first() is acquired[0]
+    assert pool.stats()["loaded"] == 1
+    assert pool.stats()["loading"] == 0
+
+
+def test_resident_memory_without_psutil(monkeypatch):
+    monkeypatch.setattr(llm.models, "psutil", None)
+    assert llm.models.resident_memory() > 0
+
+
+def test_get_grows_a_shared_pool(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm.models.llama_cpp, "Llama", SlowLlama)
+    SlowLlama.release.set()
+
+    model_path = tmp_path / "model.gguf"
+    model_path.write_bytes(b"GGUF")
+    manager = ModelManager()
+    pool = manager.get(str(model_path), pool_size=1)
+
+    with pool.acquire():
+        assert manager.get(str(model_path), pool_size=2) is pool
+        # The second generation gets a new instance instead of waiting
+        with pool.acquire():
+            assert pool.stats()["loaded"] == 2
+
+    manager.get(str(model_path), pool_size=1)
+    assert pool.size == 2
+
+
+class RecordingLlama:
+    """Stand-in for llama_cpp.Llama that keeps its keyword arguments."""
+
+    def __init__(self, **params):
+        self.params = params
+        self.cache = None
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def generate(self, tokens, *args, **kwargs):
+        return iter(())
+
+
+def test_logits_of_every_token_only_with_prompt_lookup(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm.models.llama_cpp, "Llama", RecordingLlama)
+    model_path = tmp_path / "model.gguf"
+    model_path.write_bytes(b"GGUF")
+
+    plain = LlamaPool(str(model_path), {"n_ctx": 512}).first()
+    drafted = LlamaPool(str(model_path), {"n_ctx": 512}, draft_tokens=2).first()
+
+    assert plain.params["logits_all"] is False
+    assert drafted.params["logits_all"] is True
+
+
+def test_prompt_state_cache_counts_the_logits_of_states():
+    from llama_cpp import LlamaState
+
+    def state(n_tokens):
+        return LlamaState(
+            input_ids=np.zeros(n_tokens, dtype=np.intc),
+            scores=np.zeros((n_tokens, 1000), dtype=np.single),
+            n_tokens=n_tokens,
+            llama_state=b"",
+            llama_state_size=1000,
+            seed=0,
+        )
+
+    # Each state holds about 400 KB of logits next to 1 KB of context state
+    cache = PromptStateCache(capacity_bytes=1 << 20)
+    for i in range(3):
+        cache[(i,) * 100] = state(100)
+
+    assert len(cache.cache_state) == 2
+    assert cache.cache_size == 2 * llm.models.state_bytes(state(100))
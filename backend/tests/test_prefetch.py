@@ -0,0 +1,82 @@
+"""
+Tests of retrieval prefetching and its admission control.
+"""
+
+import pytest
+
+from service import PrefetchCancelled, Prefetcher
+
+
+def test_prefetches_are_throttled_per_client():
+    prefetcher = Prefetcher(max_concurrent=2, min_interval=60)
+
+    generation, status = prefetcher.admit("a")
+    assert status == "admitted"
+    with prefetcher.run("a", generation):
+        pass
+
+    assert prefetcher.admit("a") == (None, "throttled")
+    assert prefetcher.admit("b")[1] == "admitted"
+
+
+def test_prefetches_never_queue_for_a_slot():
+    prefetcher = Prefetcher(max_concurrent=1, min_interval=0)
+
+    generation, _ = prefetcher.admit("a")
+    assert prefetcher.admit("b") == (None, "busy")
+
+    with prefetcher.run("a", generation):
+        pass
+    assert prefetcher.admit("b")[1] == "admitted"
+
+
+def test_newer_prefetches_and_submits_cancel_older_ones():
+    prefetcher = Prefetcher(max_concurrent=2, min_interval=0)
+
+    first, _ = prefetcher.admit("a")
+    with pytest.raises(PrefetchCancelled):
+        with prefetcher.run("a", first) as checkpoint:
+            checkpoint()
+            second, _ = prefetcher.admit("a")
+            checkpoint()
+
+    with pytest.raises(PrefetchCancelled):
+        with prefetcher.run("a", second) as checkpoint:
+            prefetcher.cancel("a")
+            checkpoint()
+
+    stats = prefetcher.stats()
+    assert stats["cancelled"] == 2
+    assert stats["warmed"] == 0
+
+
+def test_prefetch_warms_the_caches_of_ask(client, monkeypatch, make_rag, vault):
+    import server
+
+    monkeypatch.setattr(server, "prefetcher", Prefetcher(min_interval=0))
+    rag = make_rag(vault, collection_name="cached", embedding_cache_size=100)
+    server.registry.add(rag, {"source_directory": vault, "db_path": rag.db_path})
+    payload = {"query": "What does the innkeeper look like?", "collection": "cached"}
+
+    response = client.post("/prefetch", json={**payload, "client_id": "tab"})
+    assert response.get_json() == {"status": "warmed"}
+    calls = rag.embed_fn.calls
+
+    # The query is neither embedded nor searched again on submit
+    response = client.post("/ask", json=payload)
+    assert response.status_code == 200
+    assert rag.embed_fn.calls == calls
+    assert rag.retrieval_cache.hits == 1
+
+
+def test_prefetch_is_refused_while_another_runs(client, monkeypatch):
+    import server
+
+    prefetcher = Prefetcher(max_concurrent=1, min_interval=0)
+    monkeypatch.setattr(server, "prefetcher", prefetcher)
+    prefetcher.admit("other")
+
+    response = client.post("/prefetch", json={"query": "Innkee", "client_id": "tab"})
+    assert response.status_code == 429
+    assert response.get_json() == {"status": "busy"}
+    assert prefetcher.stats()["busy"] == 1
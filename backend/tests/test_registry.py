@@ -0,0 +1,47 @@
+"""
+Tests of the collection registry.
+"""
+
+import os
+
+from conftest import write_vault
+from service import CollectionRegistry
+
+
+def register(registry, rag):
+    registry.add(
+        rag,
+        {
+            "source_directory": rag.source_directory,
+            "db_path": rag.db_path,
+            "model_name": rag.model_name,
+            "embedding_cache_size": 1000,
+        },
+    )
+
+
+def test_rebuild_keeps_other_collections(tmp_path, make_rag):
+    db_path = str(tmp_path / "db")
+    write_vault(str(tmp_path / "first"), {"a.md": "# A\n\nThe lighthouse of Saltmere.\n"})
+    write_vault(str(tmp_path / "second"), {"b.md": "# B\n\nThe crypt below the chapel.\n"})
+
+    registry = CollectionRegistry(path=str(tmp_path / "collections.json"))
+    first = make_rag(str(tmp_path / "first"), "first", embedding_cache_size=1000)
+    second = make_rag(str(tmp_path / "second"), "second", embedding_cache_size=1000)
+    register(registry, first)
+    register(registry, second)
+    first_count = first.collection.count()
+    second_count = second.collection.count()
+
+    rebuilt = make_rag(
+        str(tmp_path / "first"), "first", embedding_cache_size=1000, incremental=False
+    )
+    register(registry, rebuilt)
+
+    assert rebuilt.collection.count() == first_count
+    assert registry.get("second").collection.count() == second_count
+    docs, _, _ = registry.get("second").retrieve("crypt", k=1)
+    assert docs and "crypt" in docs[0]
+    assert os.path.exists(os.path.join(db_path, "embedding_cache.sqlite"))
+    assert os.path.exists(os.path.join(db_path, "second.manifest.json"))
+    assert os.path.exists(os.path.join(db_path, "second.bm25.json"))
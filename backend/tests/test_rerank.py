@@ -0,0 +1,117 @@
+"""
+Tests of the cross-encoder re-ranker, with a fake model.
+"""
+
+import llama_cpp
+import pytest
+
+import llm.models
+import llm.rerank
+from llm.models import ModelManager
+from llm.rerank import LlamaRanker, sigmoid
+
+
+class FakeRankLlama:
+    """
+    Stand-in for a rank-pooling llama_cpp.Llama scoring by word overlap.
+
+    Like libllama, it cannot decode more sequences at once than its context
+    was created for.
+    """
+
+    fail_batches = False
+
+    def __init__(self, **params):
+        self.params = params
+        # llama_cpp.Llama builds its context from the default parameters
+        self.n_seq_max = llama_cpp.llama_cpp.llama_context_default_params().n_seq_max
+        self.calls = []
+        self.specials = []
+
+    def generate(self, tokens, *args, **kwargs):
+        return iter(())
+
+    def tokenize(self, text, add_bos=True, special=False):
+        self.specials.append(special)
+        return text.decode("utf-8").split()
+
+    def detokenize(self, tokens, prev_tokens=None, special=False):
+        return " ".join(tokens).encode("utf-8")
+
+    def embed(self, input, normalize=False, truncate=True):
+        self.calls.append(input)
+        pairs = [input] if isinstance(input, str) else input
+        if len(pairs) > self.n_seq_max or (self.fail_batches and len(pairs) > 1):
+            raise RuntimeError("llama_decode returned -1")
+
+        embeddings = []
+        for pair in pairs:
+            query, document = pair.split(" [SEP] ")
+            overlap = set(query.split()) & set(document.split())
+            embeddings.append([float(len(overlap))])
+        return embeddings[0] if isinstance(input, str) else embeddings
+
+
+@pytest.fixture
+def make_ranker(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm.models.llama_cpp, "Llama", FakeRankLlama)
+    monkeypatch.setattr(FakeRankLlama, "fail_batches", False)
+    monkeypatch.setattr(llm.rerank, "pair_separator", lambda llama: " [SEP] ")
+    model_path = tmp_path / "reranker.gguf"
+    model_path.write_bytes(b"GGUF")
+
+    def make(**kwargs):
+        return LlamaRanker(str(model_path), models=ModelManager(), **kwargs)
+
+    return make
+
+
+def test_pairs_are_scored_in_batches(make_ranker):
+    ranker = make_ranker(batch_size=4)
+    documents = [f"doc {i}" for i in range(4)] + ["wooden leg", "harbour"]
+
+    scores = ranker.score("wooden leg", documents)
+    llama = ranker.pool.first()
+
+    # Decoded together, not one pair at a time after a failed batch
+    assert [len(batch) for batch in llama.calls] == [4, 2]
+    assert ranker.stats()["fallbacks"] == 0
+    assert ranker.stats()["batches"] == 2
+    assert llama.n_seq_max == 4
+    assert llama.params["n_ctx"] == llama.params["n_batch"] == 4 * 1024
+    assert scores[-2] == sigmoid(2.0)
+    assert scores[-1] == sigmoid(0.0)
+    # Special tokens written as text are parsed when the pairs are tokenized
+    assert all(llama.specials)
+
+
+def test_contexts_of_other_models_keep_one_sequence(make_ranker, tmp_path):
+    make_ranker(batch_size=8).score("wooden leg", ["harbour"])
+
+    model_path = tmp_path / "chat.gguf"
+    model_path.write_bytes(b"GGUF")
+    chat = ModelManager().get(str(model_path)).first()
+    assert chat.n_seq_max == 1
+
+
+def test_failed_batch_is_scored_one_pair_at_a_time(make_ranker, monkeypatch):
+    monkeypatch.setattr(FakeRankLlama, "fail_batches", True)
+    ranker = make_ranker()
+
+    scores = ranker.score("wooden leg", ["wooden leg", "harbour", "leg"])
+
+    assert scores == [sigmoid(2.0), sigmoid(0.0), sigmoid(1.0)]
+    assert ranker.pool.first().calls[1:] == [
+        "wooden leg [SEP] wooden leg",
+        "wooden leg [SEP] harbour",
+        "wooden leg [SEP] leg",
+    ]
+    assert ranker.stats()["fallbacks"] == 1
+
+
+def test_long_documents_are_truncated(make_ranker):
+    ranker = make_ranker(max_tokens=6)
+
+    ranker.score("wooden leg", ["one two three four five six"])
+
+    assert ranker.pool.first().calls[0][0] == "wooden leg [SEP] one two three"
@@ -0,0 +1,136 @@
+"""
+Tests of InstructorAssistant generation.
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+from benchmarks.stubs import HashingEmbedder
+from llm import Answer
+
+RESPONSE = {"answer": "Borin has a red beard.", "references": ["red beard"]}
+
+
+def fake_stream_json(assistant):
+    def stream_json(llama, messages, response_model):
+        assistant.count_attempt()
+        text = json.dumps(RESPONSE)
+        for start in range(0, len(text), 8):
+            yield text[start : start + 8]
+
+    return stream_json
+
+
+def test_constrained_stream_yields_the_response_once(assistant):
+    assistant.constrained = True
+    assistant.stream_json = fake_stream_json(assistant)
+
+    responses = list(assistant.ask_stream("Innkeeper?", "context", Answer))
+
+    final = [response for response in responses if type(response) is Answer]
+    assert len(final) == 1
+    assert responses[-1] is final[0]
+    assert final[0].model_dump() == RESPONSE
+    assert all(type(response) is not Answer for response in responses[:-1])
+
+
+def test_stream_releases_the_backend_before_it_is_consumed(assistant):
+    assistant.constrained = True
+    assistant.stream_json = fake_stream_json(assistant)
+
+    stream = assistant.ask_stream("Innkeeper?", "context", Answer, use_cache=False)
+    next(stream)
+
+    # The generation ends while the caller has not consumed the rest
+    deadline = time.monotonic() + 5
+    while assistant.generations == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert assistant.generations == 1
+
+    assert list(stream)[-1].model_dump() == RESPONSE
+
+
+def test_repeated_prompt_is_answered_from_the_cache(assistant):
+    first = assistant.ask("Who is Borin?", "Borin", Answer, context_ids=["npc:1"])
+    again = assistant.ask("Who is Borin?", "Borin", Answer, context_ids=["npc:1"])
+
+    assert again == first
+    assert assistant.create.calls == 1
+    assert assistant.response_cache.stats()["exact_hits"] == 1
+
+
+def test_similar_query_over_the_same_context_is_answered_from_the_cache(assistant):
+    embed_fn = HashingEmbedder().vector
+
+    first = assistant.ask(
+        "Who is Borin?", "Borin", Answer, context_ids=["npc:1"], embed_fn=embed_fn
+    )
+    similar = assistant.ask(
+        "who is borin", "Borin", Answer, context_ids=["npc:1"], embed_fn=embed_fn
+    )
+    assert similar == first
+    assert assistant.response_cache.stats()["semantic_hits"] == 1
+
+    # Other context, e.g. the chunk was edited since
+    assistant.ask(
+        "who is borin", "Borin", Answer, context_ids=["npc:1:edited"], embed_fn=embed_fn
+    )
+    assert assistant.create.calls == 2
+
+
+def test_constrained_ollama_output_follows_the_response_schema(assistant, monkeypatch):
+    import ollama
+
+    requests = []
+
+    def chat(model, messages, format, stream):
+        requests.append({"messages": messages, "format": format})
+        text = json.dumps(RESPONSE)
+        yield SimpleNamespace(done=False, message=SimpleNamespace(content=text))
+        yield SimpleNamespace(
+            done=True,
+            message=SimpleNamespace(content=""),
+            prompt_eval_count=10,
+            eval_count=5,
+        )
+
+    monkeypatch.setattr(ollama, "chat", chat)
+    assistant.constrained = True
+    usage = {}
+
+    response = assistant.ask("Innkeeper?", "context", Answer, usage=usage)
+
+    assert response.model_dump() == RESPONSE
+    assert usage["attempts"] == 1
+    assert requests[0]["format"] == Answer.model_json_schema()
+    assert "JSON schema" in requests[0]["messages"][0]["content"]
+
+
+def test_constrained_output_is_retried_with_the_validation_error(assistant):
+    outputs = iter(['{"answer": 3}', json.dumps(RESPONSE)])
+    retries = []
+
+    def stream_json(llama, messages, response_model):
+        assistant.count_attempt()
+        retries.append(messages[-1]["content"])
+        yield next(outputs)
+
+    assistant.constrained = True
+    assistant.stream_json = stream_json
+    usage = {}
+
+    response = assistant.ask("Innkeeper?", "context", Answer, usage=usage)
+
+    assert response.model_dump() == RESPONSE
+    assert usage["attempts"] == 2
+    assert "invalid" in retries[1]
+
+
+def test_grammars_are_compiled_once_per_response_model():
+    from llm.grammar import GrammarCache
+
+    grammars = GrammarCache()
+
+    assert grammars.grammar(Answer) is grammars.grammar(Answer)
+    assert grammars.stats() == {"schemas": 1, "grammars": 1}
@@ -0,0 +1,357 @@
+"""
+Tests of the Flask endpoints.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+from chromadb import PersistentClient
+from benchmarks.stubs import HashingEmbedder
+from conftest import write_vault
+from llm import Answer
+from rag import IngestionProgress
+
+
+def test_ask_cache_hit_reports_zero_attempts(client, assistant):
+    payload = {"query": "What does the innkeeper look like?"}
+
+    first = client.post("/ask", json=payload)
+    assert first.status_code == 200
+    assert first.headers["X-Generation-Attempts"] == "1"
+
+    second = client.post("/ask", json=payload)
+    assert second.status_code == 200
+    assert second.headers["X-Generation-Attempts"] == "0"
+    assert second.get_json() == first.get_json()
+    assert assistant.create.calls == 1
+
+
+def test_setup_conflicts_with_running_job(client, vault):
+    import server
+
+    release = threading.Event()
+    running = server.jobs.start(release.wait, IngestionProgress())
+    try:
+        response = client.post("/setup", json={"source_dir": vault})
+        assert response.status_code == 409
+        assert response.get_json()["job"]["job_id"] == running.job_id
+    finally:
+        release.set()
+        running.wait(5)
+
+
+def sse_events(response):
+    # (name, data) of every Server-Sent Event of a response
+    return [
+        (event.split("\n")[0][len("event: ") :], json.loads(event.split("\n")[1][6:]))
+        for event in response.get_data(as_text=True).strip().split("\n\n")
+    ]
+
+
+def setup(client, vault, db_path, **options):
+    payload = {
+        "source_dir": vault,
+        "db_path": db_path,
+        "model_embed": "stub",
+        "embedding_cache_size": 0,
+        "background": False,
+        **options,
+    }
+    return client.post("/setup", json=payload)
+
+
+def test_setup_indexes_into_a_new_generation(client, ollama_embed, tmp_path, vault):
+    import server
+
+    db_path = str(tmp_path / "setup-db")
+    assert setup(client, vault, db_path, vector_store="numpy").status_code == 200
+    assert os.path.exists(os.path.join(db_path, "vault.manifest.json"))
+
+    write_vault(vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin keeps a pet owl.\n"})
+    assert setup(client, vault, db_path, vector_store="numpy").status_code == 200
+
+    assert server.registry.config("vault")["generation"] == 1
+    assert not os.path.exists(os.path.join(db_path, "vault.manifest.json"))
+    assert not os.path.exists(os.path.join(db_path, "vault.records.json"))
+    assert os.path.exists(os.path.join(db_path, "vault.1.manifest.json"))
+
+    rag = server.registry.get("vault")
+    docs, _, _ = rag.retrieve("pet owl", k=1)
+    assert "owl" in docs[0]
+    assert rag.collection.count() == 2
+
+
+def test_setup_drops_an_unloaded_generation_without_loading_it(
+    client, monkeypatch, ollama_embed, tmp_path, vault
+):
+    import server
+    from service import CollectionRegistry
+
+    db_path = str(tmp_path / "setup-db")
+    assert setup(client, vault, db_path, vector_store="numpy").status_code == 200
+
+    # As after a restart: registered, but not loaded
+    registry = CollectionRegistry(path=server.registry.path)
+    monkeypatch.setattr(server, "registry", registry)
+
+    def load(name=None):
+        raise AssertionError("the previous generation was loaded")
+
+    monkeypatch.setattr(registry, "get", load)
+
+    write_vault(vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin keeps a pet owl.\n"})
+    assert setup(client, vault, db_path, vector_store="numpy").status_code == 200
+
+    assert registry.config("vault")["generation"] == 1
+    assert not os.path.exists(os.path.join(db_path, "vault.manifest.json"))
+    assert not os.path.exists(os.path.join(db_path, "vault.records.json"))
+    assert os.path.exists(os.path.join(db_path, "vault.1.records.json"))
+
+
+def test_unchanged_setup_keeps_the_served_generation(
+    client, ollama_embed, tmp_path, vault
+):
+    import server
+
+    db_path = str(tmp_path / "setup-db")
+    assert setup(client, vault, db_path).status_code == 200
+    calls = ollama_embed.calls
+    served = server.registry.get("vault")
+
+    assert setup(client, vault, db_path).status_code == 200
+
+    # Nothing changed, so nothing is embedded, copied or swapped
+    assert ollama_embed.calls == calls
+    assert server.registry.get("vault") is served
+    assert server.registry.config("vault").get("generation", 0) == 0
+
+    collections = PersistentClient(path=db_path).list_collections()
+    assert [collection.name for collection in collections] == ["vault"]
+
+    # A changed option is indexed into a new generation, copied from this one
+    assert setup(client, vault, db_path, batch_size=8).status_code == 200
+    assert ollama_embed.calls == calls
+    assert server.registry.get("vault").collection.count() == 2
+
+    collections = PersistentClient(path=db_path).list_collections()
+    assert [collection.name for collection in collections] == ["vault.1"]
+
+
+def test_queries_are_served_during_a_rebuild(client, monkeypatch, tmp_path, vault):
+    import ollama
+    import server
+
+    db_path = str(tmp_path / "setup-db")
+    embedder = HashingEmbedder()
+    monkeypatch.setattr(ollama, "embed", embedder)
+    assert setup(client, vault, db_path).status_code == 200
+
+    embedding = threading.Event()
+    release = threading.Event()
+
+    def blocking_embed(model, input):
+        embedding.set()
+        release.wait(10)
+        return embedder(model, input)
+
+    monkeypatch.setattr(ollama, "embed", blocking_embed)
+    response = setup(client, vault, db_path, rebuild=True, background=True)
+    assert response.status_code == 202
+
+    try:
+        assert embedding.wait(5)
+        served = []
+
+        def query():
+            with server.state_lock.read():
+                served.append(server.registry.get("vault").retrieve("innkeeper", k=1))
+
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join(5)
+        assert served and "Borin" in served[0][0][0]
+    finally:
+        release.set()
+        assert server.jobs.get(response.get_json()["job_id"]).wait(10)
+
+    assert server.registry.config("vault")["generation"] == 1
+
+
+def test_ask_after_editing_a_file_is_not_served_from_cache(client, assistant, vault):
+    import server
+
+    payload = {"query": "What does the innkeeper look like?", "top_k": 1}
+    first = client.post("/ask", json=payload)
+    assert first.get_json()["references"] == ["wooden leg"]
+
+    path = os.path.join(vault, "npcs", "innkeeper.md")
+    write_vault(
+        vault,
+        {"npcs/innkeeper.md": "# Innkeeper\n\n## Appearance\n\nBorin the innkeeper has a red beard and an eye patch.\n"},
+    )
+    server.registry.get().update_files([path])
+
+    second = client.post("/ask", json=payload)
+    assert second.status_code == 200
+    assert second.headers["X-Generation-Attempts"] == "1"
+    assert second.get_json()["references"] == []
+    assert assistant.create.calls == 2
+
+
+def test_setup_reads_string_flags(client, ollama_embed, tmp_path, vault):
+    db_path = str(tmp_path / "setup-db")
+
+    response = setup(client, vault, db_path, background="false", rebuild="no")
+    assert response.status_code == 200
+    assert response.get_json()["job"]["status"] == "completed"
+
+    response = setup(client, vault, db_path, rebuild="maybe")
+    assert response.status_code == 400
+    assert "rebuild" in response.get_json()["error"]
+
+
+def test_ask_rejects_invalid_flags(client):
+    response = client.post("/ask", json={"query": "Innkeeper?", "rerank": "sometimes"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "path, payload",
+    [
+        ("/ask", {"query": "Innkeeper?"}),
+        ("/ask/stream", {"query": "Innkeeper?"}),
+        ("/gen/npc", {"query": "An innkeeper"}),
+        ("/prefetch", {"query": "Innkee"}),
+        ("/gen/batch", {"jobs": [{"type": "npc", "query": "An innkeeper"}]}),
+    ],
+)
+@pytest.mark.parametrize(
+    "invalid",
+    [
+        {"mode": "fuzzy"},
+        {"filters": {"tag": "npc"}},
+        {"top_k": "many"},
+        {"top_k": 0},
+        {"min_score": "high"},
+        {"context_tokens": 2.5},
+    ],
+)
+def test_retrieval_args_are_validated_alike(client, path, payload, invalid):
+    response = client.post(path, json={**payload, **invalid})
+    assert response.status_code == 400
+
+
+def test_stream_sends_the_final_response_only_as_done(client, assistant):
+    PartialAnswer = Answer.model_construct
+    stream = [
+        PartialAnswer(answer="Borin"),
+        PartialAnswer(answer="Borin has a wooden leg"),
+        Answer(answer="Borin has a wooden leg.", references=["wooden leg"]),
+    ]
+    assistant.ask_stream = lambda **kwargs: iter(stream)
+
+    events = sse_events(client.post("/ask/stream", json={"query": "Innkeeper?"}))
+
+    assert [name for name, _ in events] == ["partial", "partial", "done"]
+    assert events[-1][1] == stream[-1].model_dump()
+    assert all(data != events[-1][1] for _, data in events[:-1])
+
+
+@pytest.mark.parametrize(
+    "invalid",
+    [
+        {"context_tokens": "abc"},
+        {"embed_workers": "abc"},
+        {"rerank_min_score": "abc"},
+        {"batch_size": 0},
+        {"response_cache_threshold": 2},
+    ],
+)
+def test_setup_rejects_invalid_numbers(client, vault, invalid):
+    response = client.post("/setup", json={"source_dir": vault, **invalid})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_batch_rejects_an_invalid_job_top_k(client):
+    jobs = [{"type": "npc", "query": "An innkeeper", "top_k": "x"}]
+    response = client.post("/gen/batch", json={"jobs": jobs})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "\"top_k\" must be an integer, got 'x'"}
+
+
+def test_batch_streams_every_job_as_it_completes(client, assistant):
+    import server
+
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def create(messages, response_model, max_retries):
+        assistant.count_attempt()
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if "cursed" in messages[-1]["content"]:
+            raise RuntimeError("generation failed")
+        return response_model.model_construct()
+
+    assistant.create = create
+    embedder = server.registry.get("campaign").embed_fn
+    calls = embedder.calls
+
+    queries = ["An innkeeper", "A harbour master", "A cursed sword", "A smuggler"]
+    jobs = [{"type": "npc", "query": query} for query in queries]
+    response = client.post("/gen/batch", json={"jobs": jobs, "concurrency": 2})
+    events = sse_events(response)
+
+    # Every query is embedded in one request
+    assert embedder.calls == calls + 1
+    assert running[1] == 2
+
+    results = sorted(data["index"] for name, data in events if name == "result")
+    assert results == [0, 1, 3]
+    assert [data["index"] for name, data in events if name == "error"] == [2]
+    assert events[-1] == ("done", {"completed": 3, "failed": 1})
+
+
+def test_watcher_starts_only_after_a_successful_setup(
+    client, monkeypatch, ollama_embed, tmp_path, vault
+):
+    import ollama
+    import server
+
+    db_path = str(tmp_path / "setup-db")
+    monkeypatch.setattr(server, "watchers", {})
+
+    def fail(model, input):
+        raise RuntimeError("embedding model unavailable")
+
+    with monkeypatch.context() as m:
+        m.setattr(ollama, "embed", fail)
+        response = setup(client, vault, db_path, watch=True)
+    assert response.status_code == 500
+    assert "vault" not in server.watchers
+
+    response = setup(client, vault, db_path, watch=True, watch_interval=0.05)
+    assert response.status_code == 200
+    watcher = server.watchers["vault"]
+    try:
+        assert watcher.stats()["running"]
+
+        # Re-indexing is recorded as a metric
+        before = server.metrics._counters[
+            server.metrics.key("dmi_files_reindexed_total", {"collection": "vault"})
+        ]
+        watcher.on_change([os.path.join(vault, "npcs", "innkeeper.md")])
+        after = server.metrics._counters[
+            server.metrics.key("dmi_files_reindexed_total", {"collection": "vault"})
+        ]
+        assert after == before + 1
+    finally:
+        watcher.stop(5)
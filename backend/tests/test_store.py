@@ -0,0 +1,218 @@
+"""
+Tests of the vector store backends.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from rag.store import ChromaStore, NumpyStore, matches
+
+
+def chunks(store, names, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(len(names), 16)).astype(np.float32)
+    store.upsert(
+        names,
+        embeddings,
+        [f"text of {name}" for name in names],
+        [{"name": name} for name in names],
+    )
+    return embeddings
+
+
+def test_numpy_store_answers_like_chroma(tmp_path):
+    names = [f"chunk-{i}" for i in range(40)]
+    stores = [ChromaStore(str(tmp_path), "vault"), NumpyStore(str(tmp_path), "vault")]
+    for store in stores:
+        embedding = chunks(store, names)[7]
+        store.flush()
+
+    where = {"name": {"$in": names[:20]}}
+    chroma, numpy = (
+        store.query([embedding], n_results=5, where=where) for store in stores
+    )
+
+    assert numpy["ids"] == chroma["ids"]
+    assert numpy["ids"][0][0] == "chunk-7"
+    assert numpy["documents"] == chroma["documents"]
+    assert numpy["metadatas"] == chroma["metadatas"]
+    assert np.allclose(numpy["distances"], chroma["distances"], rtol=1e-4, atol=1e-4)
+
+    chroma, numpy = (store.get(where={"name": "chunk-3"}) for store in stores)
+    assert numpy["ids"] == chroma["ids"] == ["chunk-3"]
+    assert numpy["documents"] == chroma["documents"]
+
+
+def test_where_clauses_are_matched_like_chroma():
+    metadata = {"source": "innkeeper", "headers": 2}
+
+    assert matches(metadata, {"source": "innkeeper"})
+    assert matches(
+        metadata, {"$and": [{"headers": {"$gte": 2}}, {"source": {"$ne": "x"}}]}
+    )
+    assert matches(metadata, {"$or": [{"source": "x"}, {"headers": {"$lt": 3}}]})
+    assert not matches(metadata, {"source": {"$nin": ["innkeeper"]}})
+    assert not matches(metadata, {"missing": "value"})
+
+    with pytest.raises(ValueError):
+        matches(metadata, {"source": {"$like": "inn%"}})
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_vectors_are_memory_mapped_after_reopening(tmp_path, dtype):
+    store = NumpyStore(str(tmp_path), "vault", dtype=dtype)
+    embeddings = chunks(store, [f"chunk-{i}" for i in range(10)])
+    store.flush()
+
+    vectors = np.load(tmp_path / "vault.vectors.npy", mmap_mode="r")
+    assert vectors.dtype == np.dtype(dtype)
+
+    reopened = NumpyStore(str(tmp_path), "vault", dtype=dtype)
+    assert reopened.count() == 10
+    results = reopened.query(embeddings[[2, 5]], n_results=1)
+    assert results["ids"] == [["chunk-2"], ["chunk-5"]]
+    assert results["documents"] == [["text of chunk-2"], ["text of chunk-5"]]
+    assert results["distances"][0][0] < 0.01
+
+
+def test_collection_on_the_numpy_store(make_rag, vault):
+    rag = make_rag(vault, vector_store="numpy")
+    docs, metadatas, _ = rag.retrieve("red beard", k=1)
+    assert "red beard" in docs[0]
+
+    reopened = make_rag(vault, vector_store="numpy", index=False)
+    assert reopened.collection.count() == rag.collection.count() == 2
+    assert reopened.retrieve("red beard", k=1)[1] == metadatas
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_flush_appends_changed_rows(tmp_path, quantization):
+    store = NumpyStore(str(tmp_path), "vault", quantization=quantization)
+    chunks(store, [f"chunk-{i}" for i in range(100)])
+    store.flush()
+
+    records = (tmp_path / "vault.records.json").read_bytes()
+    vectors = (tmp_path / "vault.vectors.npy").stat().st_size
+
+    embedding = chunks(store, ["chunk-3", "new"], seed=1)[0]
+    store.delete(["chunk-5"])
+    store.flush()
+
+    # The records of the other chunks are not written again, and only the
+    # two new rows are added to the vectors
+    assert (tmp_path / "vault.records.json").read_bytes() == records
+    assert (tmp_path / "vault.vectors.npy").stat().st_size == vectors + 2 * 16 * 4
+
+    reopened = NumpyStore(str(tmp_path), "vault", quantization=quantization)
+    assert reopened.count() == 100
+    assert reopened.get(ids=["chunk-5"])["ids"] == []
+    assert len(reopened.get()["ids"]) == 100
+
+    results = reopened.query([embedding], n_results=1)
+    assert results["ids"] == [["chunk-3"]]
+    assert results["metadatas"] == [[{"name": "chunk-3"}]]
+
+
+def test_quantized_codes_are_appended_without_refitting(tmp_path):
+    store = NumpyStore(str(tmp_path), "vault", quantization="int8")
+    chunks(store, [f"chunk-{i}" for i in range(100)])
+    store.flush()
+    scale = np.load(tmp_path / "vault.int8-scale.npy")
+
+    chunks(store, ["new"], seed=1)
+    store.flush()
+
+    assert np.array_equal(np.load(tmp_path / "vault.int8-scale.npy"), scale)
+    assert len(np.load(tmp_path / "vault.int8.npy")) == 101
+
+
+def test_queries_search_rows_added_since_the_last_flush(tmp_path):
+    store = NumpyStore(str(tmp_path), "vault", quantization="binary")
+    chunks(store, [f"chunk-{i}" for i in range(100)])
+    store.flush()
+
+    embedding = chunks(store, ["new"], seed=1)[0]
+
+    assert store.query([embedding], n_results=1)["ids"] == [["new"]]
+    assert store.count() == 101
+
+
+def test_flush_rewrites_once_most_rows_are_dead(tmp_path):
+    store = NumpyStore(str(tmp_path), "vault")
+    chunks(store, [f"chunk-{i}" for i in range(10)])
+    store.flush()
+
+    chunks(store, ["chunk-0", "chunk-1"], seed=1)
+    store.flush()
+    assert os.path.exists(tmp_path / "vault.records.log")
+
+    store.delete([f"chunk-{i}" for i in range(2, 10)])
+    store.flush()
+
+    assert not os.path.exists(tmp_path / "vault.records.log")
+    assert len(np.load(tmp_path / "vault.vectors.npy")) == 2
+    assert sorted(NumpyStore(str(tmp_path), "vault").get()["ids"]) == [
+        "chunk-0",
+        "chunk-1",
+    ]
+
+
+def test_unfinished_flush_is_ignored(tmp_path):
+    store = NumpyStore(str(tmp_path), "vault")
+    chunks(store, [f"chunk-{i}" for i in range(10)])
+    store.flush()
+
+    # Rows appended, but the log line cut off
+    chunks(store, ["new"], seed=1)
+    store.flush()
+    log = tmp_path / "vault.records.log"
+    log.write_bytes(log.read_bytes()[:-5])
+
+    reopened = NumpyStore(str(tmp_path), "vault")
+    assert reopened.count() == 10
+    assert reopened.get(ids=["new"])["ids"] == []
+
+    chunks(reopened, ["other"], seed=2)
+    reopened.flush()
+    assert NumpyStore(str(tmp_path), "vault").get(ids=["new", "other"])["ids"] == [
+        "other"
+    ]
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_index_finds_the_exact_results(tmp_path, quantization):
+    from benchmarks.quantization import clustered_vectors
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((8, 64))
+    vectors = clustered_vectors(rng, 1000, centers, noise=0.3)
+    queries = clustered_vectors(rng, 10, centers, noise=0.3)
+    names = [f"chunk-{i}" for i in range(1000)]
+
+    store = NumpyStore(str(tmp_path), "vault")
+    metadatas = [{"even": i % 2 == 0} for i in range(1000)]
+    store.upsert(names, vectors, [""] * 1000, metadatas)
+    store.flush()
+    quantized = NumpyStore(str(tmp_path), "vault", quantization=quantization)
+
+    # Candidates are re-scored at full precision, so the distances are exact
+    for where in (None, {"even": True}):
+        want = store.query(queries, n_results=5, where=where)
+        got = quantized.query(queries, n_results=5, where=where)
+        assert got["ids"] == want["ids"]
+        assert np.allclose(got["distances"], want["distances"])
+
+    assert quantized.index_bytes() * 3 < store.index_bytes()
+
+
+def test_incomplete_store_cannot_be_created():
+    from rag.store import VectorStore
+
+    class CountingStore(VectorStore):
+        def count(self):
+            return 0
+
+    with pytest.raises(TypeError, match="abstract"):
+        CountingStore()
@@ -0,0 +1,136 @@
+"""
+Tests of indexing and retrieval in ChromaRag.
+"""
+
+import os
+
+import pytest
+
+from benchmarks.stubs import HashingEmbedder
+from conftest import write_vault
+
+
+class FailingEmbedder(HashingEmbedder):
+    """Hashing embedder that fails on texts containing a word, while armed."""
+
+    def __init__(self, word):
+        super().__init__()
+        self.word = word
+        self.armed = False
+
+    def __call__(self, model, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        if self.armed and any(self.word in text for text in texts):
+            raise RuntimeError("embedding server unavailable")
+        return super().__call__(model, input)
+
+
+def test_failed_update_keeps_file_out_of_date(vault, make_rag):
+    embedder = FailingEmbedder("owl")
+    rag = make_rag(vault, embed_fn=embedder, batch_size=1, embed_workers=1)
+    path = os.path.join(vault, "npcs", "innkeeper.md")
+    before = rag.manifest.get(path)
+
+    write_vault(vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin keeps a pet owl.\n"})
+    embedder.armed = True
+    with pytest.raises(RuntimeError):
+        rag.update_files([path])
+    assert rag.manifest.get(path) == before
+
+    # A later, unrelated update must not mark the file as indexed either
+    rag.update_files([os.path.join(vault, "places", "harbour.md")])
+    assert rag.manifest.get(path) == before
+
+    embedder.armed = False
+    assert rag.update_files([path])["chunks_embedded"] == 1
+    docs, _, _ = rag.retrieve("pet owl", k=1)
+    assert "owl" in docs[0]
+
+
+def test_chunks_are_embedded_and_stored_in_batches(tmp_path, make_rag):
+    vault = str(tmp_path / "npc-vault")
+    write_vault(
+        vault, {f"npcs/npc-{i}.md": f"# NPC {i}\n\nNPC {i} sells maps.\n" for i in range(5)}
+    )
+    embedder = HashingEmbedder()
+    rag = make_rag(vault, embed_fn=embedder, batch_size=2, embed_workers=1, index=False)
+
+    inserts = []
+    upsert = rag.collection.upsert
+
+    def counted_upsert(**kwargs):
+        inserts.append(len(kwargs["ids"]))
+        upsert(**kwargs)
+
+    rag.collection.upsert = counted_upsert
+    rag.create_rag()
+
+    # Five chunks: one embedding request and one insert per batch of two
+    assert embedder.calls == 3
+    assert embedder.items == 5
+    assert sorted(inserts) == [1, 2, 2]
+    assert rag.collection.count() == 5
+
+
+def test_files_are_loaded_one_at_a_time(vault, make_rag):
+    write_vault(vault, {".obsidian/templates/npc.md": "# Template\n\nName: \n"})
+    rag = make_rag(vault, index=False)
+
+    loaded = []
+    load_text = rag.load_text
+
+    def counted_load_text(source):
+        loaded.append(source)
+        return load_text(source)
+
+    rag.load_text = counted_load_text
+
+    chunks = rag.iter_chunks()
+    next(chunks)
+    assert len(loaded) == 1
+
+    # Files in hidden directories are skipped
+    list(chunks)
+    assert [os.path.relpath(path, vault) for path in loaded] == [
+        os.path.join("npcs", "innkeeper.md"),
+        os.path.join("places", "harbour.md"),
+    ]
+
+
+def test_retrieval_is_scoped_by_source_and_headers(vault, make_rag):
+    rag = make_rag(vault)
+
+    _, _, metadatas = rag.retrieve("docks", k=5, where=rag.metadata_filter("npcs/"))
+    assert [metadata["source_basename"] for metadata in metadatas] == ["innkeeper-md"]
+
+    where = rag.metadata_filter(headers=["Harbour", "Docks"])
+    docs, _, _ = rag.retrieve("red beard", k=5, where=where)
+    assert len(docs) == 1
+    assert "Saltmere" in docs[0]
+
+    with pytest.raises(ValueError):
+        rag.metadata_filter(source="dungeons/")
+
+
+def test_header_tree_lists_the_sections_of_every_file(vault, make_rag):
+    rag = make_rag(vault)
+
+    assert rag.header_tree() == [
+        {
+            "source": "npcs/innkeeper.md",
+            "source_basename": "innkeeper-md",
+            "sections": [
+                {
+                    "title": "Innkeeper",
+                    "sections": [{"title": "Appearance", "sections": []}],
+                }
+            ],
+        },
+        {
+            "source": "places/harbour.md",
+            "source_basename": "harbour-md",
+            "sections": [
+                {"title": "Harbour", "sections": [{"title": "Docks", "sections": []}]}
+            ],
+        },
+    ]
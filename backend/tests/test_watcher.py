@@ -0,0 +1,78 @@
+"""
+Tests of the vault watcher.
+"""
+
+import os
+import time
+
+from conftest import write_vault
+from service import VaultWatcher
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_a_burst_of_changes_is_handed_over_as_one_batch(vault):
+    batches = []
+    watcher = VaultWatcher(vault, batches.append, interval=0.05, debounce=0.3)
+    watcher.start()
+    try:
+        write_vault(vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin left.\n"})
+        write_vault(vault, {"npcs/smith.md": "# Smith\n\nHelga forges swords.\n"})
+        os.remove(os.path.join(vault, "places", "harbour.md"))
+        write_vault(vault, {"notes.txt": "Not markdown"})
+
+        assert wait_for(lambda: batches)
+        time.sleep(0.4)
+    finally:
+        watcher.stop(5)
+
+    assert batches == [
+        [
+            os.path.join(vault, "npcs", "innkeeper.md"),
+            os.path.join(vault, "npcs", "smith.md"),
+            os.path.join(vault, "places", "harbour.md"),
+        ]
+    ]
+    assert watcher.stats()["files_updated"] == 3
+
+
+def test_a_failed_batch_is_retried(vault):
+    batches = []
+
+    def on_change(paths):
+        batches.append(paths)
+        if len(batches) == 1:
+            raise RuntimeError("embedding model unavailable")
+
+    watcher = VaultWatcher(vault, on_change, interval=0.05, debounce=0.1)
+    watcher.start()
+    try:
+        write_vault(vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin left.\n"})
+        assert wait_for(lambda: watcher.stats()["updates"] == 1)
+    finally:
+        watcher.stop(5)
+
+    assert batches[0] == batches[1] == [os.path.join(vault, "npcs", "innkeeper.md")]
+    assert watcher.stats()["last_error"] is None
+
+
+def test_edited_notes_are_reindexed(make_rag, vault):
+    rag = make_rag(vault)
+    watcher = VaultWatcher(vault, rag.update_files, interval=0.05, debounce=0.1)
+    watcher.start()
+    try:
+        write_vault(
+            vault, {"npcs/innkeeper.md": "# Innkeeper\n\nBorin keeps a pet owl.\n"}
+        )
+        assert wait_for(lambda: watcher.stats()["updates"] == 1)
+    finally:
+        watcher.stop(5)
+
+    docs, _, _ = rag.retrieve("pet owl", k=1)
+    assert "owl" in docs[0]
+    assert rag.collection.count() == 2
@@ -1,5 +1,8 @@
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
+import ReactMarkdown from "react-markdown";
 import './EchoForge.css';
+import { streamPost } from "../stream";
+import { createPrefetcher } from "../prefetch";
 
 const generatorOptions = [
   { label: "NPC", value: "npc" },
@@ -19,33 +22,42 @@ function Generators() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
 
+  const prefetcher = useRef(null);
+  if (!prefetcher.current) prefetcher.current = createPrefetcher();
+  useEffect(() => () => prefetcher.current.cancel(), []);
+
+  const handleQueryChange = (e) => {
+    setQueryText(e.target.value);
+    prefetcher.current.schedule({
+      query: e.target.value,
+      top_k: numResults,
+      generator: true,
+    });
+  };
+
   const handleGenerate = async () => {
+    prefetcher.current.flush();
     setLoading(true);
     setError(null);
     setResults([]);
 
+    const showResults = (data) => {
+      const key = Object.keys(data)[0];
+      const value = data[key];
+      if (value == null) return;
+      setResults(Array.isArray(value) ? value : [value]);
+    };
+
     try {
-      const response = await fetch(`http://localhost:5000/gen/${generator}`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          top_k: numResults,
-          // num_results: echoes,
-          query: queryText,
-        }),
-      });
-
-      const data = await response.json();
-
-      if (!response.ok) {
-        setError(data.error || "Something went wrong.");
-      } else {
-        const key = Object.keys(data)[0];
-        const value = data[key];
-        setResults(Array.isArray(value) ? value : [value]);
-      }
+      const data = await streamPost(`http://localhost:5000/gen/${generator}/stream`, {
+        top_k: numResults,
+        // num_results: echoes,
+        query: queryText,
+      }, showResults);
+
+      if (data) showResults(data);
     } catch (err) {
-      setError("Failed to connect to server.");
+      setError(err.message || "Failed to connect to server.");
     } finally {
       setLoading(false);
     }
@@ -95,7 +107,7 @@ function Generators() {
         <textarea
           id="query"
           value={queryText}
-          onChange={(e) => setQueryText(e.target.value)}
+          onChange={handleQueryChange}
           placeholder="Call forth what lies hidden in the embers..."
           rows={4}
         />
@@ -126,7 +138,7 @@ function Generators() {
                       {typeof value === "string" && value.includes("\n") ? (
                         <ReactMarkdown>{value}</ReactMarkdown>
                       ) : (
-                        value.toString()
+                        String(value ?? "")
                       )}
                     </span>
                   </div>
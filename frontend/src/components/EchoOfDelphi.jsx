@@ -1,7 +1,8 @@
-import React, { useState } from 'react';
-import axios from 'axios';
+import React, { useEffect, useRef, useState } from 'react';
 import './EchoOfDelphi.css';
 import ReactMarkdown from 'react-markdown'
+import { streamPost } from '../stream';
+import { createPrefetcher } from '../prefetch';
 
 function EchoOfDelphi() {
     const [query, setQuery] = useState('');
@@ -11,6 +12,15 @@ function EchoOfDelphi() {
     const [error, setError] = useState(null);
     const [loading, setLoading] = useState(false);
 
+    const prefetcher = useRef(null);
+    if (!prefetcher.current) prefetcher.current = createPrefetcher();
+    useEffect(() => () => prefetcher.current.cancel(), []);
+
+    const handleQueryChange = (e) => {
+        setQuery(e.target.value);
+        prefetcher.current.schedule({ query: e.target.value, top_k: topK });
+    };
+
     const handleAsk = async (e) => {
         e.preventDefault();
 
@@ -20,20 +30,21 @@ function EchoOfDelphi() {
             return;
         }
 
+        prefetcher.current.flush();
         setLoading(true);
         setError(null);
         setResponse(null);
 
         try {
-            const res = await axios.post('http://localhost:5000/ask', {
+            const result = await streamPost('http://localhost:5000/ask/stream', {
                 query,
                 top_k: topK,
-            });
+            }, setResponse);
 
-            setResponse(res.data);
+            if (result) setResponse(result);
         } catch (err) {
 
-            setError(err.response?.data?.error || err.message || 'Error asking query.');
+            setError(err.message || 'Error asking query.');
         } finally {
             setLoading(false);
         }
@@ -72,7 +83,7 @@ function EchoOfDelphi() {
                     <textarea
                         id="query"
                         value={query}
-                        onChange={(e) => setQuery(e.target.value)}
+                        onChange={handleQueryChange}
                         rows={4}
                         placeholder="Cast your thoughts into the pool, that the Oracle may stir."
                         required
@@ -91,7 +102,7 @@ function EchoOfDelphi() {
                     <h3>🜄 Oracle’s Insight</h3>
 
                     <div className="query-answer">
-                        <ReactMarkdown>{response.answer}</ReactMarkdown>
+                        <ReactMarkdown>{response.answer || ''}</ReactMarkdown>
                     </div>
 
                     {response.references && response.references.length > 0 && (
@@ -100,7 +111,7 @@ function EchoOfDelphi() {
                             <ul>
                                 {response.references.map((ref, index) => (
                                     <li key={index}>
-                                        <ReactMarkdown>{ref}</ReactMarkdown>
+                                        <ReactMarkdown>{ref || ''}</ReactMarkdown>
                                     </li>
                                 ))}
                             </ul>
@@ -11,23 +11,41 @@ function RAGSetup({ onSuccess }) {
     const [error, setError] = useState(null);
 
     const [loading, setLoading] = useState(false);
+    const [progress, setProgress] = useState(null);
+
+    // Indexing runs as a background job on the server, poll until it is done
+    const waitForJob = async (statusUrl) => {
+        while (true) {
+            const { data } = await axios.get(`http://localhost:5000${statusUrl}`);
+            setProgress(data.progress);
+
+            if (data.status === 'completed') return;
+            if (data.status === 'failed') throw new Error(data.error || 'Setup failed.');
+
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+        }
+    };
 
     const apiSetup = async () => {
         try {
             setError(null); 
+            setProgress(null);
             const response = await axios.post('http://localhost:5000/setup', {
                 'model_chat': modelChat,
                 'model_embed': modelEmbed,
                 'source_dir': mdSource
             });
             console.log('Setup response:', response.status);
-            if (response.status === 200) {
+            if (response.status === 202) {
+                await waitForJob(response.data.status_url);
+            }
+            if (response.status === 200 || response.status === 202) {
                 if (onSuccess) onSuccess(mdSource);
             } else {
                 setError(response.data.error || 'Setup failed.');
             }
         } catch (error) {
-            setError(error.message || 'An error occurred during setup.');
+            setError(error.response?.data?.error || error.message || 'An error occurred during setup.');
         }
     };
 
@@ -94,6 +112,13 @@ function RAGSetup({ onSuccess }) {
                 <button type="submit" disabled={loading} className="setup-button">
                     {loading ? "Awakening..." : "Awake"}
                 </button>
+                {loading && progress && (
+                    <p className="setup-progress">
+                        {progress.files_scanned} / {progress.files_total} scrolls read,{' '}
+                        {progress.chunks_embedded} echoes bound
+                        {progress.eta_seconds != null && ` (~${Math.ceil(progress.eta_seconds)}s remain)`}
+                    </p>
+                )}
             </form>
         </div>
     );
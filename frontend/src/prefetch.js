@@ -0,0 +1,47 @@
+// Warms the backend's embedding and retrieval caches while the user types.
+// Each input gets its own prefetcher: schedule() posts the latest text to
+// /prefetch once typing pauses, aborting the previous prefetch, and the backend
+// cancels older prefetches of the same client_id. Failures are ignored, the
+// prefetch is only a hint.
+const PREFETCH_URL = 'http://localhost:5000/prefetch';
+const DEBOUNCE_MS = 400;
+const MIN_QUERY_LENGTH = 3;
+
+export function createPrefetcher() {
+    const clientId = Math.random().toString(36).slice(2);
+    let timer = null;
+    let controller = null;
+
+    const schedule = (body) => {
+        clearTimeout(timer);
+        if (!body.query || body.query.trim().length < MIN_QUERY_LENGTH) return;
+
+        timer = setTimeout(() => {
+            if (controller) controller.abort();
+            controller = new AbortController();
+
+            fetch(PREFETCH_URL, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ...body, client_id: clientId }),
+                signal: controller.signal,
+            }).catch(() => {});
+        }, DEBOUNCE_MS);
+    };
+
+    // Drops a prefetch that has not been sent yet, e.g. on submit. One in
+    // flight is left to finish, it warms the caches for the submitted query.
+    const flush = () => clearTimeout(timer);
+
+    const cancel = () => {
+        clearTimeout(timer);
+        if (controller) controller.abort();
+        fetch(PREFETCH_URL, {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ client_id: clientId }),
+        }).catch(() => {});
+    };
+
+    return { schedule, flush, cancel };
+}
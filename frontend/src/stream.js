@@ -0,0 +1,42 @@
+// Reads a Server-Sent Events response from the backend's /stream endpoints.
+// Calls onPartial with every partial object and resolves with the final one,
+// which only arrives as the `done` event.
+export async function streamPost(url, body, onPartial) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body),
+    });
+
+    if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || 'Something went wrong.');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const raw of events) {
+            const event = raw.match(/^event: (.*)$/m)?.[1];
+            const data = raw.match(/^data: (.*)$/m)?.[1];
+            if (!event || data === undefined) continue;
+
+            const payload = JSON.parse(data);
+            if (event === 'error') throw new Error(payload.error);
+            if (event === 'partial' && onPartial) onPartial(payload);
+            if (event === 'done') result = payload;
+        }
+    }
+
+    return result;
+}